@@ -0,0 +1,103 @@
+"""
+Parsed-AST cache.
+Content-addressed cache of parsed SQL statements, stored in SQLite. Entries are keyed by a hash of the normalized
+SQL (its token stream) and of the parsing schema, and the parsed ASTs are stored as pickles (protocol 5).
+"""
+import json
+import pickle
+import sqlite3
+import hashlib
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.process_sql import tokenize
+
+# Bump when the parser output changes, to invalidate the cached ASTs
+PARSER_VERSION = 1
+
+
+def schema_fingerprint(schema):
+    """
+    Fingerprint of a parsing schema (process_sql.Schema): a hash of its tables and columns.
+    """
+    tables = {table.lower(): sorted(col.lower() for col in cols) for table, cols in schema.schema.items()}
+    data = json.dumps(tables, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(f"{PARSER_VERSION}:{data}".encode('utf-8')).hexdigest()
+
+
+def normalize_sql(sql):
+    """
+    Normalize a SQL statement for hashing: the token stream produced by the parser's tokenizer, so that
+    statements differing only in whitespace or keyword case share a key. Falls back to the whitespace-collapsed
+    text if the statement cannot be tokenized.
+    """
+    if not sql:
+        return ''
+    try:
+        return '\x1f'.join(tokenize(sql))
+    except Exception:
+        return ' '.join(sql.split())
+
+
+class ASTCache:
+    """
+    SQLite-backed cache of parsed SQL statements. Both successful parses (the AST) and parsing errors are cached.
+    cache_file: path to the SQLite cache file.
+    """
+    def __init__(self, cache_file: str):
+        self._cache_file = cache_file
+        self._conn = sqlite3.connect(cache_file)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS ast_cache (key TEXT PRIMARY KEY, ast BLOB, error TEXT)")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache_file(self):
+        return self._cache_file
+
+    @staticmethod
+    def key(sql: str, fingerprint: str) -> str:
+        """
+        Cache key of a SQL statement parsed with the schema of the given fingerprint.
+        """
+        return hashlib.sha256(f"{fingerprint}\x1e{normalize_sql(sql)}".encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        """
+        Look up a statement. Returns a (sql_parsed, error) pair, or None if the statement is not cached.
+        """
+        row = self._conn.execute("SELECT ast, error FROM ast_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        ast, error = row
+        return (pickle.loads(ast) if ast is not None else None), error
+
+    def put(self, key: str, sql_parsed=None, error: str = None):
+        """
+        Cache the parse result of a statement: the AST, or the error message if parsing failed.
+        Changes are written on commit().
+        """
+        ast = pickle.dumps(sql_parsed, protocol=5) if sql_parsed is not None else None
+        self._conn.execute("INSERT OR REPLACE INTO ast_cache (key, ast, error) VALUES (?, ?, ?)", (key, ast, error))
+
+    def put_many(self, entries):
+        """
+        Cache many parse results, given as (key, sql_parsed, error) triples.
+        """
+        self._conn.executemany("INSERT OR REPLACE INTO ast_cache (key, ast, error) VALUES (?, ?, ?)",
+                               ((key, pickle.dumps(sql_parsed, protocol=5) if sql_parsed is not None else None, error) for key, sql_parsed, error in entries))
+
+    def commit(self):
+        self._conn.commit()
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM ast_cache").fetchone()[0]
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
@@ -0,0 +1,160 @@
+"""
+Micro-benchmarks for the post-processing pipeline.
+Usage: python src/benchmark.py <benchmark> [options]
+"""
+import json
+import time
+import random
+import argparse
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.process_sql import tokenize, tokenize_nltk, get_sql, Schema
+
+
+def load_view_corpus(views_file):
+    """
+    Load the view definitions from a 'refine_<database_name>_sql_parsed.jsonl' file.
+    """
+    sqls = []
+    with open(views_file, 'r') as f:
+        for line in f:
+            sqls.append(json.loads(line)['sql'])
+    return sqls
+
+def synthetic_view(n_columns=20, n_tables=4, seed=0):
+    """
+    Generate a synthetic view definition with aliases, joins, string values and comparison operators.
+    """
+    rng = random.Random(seed)
+    tables = [f"table_{i}" for i in range(n_tables)]
+    columns = ', '.join(f"T{rng.randrange(n_tables)}.col_{j} AS c_{j}" for j in range(n_columns))
+    joins = ' '.join(f"JOIN {t} AS T{i} ON T{i}.id = T0.{t}_id" for i, t in enumerate(tables[1:], start=1))
+    conditions = ' AND '.join(f"T{rng.randrange(n_tables)}.col_{j} {rng.choice(['>=', '<=', '!=', '='])} '{'value ' * rng.randrange(1, 4)}'" for j in range(n_columns // 2))
+    return f"CREATE VIEW view_{seed} AS SELECT {columns} FROM {tables[0]} AS T0 {joins} WHERE {conditions};"
+
+def time_function(fn, inputs, repeat=3):
+    """
+    Best wall-clock time (in seconds) of applying fn to all inputs.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for x in inputs:
+            fn(x)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def benchmark_tokenize(sqls, repeat=3):
+    """
+    Compare the single-pass SQL lexer (tokenize) with the NLTK-based tokenizer (tokenize_nltk): token stream equivalence and speed.
+    """
+    print(f"Corpus: {len(sqls)} statements, {sum(len(s) for s in sqls)} characters.")
+    lexer_time = time_function(tokenize, sqls, repeat)
+    print(f"tokenize      : {lexer_time:.4f}s ({1e6 * lexer_time / len(sqls):.1f} us/statement)")
+    try:
+        tokenize_nltk("SELECT 1")
+    except (ImportError, LookupError) as e:
+        print(f"NLTK (or its punkt data) is not available, skipping the comparison with tokenize_nltk: {type(e).__name__}.")
+        return
+    nltk_time = time_function(tokenize_nltk, sqls, repeat)
+    print(f"tokenize_nltk : {nltk_time:.4f}s ({1e6 * nltk_time / len(sqls):.1f} us/statement), speedup {nltk_time / lexer_time:.1f}x")
+
+    # Equivalence of the token streams
+    n_equal = 0
+    mismatches = []
+    for sql in sqls:
+        try:
+            expected = tokenize_nltk(sql)
+        except Exception as e:
+            expected = f"error: {e}"
+        try:
+            toks = tokenize(sql)
+        except Exception as e:
+            toks = f"error: {e}"
+        if toks == expected:
+            n_equal += 1
+        else:
+            mismatches.append((sql, expected, toks))
+    print(f"Identical token streams: {n_equal} / {len(sqls)}")
+    for sql, expected, toks in mismatches[:5]:
+        print(f"- SQL: {sql}\n  tokenize_nltk: {expected}\n  tokenize     : {toks}")
+
+def synthetic_schema(n_columns=20, n_tables=4):
+    """
+    Schema matching the tables and columns of the synthetic views.
+    """
+    tables = [f"table_{i}" for i in range(n_tables)]
+    schema = {}
+    for t in tables:
+        schema[t] = [f"col_{j}" for j in range(n_columns)] + ["id"] + [f"{other}_id" for other in tables]
+    return Schema(schema)
+
+def benchmark_parse(sizes=(10, 50, 100, 500, 1000), n_views=20, repeat=3):
+    """
+    Parse time of long synthetic views, per token. A constant time per token across sizes means that parsing is linear in the number of tokens.
+    """
+    print(f"{'columns':>8} {'tokens':>8} {'ms/view':>10} {'us/token':>10}")
+    for n_columns in sizes:
+        schema = synthetic_schema(n_columns=n_columns)
+        sqls = [synthetic_view(n_columns=n_columns, seed=i).split(" AS ", 1)[1].rstrip(";") for i in range(n_views)]
+        n_tokens = sum(len(tokenize(sql)) for sql in sqls)
+        elapsed = time_function(lambda sql: get_sql(schema, sql), sqls, repeat)
+        print(f"{n_columns:>8} {n_tokens // n_views:>8} {1e3 * elapsed / n_views:>10.2f} {1e6 * elapsed / n_tokens:>10.2f}")
+
+def synthetic_embeddings(n, dim=256, n_topics=200, noise=0.5, seed=0):
+    """
+    Unit embeddings drawn around n_topics random directions (views about the same topic have similar embeddings).
+    """
+    import numpy as np
+    from src.retrieval import normalize_rows
+    rng = np.random.default_rng(seed)
+    topics = normalize_rows(rng.standard_normal((n_topics, dim)))
+    return normalize_rows(topics[rng.integers(n_topics, size=n)] + noise * rng.standard_normal((n, dim)).astype(np.float32) / np.sqrt(dim))
+
+def benchmark_retrieval(n_views=100000, dim=256, n_queries=100, k=5, n_probes=(1, 4, 16, 64), repeat=3):
+    """
+    Latency of top-k retrieval: row-by-row dot products with a full sort (the baseline), the exact index (one query at a time
+    and batched) and the IVF index (with its recall@k against the exact results).
+    """
+    import numpy as np
+    from src.retrieval import RetrievalIndex
+    embeddings = synthetic_embeddings(n_views, dim=dim)
+    queries = synthetic_embeddings(n_queries, dim=dim, seed=1)
+    index = RetrievalIndex(embeddings, normalize=False)
+    print(f"{n_views} views, dimension {dim}, {n_queries} queries, k={k}")
+    baseline = time_function(lambda q: np.argsort([-np.dot(q, x) for x in embeddings])[:k], queries[:5], repeat)
+    print(f"{'row by row + sort':>22} : {1e3 * baseline / 5:8.3f} ms/query")
+    exact = time_function(lambda q: index.search(q, k=k), queries, repeat)
+    print(f"{'exact':>22} : {1e3 * exact / n_queries:8.3f} ms/query")
+    batched = time_function(lambda Q: index.search(Q, k=k), [queries], repeat)
+    print(f"{'exact, batched':>22} : {1e3 * batched / n_queries:8.3f} ms/query")
+    exact_indices, _ = index.search(queries, k=k)
+    start = time.perf_counter()
+    index.build_ivf()
+    print(f"{'IVF build':>22} : {time.perf_counter() - start:8.3f} s")
+    for n_probe in n_probes:
+        elapsed = time_function(lambda q: index.search(q, k=k, n_probe=n_probe), queries, repeat)
+        ivf_indices, _ = index.search(queries, k=k, n_probe=n_probe)
+        recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(exact_indices, ivf_indices)])
+        print(f"{f'IVF, n_probe={n_probe}':>22} : {1e3 * elapsed / n_queries:8.3f} ms/query, recall@{k} {recall:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("benchmark", choices=["tokenize", "parse", "retrieval"], help="Benchmark to run.")
+    parser.add_argument("--views_file", type=str, default=None, help="Path to a 'refine_<database_name>_sql_parsed.jsonl' file. Defaults to a synthetic corpus.")
+    parser.add_argument("--n_views", type=int, default=1000, help="Number of synthetic views.")
+    parser.add_argument("--dim", type=int, default=256, help="Embedding dimension (retrieval benchmark).")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of repetitions (the best time is reported).")
+    args = parser.parse_args()
+    sqls = load_view_corpus(args.views_file) if args.views_file else [synthetic_view(seed=i) for i in range(args.n_views)]
+    if args.benchmark == "tokenize":
+        benchmark_tokenize(sqls, repeat=args.repeat)
+    elif args.benchmark == "parse":
+        benchmark_parse(repeat=args.repeat)
+    elif args.benchmark == "retrieval":
+        benchmark_retrieval(n_views=args.n_views, dim=args.dim, repeat=args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Canonical SQL fingerprints.
+Canonical forms of parsed queries (process_sql ASTs), used to detect views that are the same query up to
+aliases, identifier case, the order of commutative conditions and operands, and the order of the selected columns.
+The parts of a query that the parser loses (outer joins, LIMIT/OFFSET values) are read from the token stream of its text.
+"""
+import json
+import hashlib
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.process_sql import WHERE_OPS, UNIT_OPS, tokenize
+from src.ast_cache import normalize_sql
+
+# Comparison operators that are unchanged (or mirrored) when their operands are swapped
+_SYMMETRIC_OPS = {WHERE_OPS.index('='), WHERE_OPS.index('!=')}
+_MIRRORED_OPS = {WHERE_OPS.index('>'): WHERE_OPS.index('<'), WHERE_OPS.index('<'): WHERE_OPS.index('>'),
+                 WHERE_OPS.index('>='): WHERE_OPS.index('<='), WHERE_OPS.index('<='): WHERE_OPS.index('>=')}
+_COMMUTATIVE_UNIT_OPS = {UNIT_OPS.index('+'), UNIT_OPS.index('*')}
+# Join keywords dropped before parsing (see postprocess.simplify_join_condition): all joins are parsed as inner joins
+_OUTER_JOIN_TOKENS = frozenset(['left', 'right', 'full', 'outer', 'natural'])
+# Tokens ending a LIMIT clause (besides the closing parenthesis of a subquery)
+_LIMIT_END_TOKENS = frozenset([';', 'union', 'intersect', 'except'])
+
+
+def _dumps(obj):
+    return json.dumps(obj, sort_keys=True, separators=(',', ':'))
+
+def _sorted(items):
+    return sorted(items, key=_dumps)
+
+
+def _is_col_unit(val):
+    return isinstance(val, (tuple, list)) and len(val) == 3 and isinstance(val[1], str) and not isinstance(val[0], str)
+
+def _canonical_val(val):
+    if isinstance(val, dict):
+        return canonical_sql(val)
+    if _is_col_unit(val):
+        return _canonical_col_unit(val)
+    return val
+
+def _canonical_col_unit(col_unit):
+    if col_unit is None:
+        return None
+    agg_id, col_id, is_distinct = col_unit
+    return [agg_id, col_id.lower(), bool(is_distinct)]
+
+def _canonical_val_unit(val_unit):
+    unit_op, col_unit1, col_unit2 = val_unit
+    col_unit1, col_unit2 = _canonical_col_unit(col_unit1), _canonical_col_unit(col_unit2)
+    if unit_op in _COMMUTATIVE_UNIT_OPS:
+        col_unit1, col_unit2 = _sorted([col_unit1, col_unit2])
+    return [unit_op, col_unit1, col_unit2]
+
+def _canonical_cond_unit(cond_unit):
+    not_op, op_id, val_unit, val1, val2 = cond_unit
+    val_unit = _canonical_val_unit(val_unit)
+    # Comparison of two columns: order the operands, mirroring the operator if needed
+    if _is_col_unit(val1) and val2 is None and (op_id in _SYMMETRIC_OPS or op_id in _MIRRORED_OPS):
+        other = _canonical_val_unit((0, val1, None))
+        if _dumps(other) < _dumps(val_unit) and (val_unit[0] == 0 and val_unit[2] is None):
+            val_unit, val1 = other, val_unit[1]
+            op_id = _MIRRORED_OPS.get(op_id, op_id)
+            return [bool(not_op), op_id, val_unit, val1, None]
+    return [bool(not_op), op_id, val_unit, _canonical_val(val1), _canonical_val(val2)]
+
+def _canonical_condition(condition):
+    """
+    Canonical form of a condition list: a sorted disjunction of sorted conjunctions (AND binds tighter than OR).
+    """
+    if not condition:
+        return []
+    disjuncts = [[]]
+    for item in condition:
+        if item == 'or':
+            disjuncts.append([])
+        elif item != 'and':
+            disjuncts[-1].append(_canonical_cond_unit(item))
+    return _sorted([_sorted(conjuncts) for conjuncts in disjuncts])
+
+def _canonical_table_unit(table_unit):
+    table_type, table = table_unit
+    if isinstance(table, dict):
+        return [table_type, canonical_sql(table)]
+    return [table_type, table.lower()]
+
+
+def canonical_sql(sql_parsed):
+    """
+    Canonical form of a parsed query (the dictionary returned by process_sql.get_sql), as JSON-serializable lists.
+    Aliases are already resolved by the parser; identifiers are lower-cased, commutative conditions, operands,
+    selected columns, tables and group-by columns are sorted. Repeated tables are kept, so a self-join differs from a
+    scan of the table (the parser also lists a table twice when its alias is given without AS). ORDER BY keeps its order.
+    """
+    is_distinct, select_units = sql_parsed['select']
+    order_by = sql_parsed.get('orderBy') or []
+    return {
+        'select': [bool(is_distinct), _sorted([[agg_id, _canonical_val_unit(val_unit)] for agg_id, val_unit in select_units])],
+        'from': {
+            'table_units': _sorted([_canonical_table_unit(table_unit) for table_unit in sql_parsed['from']['table_units']]),
+            'conds': _canonical_condition(sql_parsed['from']['conds']),
+        },
+        'where': _canonical_condition(sql_parsed.get('where')),
+        'groupBy': _sorted([_canonical_col_unit(col_unit) for col_unit in sql_parsed.get('groupBy') or []]),
+        'having': _canonical_condition(sql_parsed.get('having')),
+        'orderBy': [order_by[0], [_canonical_val_unit(val_unit) for val_unit in order_by[1]]] if order_by else [],
+        'limit': sql_parsed.get('limit'),
+        'intersect': canonical_sql(sql_parsed['intersect']) if sql_parsed.get('intersect') else None,
+        'union': canonical_sql(sql_parsed['union']) if sql_parsed.get('union') else None,
+        'except': canonical_sql(sql_parsed['except']) if sql_parsed.get('except') else None,
+    }
+
+def _lost_clauses(sql):
+    """
+    Parts of a query that its parsed form does not keep, read from its token stream: whether it has an outer (or natural)
+    join, and its LIMIT clauses with their OFFSET (the parser keeps no limit value). None if the text cannot be tokenized.
+    """
+    try:
+        toks = tokenize(sql)
+    except Exception:
+        return None
+    outer_join = any(tok == 'join' and i > 0 and toks[i - 1] in _OUTER_JOIN_TOKENS for i, tok in enumerate(toks))
+    limits = []
+    for i in (i for i, tok in enumerate(toks) if tok == 'limit'):
+        clause, depth = [], 0
+        for tok in toks[i + 1:]:
+            if tok == ')' and depth == 0 or depth == 0 and tok in _LIMIT_END_TOKENS:
+                break
+            depth += (tok == '(') - (tok == ')')
+            clause.append(tok)
+        limits.append(clause)
+    return outer_join, limits
+
+def sql_fingerprint(sql_parsed, sql=None):
+    """
+    Structural fingerprint of a parsed query: a hash of its canonical form.
+    If the SQL text is given, its LIMIT/OFFSET clauses are part of the fingerprint, and queries with outer joins
+    (parsed as inner joins) or whose text cannot be tokenized have no fingerprint (None).
+    """
+    canonical = canonical_sql(sql_parsed)
+    if sql is not None:
+        lost = _lost_clauses(sql)
+        if lost is None or lost[0]:
+            return None
+        canonical['limit'] = lost[1]
+    return hashlib.sha256(_dumps(canonical).encode('utf-8')).hexdigest()
+
+def text_fingerprint(sql):
+    """
+    Exact fingerprint of a SQL statement: a hash of its token stream (insensitive to whitespace and keyword case).
+    """
+    return hashlib.sha256(normalize_sql(sql).encode('utf-8')).hexdigest()
+
+
+def dedupe_views(views, sql_key='sql', parsed_key='sql_parsed'):
+    """
+    Deduplicate view dictionaries (e.g., the records of 'refine_<database_name>_sql_parsed.jsonl'), keeping the first occurrence.
+    Views with the same SQL text are exact duplicates; views whose parsed queries have the same canonical form are structural
+    duplicates. Views that could not be parsed, or have no structural fingerprint (e.g., outer joins), are only deduplicated exactly.
+    Returns the list of unique views and a report with the number of views collapsed.
+    """
+    unique_views = []
+    seen_text, seen_structure = set(), set()
+    report = {'total': 0, 'exact_duplicates': 0, 'structural_duplicates': 0}
+    for view in views:
+        report['total'] += 1
+        text_key = text_fingerprint(view[sql_key])
+        if text_key in seen_text:
+            report['exact_duplicates'] += 1
+            continue
+        seen_text.add(text_key)
+        structure_key = sql_fingerprint(view[parsed_key], view[sql_key]) if isinstance(view.get(parsed_key), dict) else None
+        if structure_key is not None:
+            if structure_key in seen_structure:
+                report['structural_duplicates'] += 1
+                continue
+            seen_structure.add(structure_key)
+        unique_views.append(view)
+    report['unique'] = len(unique_views)
+    return unique_views, report
@@ -0,0 +1,150 @@
+"""
+Chat store.
+Append-only, segmented JSONL store for chat transcripts. Each record is written (and flushed) as soon as it is appended,
+optionally as an independent gzip member, and an offset index allows random access and live tailing.
+"""
+import os
+import gzip
+import json
+import time
+
+class ChatStore:
+    """
+    Segmented JSONL store with an offset index.
+    directory: the store directory, containing the segments ('segment-<n>.jsonl' or 'segment-<n>.jsonl.gz') and 'index.tsv'.
+    compress: whether new records are gzip-compressed.
+    segment_size: size in bytes after which a new segment is started.
+    """
+    INDEX_FILE = "index.tsv"
+
+    def __init__(self, directory: str, compress: bool = False, segment_size: int = 64 * 1024 * 1024):
+        self._directory = directory
+        self._compress = compress
+        self._segment_size = segment_size
+        os.makedirs(directory, exist_ok=True)
+        self._index_path = os.path.join(directory, self.INDEX_FILE)
+        # Index entries: (segment file name, offset, length)
+        self._entries = []
+        self._index_pos = 0
+        self._segment_file = None
+        self._index_file = None
+        self._refresh_index()
+
+    @property
+    def directory(self):
+        return self._directory
+
+    def _refresh_index(self):
+        """
+        Read the index entries appended since the last refresh. Only complete lines are used.
+        """
+        if not os.path.exists(self._index_path):
+            return
+        with open(self._index_path, "r") as f:
+            f.seek(self._index_pos)
+            for line in f:
+                if not line.endswith("\n"):
+                    break
+                segment, offset, length = line.rstrip("\n").split("\t")
+                self._entries.append((segment, int(offset), int(length)))
+                self._index_pos += len(line)
+
+    def _segment_name(self, segment_id):
+        return f"segment-{segment_id:05d}.jsonl" + (".gz" if self._compress else "")
+
+    def _open_segment(self):
+        """
+        Open the segment to append to: the last segment if it has room and the same compression, else a new one.
+        """
+        segment_id = 0
+        if self._entries:
+            last_segment = self._entries[-1][0]
+            segment_id = int(last_segment.split("-")[1].split(".")[0])
+            last_path = os.path.join(self._directory, last_segment)
+            if last_segment == self._segment_name(segment_id) and os.path.getsize(last_path) < self._segment_size:
+                return last_segment, open(last_path, "ab")
+            segment_id += 1
+        segment = self._segment_name(segment_id)
+        return segment, open(os.path.join(self._directory, segment), "ab")
+
+    def append(self, record) -> int:
+        """
+        Append a record (any JSON-serializable object) and flush it to disk. Returns the record number.
+        """
+        if self._segment_file is None:
+            self._segment, self._segment_file = self._open_segment()
+            self._index_file = open(self._index_path, "a")
+        elif self._segment_file.tell() >= self._segment_size:
+            self._segment_file.close()
+            segment_id = int(self._segment.split("-")[1].split(".")[0]) + 1
+            self._segment = self._segment_name(segment_id)
+            self._segment_file = open(os.path.join(self._directory, self._segment), "ab")
+
+        data = (json.dumps(record) + "\n").encode("utf-8")
+        if self._compress:
+            data = gzip.compress(data)
+        offset = self._segment_file.tell()
+        self._segment_file.write(data)
+        self._segment_file.flush()
+        # The index entry is written after the data, so readers never see an entry without its record
+        self._index_file.write(f"{self._segment}\t{offset}\t{len(data)}\n")
+        self._index_file.flush()
+        self._entries.append((self._segment, offset, len(data)))
+        self._index_pos = self._index_file.tell()
+        return len(self._entries) - 1
+
+    def _read_entry(self, entry):
+        segment, offset, length = entry
+        with open(os.path.join(self._directory, segment), "rb") as f:
+            f.seek(offset)
+            data = f.read(length)
+        if segment.endswith(".gz"):
+            data = gzip.decompress(data)
+        return json.loads(data)
+
+    def __len__(self):
+        self._refresh_index()
+        return len(self._entries)
+
+    def __getitem__(self, record_id: int):
+        """
+        Random access to a record by its number.
+        """
+        if record_id >= len(self._entries):
+            self._refresh_index()
+        return self._read_entry(self._entries[record_id])
+
+    def __iter__(self):
+        return self.iter_records()
+
+    def iter_records(self, start: int = 0):
+        """
+        Stream the records, holding one record in memory at a time.
+        """
+        self._refresh_index()
+        for record_id in range(start, len(self._entries)):
+            yield self._read_entry(self._entries[record_id])
+
+    def tail(self, start: int = 0, poll_interval: float = 1.0, timeout: float = None):
+        """
+        Follow the store while it is being written (e.g., by a running refinement), yielding new records as they appear.
+        Stops after timeout seconds without new records, or never if timeout is None.
+        """
+        record_id = start
+        last_update = time.monotonic()
+        while True:
+            self._refresh_index()
+            while record_id < len(self._entries):
+                yield self._read_entry(self._entries[record_id])
+                record_id += 1
+                last_update = time.monotonic()
+            if timeout is not None and time.monotonic() - last_update > timeout:
+                return
+            time.sleep(poll_interval)
+
+    def close(self):
+        if self._segment_file is not None:
+            self._segment_file.close()
+            self._index_file.close()
+            self._segment_file = None
+            self._index_file = None
@@ -0,0 +1,232 @@
+"""
+View clustering.
+Sweep over the number of clusters for k-means on the view embeddings: the embeddings are optionally reduced with PCA
+(to float32), the values of k are fitted in parallel in a process pool, the silhouette score is estimated on a sample
+of the views, and the results are cached by (embedding-matrix hash, k, parameters).
+"""
+import os
+import json
+import sqlite3
+import hashlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.decomposition import PCA
+from sklearn.metrics import silhouette_score
+
+# Embedding matrix of the sweep workers
+_worker_data = None
+
+
+def reduce_dimensions(X, n_components=None, seed=0):
+    """
+    Project X on its first n_components principal components, as float32 (X as float32 if n_components is None
+    or not smaller than its dimension).
+    """
+    X = np.asarray(X, dtype=np.float32)
+    if n_components is None or n_components >= min(X.shape):
+        return X
+    return PCA(n_components=n_components, svd_solver='randomized', random_state=seed).fit_transform(X).astype(np.float32)
+
+def matrix_hash(X):
+    """
+    Hash of the shape, type and contents of a matrix.
+    """
+    X = np.ascontiguousarray(X)
+    digest = hashlib.sha256(f"{X.shape}:{X.dtype}".encode('utf-8'))
+    digest.update(X.data)
+    return digest.hexdigest()
+
+
+def _init_sweep_worker(X):
+    global _worker_data
+    _worker_data = X
+
+def _fit_k(k, n_init, max_iter, minibatch, sample_size, seed, X=None):
+    """
+    Fit k-means with k clusters. Returns the inertia and the (sampled) silhouette score.
+    """
+    X = _worker_data if X is None else X
+    if minibatch:
+        model = MiniBatchKMeans(n_clusters=k, init='k-means++', max_iter=max_iter, n_init=n_init, random_state=seed)
+    else:
+        model = KMeans(n_clusters=k, init='k-means++', max_iter=max_iter, n_init=n_init, random_state=seed)
+    labels = model.fit_predict(X)
+    sample_size = min(len(X), sample_size) if sample_size else None
+    return float(model.inertia_), float(silhouette_score(X, labels, sample_size=sample_size, random_state=seed))
+
+
+def _decrease_rate(inertia, next_inertia):
+    """
+    Relative decrease of the inertia from one k to the next: inf if it drops to zero, 0 if it already was zero.
+    """
+    if next_inertia > 0:
+        return (inertia - next_inertia) / next_inertia
+    return float('inf') if inertia > 0 else 0.0
+
+def _open_sweep_cache(cache_file):
+    conn = sqlite3.connect(cache_file)
+    conn.execute("CREATE TABLE IF NOT EXISTS cluster_sweep (key TEXT PRIMARY KEY, inertia REAL, silhouette REAL)")
+    conn.commit()
+    return conn
+
+def cluster_sweep(X, ks, n_components=None, n_init=10, max_iter=100, minibatch=False, silhouette_sample_size=2000, n_workers=None, cache_file=None, seed=0):
+    """
+    Fit k-means for each number of clusters in ks and score the clusterings.
+    n_components: if set, reduce the embeddings with PCA first.
+    minibatch: use MiniBatchKMeans (faster on large catalogs).
+    silhouette_sample_size: number of views the silhouette score is estimated on (None for all, which is quadratic).
+    n_workers: number of processes (None for the number of CPUs, 1 to run in-process).
+    cache_file: SQLite file caching the result of each k, keyed by the hash of the (reduced) matrix and the parameters.
+    Returns a dictionary with the 'ks', their 'inertia' (the elbow curve), their 'silhouette' scores, the 'best_k'
+    (highest silhouette score) and the 'decrease_rate' of the inertia between consecutive values of k.
+    """
+    ks = [k for k in ks if 1 < k < len(X)]
+    X = reduce_dimensions(X, n_components=n_components, seed=seed)
+    params = json.dumps([n_init, max_iter, minibatch, silhouette_sample_size, seed])
+    key_prefix = f"{matrix_hash(X)}:{params}"
+    results = {}
+    conn = _open_sweep_cache(cache_file) if cache_file else None
+    try:
+        if conn is not None:
+            for k in ks:
+                row = conn.execute("SELECT inertia, silhouette FROM cluster_sweep WHERE key = ?", (f"{key_prefix}:{k}",)).fetchone()
+                if row is not None:
+                    results[k] = row
+        missing = [k for k in ks if k not in results]
+        n_workers = min(len(missing), n_workers or os.cpu_count() or 1)
+        if n_workers > 1:
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_sweep_worker, initargs=(X,)) as executor:
+                futures = {k: executor.submit(_fit_k, k, n_init, max_iter, minibatch, silhouette_sample_size, seed) for k in missing}
+                for k, future in futures.items():
+                    results[k] = future.result()
+        else:
+            for k in missing:
+                results[k] = _fit_k(k, n_init, max_iter, minibatch, silhouette_sample_size, seed, X=X)
+        if conn is not None:
+            conn.executemany("INSERT OR REPLACE INTO cluster_sweep (key, inertia, silhouette) VALUES (?, ?, ?)",
+                             ((f"{key_prefix}:{k}", *results[k]) for k in missing))
+            conn.commit()
+    finally:
+        if conn is not None:
+            conn.close()
+    inertia = [results[k][0] for k in ks]
+    silhouette = [results[k][1] for k in ks]
+    return {
+        'ks': ks,
+        'inertia': inertia,
+        'silhouette': silhouette,
+        'best_k': ks[int(np.argmax(silhouette))] if ks else None,
+        'decrease_rate': [_decrease_rate(inertia[i], inertia[i + 1]) for i in range(len(ks) - 1)],
+    }
+
+
+class IncrementalClusterer:
+    """
+    Assigns new view embeddings to existing clusters without re-clustering the catalog.
+    A new view joins the cluster of its nearest centroid, whose centroid is updated online (running mean), unless it is
+    farther than novelty_threshold from every centroid, in which case it opens a new cluster. Drift since the last full
+    clustering is tracked, and needs_recluster() tells when it exceeds its bounds.
+    centroids, counts: the clusters of the last full clustering (centroid vectors and number of views).
+    mean_distance: mean distance of the views to their centroid in the last full clustering.
+    """
+    def __init__(self, centroids, counts, novelty_threshold, mean_distance, max_novel_fraction=0.05, max_distance_ratio=1.5, max_growth=0.5):
+        self.centroids = np.array(centroids, dtype=np.float32)
+        self.counts = np.array(counts, dtype=np.int64)
+        self.novelty_threshold = float(novelty_threshold)
+        self.mean_distance = float(mean_distance)
+        self.max_novel_fraction = max_novel_fraction
+        self.max_distance_ratio = max_distance_ratio
+        self.max_growth = max_growth
+        self._n_fitted = int(self.counts.sum())
+        self._n_added = 0
+        self._n_novel = 0
+        self._added_distance = 0.0
+
+    @classmethod
+    def from_labels(cls, X, labels, novelty_quantile=0.99, **kwargs):
+        """
+        Start from a full clustering of X (e.g., the labels of k-means). The novelty threshold is the novelty_quantile
+        of the distances of the views to their centroid.
+        """
+        X = np.asarray(X, dtype=np.float32)
+        labels = np.asarray(labels)
+        clusters, labels = np.unique(labels, return_inverse=True)
+        counts = np.bincount(labels, minlength=len(clusters))
+        centroids = np.zeros((len(clusters), X.shape[1]), dtype=np.float32)
+        np.add.at(centroids, labels, X)
+        centroids /= counts[:, None]
+        distances = np.linalg.norm(X - centroids[labels], axis=1)
+        return cls(centroids, counts, np.quantile(distances, novelty_quantile), distances.mean(), **kwargs)
+
+    def _nearest(self, X):
+        # Squared euclidean distances to the centroids, without materializing the differences
+        distances = (X ** 2).sum(axis=1)[:, None] - 2 * X @ self.centroids.T + (self.centroids ** 2).sum(axis=1)[None, :]
+        nearest = np.argmin(distances, axis=1)
+        return nearest, np.sqrt(np.maximum(distances[np.arange(len(X)), nearest], 0))
+
+    def add(self, X):
+        """
+        Assign new views (a matrix of embeddings) to clusters. Returns their cluster labels; new clusters get the next labels.
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=np.float32))
+        labels, distances = self._nearest(X)
+        novel = distances > self.novelty_threshold
+        # Update the centroids of the clusters that received views
+        assigned = np.flatnonzero(~novel)
+        if len(assigned):
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, labels[assigned], X[assigned])
+            added = np.bincount(labels[assigned], minlength=len(self.centroids))
+            updated = added > 0
+            self.centroids[updated] = (self.centroids[updated] * self.counts[updated, None] + sums[updated]) / (self.counts[updated] + added[updated])[:, None]
+            self.counts += added
+            self._added_distance += float(distances[assigned].sum())
+        # Novel views open new clusters (or join a cluster opened by a previous novel view of the batch)
+        for i in np.flatnonzero(novel):
+            label, distance = self._nearest(X[i:i + 1])
+            if distance[0] > self.novelty_threshold:
+                self.centroids = np.vstack([self.centroids, X[i]])
+                self.counts = np.append(self.counts, 1)
+                labels[i] = len(self.centroids) - 1
+                self._n_novel += 1
+            else:
+                labels[i] = label[0]
+                self.centroids[label[0]] += (X[i] - self.centroids[label[0]]) / (self.counts[label[0]] + 1)
+                self.counts[label[0]] += 1
+                self._added_distance += float(distance[0])
+        self._n_added += len(X)
+        return labels
+
+    def drift(self):
+        """
+        Drift since the last full clustering: the fraction of new views that opened clusters, the ratio of the mean distance
+        of the other new views to their centroid over the mean distance of the full clustering, and the growth of the catalog.
+        """
+        n_assigned = self._n_added - self._n_novel
+        return {
+            'novel_fraction': self._n_novel / max(self._n_added, 1),
+            'distance_ratio': (self._added_distance / n_assigned) / self.mean_distance if n_assigned and self.mean_distance > 0 else 0.0,
+            'growth': self._n_added / max(self._n_fitted, 1),
+        }
+
+    def needs_recluster(self):
+        """
+        Whether the drift exceeds its bounds, in which case the catalog should be clustered again from scratch.
+        """
+        drift = self.drift()
+        return (drift['novel_fraction'] > self.max_novel_fraction or drift['distance_ratio'] > self.max_distance_ratio
+                or drift['growth'] > self.max_growth)
+
+    def save(self, path):
+        np.savez(path, centroids=self.centroids, counts=self.counts, state=np.array([self.novelty_threshold, self.mean_distance,
+                 self.max_novel_fraction, self.max_distance_ratio, self.max_growth, self._n_fitted, self._n_added, self._n_novel, self._added_distance]))
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        state = data['state']
+        clusterer = cls(data['centroids'], data['counts'], state[0], state[1], max_novel_fraction=state[2], max_distance_ratio=state[3], max_growth=state[4])
+        clusterer._n_fitted, clusterer._n_added, clusterer._n_novel = int(state[5]), int(state[6]), int(state[7])
+        clusterer._added_distance = float(state[8])
+        return clusterer
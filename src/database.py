@@ -10,7 +10,8 @@ from typing import List, Dict
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from src.database_utils import get_view_name_from_definition
+from src.database_utils import get_view_name_from_definition, sample_local_database
+from src.schema_wording import budgeted_schema_wording
 
 """
 NLQuery class
@@ -75,18 +76,43 @@ class Database:
         """
         raise NotImplementedError
     
+    def schema_version(self):
+        """
+        Get a value that changes whenever the schema of the database changes (e.g., a view is created).
+        """
+        raise NotImplementedError
+
     def schema_wording(self, selected_tables: List[str] = None, include_sample_data: bool = True, sample_size: int = 5):
         """
         Generate a textual description of the schema of the database.
         """
         raise NotImplementedError
 
+    def schema_wording_budgeted(self, token_budget: int, selected_tables: List[str] = None, include_sample_data: bool = True, sample_size: int = 5, model: str = "gpt-4o"):
+        """
+        Generate the textual description of the schema of the database within a token budget.
+        Returns the description and a report of what was cut.
+        """
+        raise NotImplementedError
+
     def schema_graph(self, save_dir: str = None):
         """
         Generate a networkx graph object representing the schema of the database.
         """
         raise NotImplementedError
     
+    def sample_database(self, sample_dir: str, fraction: float = 0.1, seed: int = 0, verbose: bool = True):
+        """
+        Create a referentially consistent sample of the database and return it as a database object.
+        """
+        raise NotImplementedError
+
+    def get_views(self):
+        """
+        Get a dictionary of the views in the database, with the view name as key and the view definition as value.
+        """
+        raise NotImplementedError
+
     def materialize_view(self, view_definition: str, verbose: bool = True, persist: bool = False):
         """
         Materialize a view in the database.
@@ -102,6 +128,13 @@ class SQLiteDatabase(Database):
         super().__init__(database_name)
         self._db_dir = database_dir
         self._query_log_full_path = query_log_full_path
+        self._schema_graph = None
+        self._schema_graph_version = None
+        self._schema_wording_cache = {}
+
+    @property
+    def database_dir(self):
+        return self._db_dir
 
     def get_tables(self):
         """
@@ -176,11 +209,26 @@ class SQLiteDatabase(Database):
         conn.close()
 
         return schema
+
+    def schema_version(self):
+        """
+        Get the schema version of the SQLite database. SQLite increments it on every schema change.
+        """
+        conn = sqlite3.connect(self._db_dir)
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA schema_version")
+        version = cursor.fetchone()[0]
+        conn.close()
+        return version
     
-    def schema_wording(self, selected_tables: List[str] = None, include_sample_data: bool = True, sample_size: int = 5):
+    def schema_wording(self, selected_tables: List[str] = None, include_sample_data: bool = True, sample_size: int = 5, token_budget: int = None):
         """
         Generate a textual description of the schema of the SQLite database, in the form of Data Definition Language (DDL) statements.
+        token_budget: If provided, the description is compressed to fit this number of tokens (see schema_wording_budgeted).
         """
+        if token_budget is not None:
+            return self.schema_wording_budgeted(token_budget, selected_tables=selected_tables, include_sample_data=include_sample_data, sample_size=sample_size)[0]
+
         # Connect to the SQLite database
         conn = sqlite3.connect(self._db_dir)
         cursor = conn.cursor()
@@ -240,6 +288,33 @@ class SQLiteDatabase(Database):
 
         return DDL
 
+    def schema_wording_budgeted(self, token_budget: int, selected_tables: List[str] = None, include_sample_data: bool = True, sample_size: int = 5, model: str = "gpt-4o"):
+        """
+        Generate the DDL description of the schema of the SQLite database within a token budget, compressing it progressively
+        (see schema_wording.budgeted_schema_wording). Returns the description and a report of what was cut.
+        Results are memoized until the schema of the database changes.
+        """
+        key = (self.schema_version(), tuple(selected_tables) if selected_tables else None, include_sample_data, sample_size, token_budget, model)
+        if key not in self._schema_wording_cache:
+            conn = sqlite3.connect(self._db_dir)
+            cursor = conn.cursor()
+            tables = []
+            for table_name in self.get_tables():
+                if selected_tables and table_name not in selected_tables:
+                    continue
+                cursor.execute(f"PRAGMA table_info({table_name})")
+                columns = cursor.fetchall()
+                cursor.execute(f"PRAGMA foreign_key_list({table_name})")
+                fks = [(fk[3], fk[2], fk[4]) for fk in cursor.fetchall()]
+                sample_rows = []
+                if include_sample_data:
+                    cursor.execute(f"SELECT * FROM {table_name} LIMIT {int(sample_size)}")
+                    sample_rows = cursor.fetchall()
+                tables.append({'name': table_name, 'columns': columns, 'fks': fks, 'sample_rows': sample_rows})
+            conn.close()
+            self._schema_wording_cache[key] = budgeted_schema_wording(tables, token_budget, sample_size=sample_size if include_sample_data else 0, model=model)
+        return self._schema_wording_cache[key]
+
     def schema_wording_simple(self, selected_tables: List[str] = None, include_sample_data: bool = True, sample_size: int = 5):
         """
         Generate a textual description of the schema of the SQLite database.
@@ -300,7 +375,12 @@ class SQLiteDatabase(Database):
     def schema_graph(self):
         """
         Generate a networkx graph object representing the schema of the SQLite database.
+        The graph is built once and rebuilt only when the schema of the database changes.
         """
+        version = self.schema_version()
+        if self._schema_graph is not None and version == self._schema_graph_version:
+            return self._schema_graph
+
         # Connect to the SQLite database
         conn = sqlite3.connect(self._db_dir)
         cursor = conn.cursor()
@@ -316,25 +396,55 @@ class SQLiteDatabase(Database):
             for fk in fks:
                 fk_id, fk_seq, fk_table, fk_from, fk_to, fk_on_update, fk_on_delete, fk_match = fk
                 fk_table_id = tables.index(fk_table)
+                if fk_to is None:
+                    # The foreign key references the primary key of the table implicitly
+                    cursor.execute(f"PRAGMA table_info({fk_table})")
+                    primary_key = [column[1] for column in sorted(cursor.fetchall(), key=lambda column: column[5]) if column[5] > 0]
+                    fk_to = primary_key[fk_seq] if fk_seq < len(primary_key) else 'rowid'
                 fk_pk_pairs.append((table_id, table_name, fk_table_id, fk_table, fk_from, fk_to))
         
         # Close the connection
         conn.close()
         
         # Make the schema graph 
-        G = nx.DiGraph()
+        G = nx.DiGraph(schema_version=version)
 
         # Create nodes representing tables
         for table_id, table_name in enumerate(tables):
             G.add_node(table_id, name=table_name)
 
-        # Create edges representing foreign-primary key pairs
-        for table_id, _, fk_table_id, _, _, _ in fk_pk_pairs:
-            G.add_edge(table_id, fk_table_id)
-            G.add_edge(fk_table_id, table_id)
-        
+        # Create edges representing foreign-primary key pairs, annotated with the joined columns
+        for table_id, table_name, fk_table_id, fk_table, fk_from, fk_to in fk_pk_pairs:
+            join = (table_name, fk_from, fk_table, fk_to)
+            for u, v in ((table_id, fk_table_id), (fk_table_id, table_id)):
+                if not G.has_edge(u, v):
+                    G.add_edge(u, v, joins=[])
+                if join not in G.edges[u, v]['joins']:
+                    G.edges[u, v]['joins'].append(join)
+
+        self._schema_graph = G
+        self._schema_graph_version = version
         return G
     
+    def sample_database(self, sample_dir: str, fraction: float = 0.1, seed: int = 0, verbose: bool = True):
+        """
+        Create a referentially consistent sample of the SQLite database (see database_utils.sample_local_database) at sample_dir,
+        replacing any existing file, and return it as a SQLiteDatabase with the same name and query log.
+        """
+        sample_local_database(self._db_dir, sample_dir, fraction=fraction, seed=seed, verbose=verbose, replace=True)
+        return SQLiteDatabase(self.db_name, sample_dir, self._query_log_full_path)
+
+    def get_views(self):
+        """
+        Get a dictionary of the views in the SQLite database, with the view name as key and the view definition as value.
+        """
+        conn = sqlite3.connect(self._db_dir)
+        cursor = conn.cursor()
+        cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'view'")
+        views = dict(cursor.fetchall())
+        conn.close()
+        return views
+
     def materialize_view(self, view_definition: str, verbose: bool = True, replace: bool = True, persist: bool = False):
         """
         Materialize a view in the SQLite database.
@@ -424,6 +534,8 @@ class SnowflakeDatabase(Database):
         assert 'warehouse' in self.snowflake_config, "Snowflake warehouse not found in the config file."
         assert 'database' in self.snowflake_config, "Snowflake database not found in the config file."
         assert 'schema' in self.snowflake_config, "Snowflake schema not found in the config file"
+        # Budgeted schema wordings, by schema version and options
+        self._schema_wording_cache = {}
 
     def _open_connection(self):
         """
@@ -512,6 +624,17 @@ class SnowflakeDatabase(Database):
         ctx.close()
 
         return schema
+
+    def schema_version(self):
+        """
+        Get the schema version of the Snowflake database, from the number of tables and views and their last modification time.
+        """
+        ctx, cs = self._open_connection()
+        cs.execute("SELECT COUNT(*), MAX(LAST_ALTERED) FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA = CURRENT_SCHEMA()")
+        version = tuple(cs.fetchone())
+        cs.close()
+        ctx.close()
+        return version
     
     def schema_wording(self, selected_tables: List[str] = None, include_sample_data: bool = True, sample_size: int = 5):
         """
@@ -573,6 +696,34 @@ class SnowflakeDatabase(Database):
 
         return DDL
 
+    def schema_wording_budgeted(self, token_budget: int, selected_tables: List[str] = None, include_sample_data: bool = True, sample_size: int = 5, model: str = "gpt-4o"):
+        """
+        Generate the DDL description of the schema of the Snowflake database within a token budget, compressing it progressively
+        (see schema_wording.budgeted_schema_wording). Returns the description and a report of what was cut.
+        Results are memoized until the schema of the database changes.
+        """
+        key = (self.schema_version(), tuple(selected_tables) if selected_tables else None, include_sample_data, sample_size, token_budget, model)
+        if key not in self._schema_wording_cache:
+            ctx, cs = self._open_connection()
+            tables = []
+            for table_name in self.get_tables():
+                if selected_tables and table_name not in selected_tables:
+                    continue
+                # Columns in the format of SQLite's PRAGMA table_info: cid, name, type, notnull, default, pk
+                cs.execute(f"DESCRIBE TABLE {table_name}")
+                columns = [(cid, column[0], column[1], int(column[3] == 'N'), column[4], int(column[5] == 'Y')) for cid, column in enumerate(cs.fetchall())]
+                cs.execute(f"SHOW IMPORTED KEYS IN TABLE {table_name}")
+                fks = [(fk[8], fk[3], fk[4]) for fk in cs.fetchall()]
+                sample_rows = []
+                if include_sample_data:
+                    cs.execute(f"SELECT * FROM {table_name} LIMIT {int(sample_size)}")
+                    sample_rows = cs.fetchall()
+                tables.append({'name': table_name, 'columns': columns, 'fks': fks, 'sample_rows': sample_rows})
+            cs.close()
+            ctx.close()
+            self._schema_wording_cache[key] = budgeted_schema_wording(tables, token_budget, sample_size=sample_size if include_sample_data else 0, model=model)
+        return self._schema_wording_cache[key]
+
     def schema_wording_simple(self, selected_tables: List[str] = None, include_sample_data: bool = True, sample_size: int = 5):
         """
         Generate a textual description of the schema of the Snowflake database.
@@ -634,6 +785,8 @@ class SnowflakeDatabase(Database):
         """
         Generate a networkx graph object representing the schema of the Snowflake database.
         """
+        version = self.schema_version()
+
         # Get connection and cursor
         ctx, cs = self._open_connection()
 
@@ -662,16 +815,20 @@ class SnowflakeDatabase(Database):
         ctx.close()
 
         # Make the schema graph 
-        G = nx.DiGraph()
+        G = nx.DiGraph(schema_version=version)
 
         # Create nodes representing tables
         for table_id, table_name in enumerate(tables):
             G.add_node(table_id, name=table_name)
 
-        # Create edges representing foreign-primary key pairs
-        for table_id, _, fk_table_id, _, _, _ in fk_pk_pairs:
-            G.add_edge(table_id, fk_table_id)
-            G.add_edge(fk_table_id, table_id)
+        # Create edges representing foreign-primary key pairs, annotated with the joined columns
+        for table_id, table_name, fk_table_id, fk_table, fk_from, fk_to in fk_pk_pairs:
+            join = (table_name, fk_from, fk_table, fk_to)
+            for u, v in ((table_id, fk_table_id), (fk_table_id, table_id)):
+                if not G.has_edge(u, v):
+                    G.add_edge(u, v, joins=[])
+                if join not in G.edges[u, v]['joins']:
+                    G.edges[u, v]['joins'].append(join)
         
         return G
     
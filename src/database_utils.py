@@ -1,18 +1,27 @@
 import os
 import re
 import json
+import time
 import random
 import sqlite3
+import itertools
 import snowflake.connector
 import sqlalchemy
 import sqlalchemy_schemadisplay
 import networkx as nx
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.sql_splitter import iter_sql_statements, split_sql_statements
 
 
-def create_local_database(database_dir, ddl, verbose=True, replace=False):
+def create_local_database(database_dir, ddl, verbose=True, replace=False, bulk=False):
     """
     Create a new SQLite database with the given a Data Definition Language (DDL) script.
+    bulk: If True, load the script with bulk_load_local_database (one transaction per chunk, load-time pragmas, deferred indexes).
     """
+    if bulk:
+        return bulk_load_local_database(database_dir, ddl=ddl, verbose=verbose, replace=replace)
+
     # Remove the existing database if it exists
     if replace:
         try:
@@ -28,10 +37,8 @@ def create_local_database(database_dir, ddl, verbose=True, replace=False):
     cursor = conn.cursor()
 
     # Split the script into individual queries
-    queries = ddl.split(";")
+    queries = split_sql_statements(ddl)
     for query in queries:
-        if query.strip() == "":
-            continue
         if verbose:
             print(f"Executing query: {query}")
         cursor.execute(query)
@@ -42,6 +49,121 @@ def create_local_database(database_dir, ddl, verbose=True, replace=False):
 
     return
 
+# Statement types that control transactions (skipped by bulk_load_local_database)
+_TRANSACTION_STATEMENTS = {"BEGIN", "COMMIT", "END", "ROLLBACK", "SAVEPOINT", "RELEASE"}
+
+def bulk_load_local_database(database_dir, ddl=None, ddl_file=None, table_rows=None, chunk_size=100000, journal_mode="OFF", defer_indexes=True, verbose=True, replace=False):
+    """
+    Create a new SQLite database from a large SQL script (e.g., a dump with many INSERT statements).
+    Input:
+    - database_dir: the path to the new database
+    - ddl: the SQL script as a string, or
+    - ddl_file: the path to the SQL script, streamed in chunks instead of being read in memory
+    - table_rows: optional dictionary mapping a table name to an iterable of row tuples, inserted with executemany
+    - chunk_size: number of statements (or rows) executed per transaction
+    - journal_mode: journal mode used during the load, 'OFF' or 'WAL'
+    - defer_indexes: whether to create the indexes after all the data is loaded
+    Transaction-control statements of the script (e.g., the BEGIN TRANSACTION and COMMIT of a dump) are skipped, as the
+    loader manages the transactions. The load runs without a rollback journal, so a failed load cannot be rolled back:
+    the partially loaded database is deleted and the error is raised.
+    Returns a dictionary with the number of statements, rows, elapsed seconds and rows per second.
+    """
+    assert journal_mode.upper() in ("OFF", "WAL"), "journal_mode should be 'OFF' or 'WAL'."
+
+    # Remove the existing database if it exists
+    if replace:
+        try:
+            os.remove(database_dir)
+        except OSError:
+            pass
+    else:
+        if os.path.exists(database_dir):
+            raise Exception(f"Database {database_dir} already exists. Set replace=True to overwrite.")
+
+    # Connect to the database, managing the transactions explicitly
+    conn = sqlite3.connect(database_dir, isolation_level=None)
+    cursor = conn.cursor()
+
+    # Load-time pragmas: no fsync and no rollback journal (or WAL) while loading
+    cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+    cursor.execute("PRAGMA synchronous=OFF")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-262144")
+
+    start_time = time.perf_counter()
+    n_statements = 0
+    n_rows = 0
+    deferred_indexes = []
+    try:
+        # Execute the script, committing once per chunk of statements
+        cursor.execute("BEGIN")
+        n_pending = 0
+        if ddl is not None or ddl_file is not None:
+            script = open(ddl_file, "r") if ddl_file is not None else ddl
+            try:
+                for statement in iter_sql_statements(script):
+                    if statement.statement_type in _TRANSACTION_STATEMENTS:
+                        continue
+                    if defer_indexes and statement.statement_type == "CREATE INDEX":
+                        deferred_indexes.append(statement.text)
+                        continue
+                    cursor.execute(statement.text)
+                    n_statements += 1
+                    if cursor.rowcount > 0:
+                        n_rows += cursor.rowcount
+                    n_pending += 1
+                    if n_pending >= chunk_size:
+                        cursor.execute("COMMIT")
+                        cursor.execute("BEGIN")
+                        n_pending = 0
+            finally:
+                if ddl_file is not None:
+                    script.close()
+
+        # Insert the row data with executemany, one transaction per chunk of rows
+        for table_name, rows in (table_rows or {}).items():
+            rows = iter(rows)
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                continue
+            placeholders = ", ".join(["?"] * len(chunk[0]))
+            while chunk:
+                cursor.executemany(f"INSERT INTO {table_name} VALUES ({placeholders})", chunk)
+                n_rows += len(chunk)
+                cursor.execute("COMMIT")
+                cursor.execute("BEGIN")
+                chunk = list(itertools.islice(rows, chunk_size))
+        cursor.execute("COMMIT")
+
+        # Create the indexes once the data is in place
+        if deferred_indexes:
+            cursor.execute("BEGIN")
+            for query in deferred_indexes:
+                cursor.execute(query)
+                n_statements += 1
+            cursor.execute("COMMIT")
+    except Exception:
+        # Without a journal the transaction cannot be rolled back reliably: delete the partial database
+        conn.close()
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            try:
+                os.remove(database_dir + suffix)
+            except OSError:
+                pass
+        raise
+
+    # Restore the default durability settings
+    cursor.execute("PRAGMA journal_mode=DELETE")
+    cursor.execute("PRAGMA synchronous=FULL")
+    conn.close()
+
+    elapsed = time.perf_counter() - start_time
+    stats = {"statements": n_statements, "rows": n_rows, "seconds": elapsed, "rows_per_second": n_rows / elapsed if elapsed > 0 else float("inf")}
+    if verbose:
+        print(f"Loaded {n_rows} rows with {n_statements} statements in {elapsed:.2f}s ({stats['rows_per_second']:.0f} rows/sec).")
+
+    return stats
+
 def create_snowflake_database(database_name, snowflake_config_file, ddl, verbose=True):
     """
     Create a new Snowflake database with the given a Data Definition Language (DDL) script.
@@ -71,10 +193,8 @@ def create_snowflake_database(database_name, snowflake_config_file, ddl, verbose
     cs.execute(f"USE SCHEMA {snowflake_config['schema']}")
 
     # Split the script into individual queries
-    queries = ddl.split(";")
+    queries = split_sql_statements(ddl)
     for query in queries:
-        if query.strip() == "":
-            continue
         query = query.replace("CREATE", "CREATE OR REPLACE")
         if verbose:
             print(f"Executing query: {query}")
@@ -159,16 +279,148 @@ def copy_local_database(database_source_dir, database_updated_dir, verbose=True,
     return
 
 
+def get_foreign_keys(database_dir):
+    """
+    Get the foreign keys of the SQLite database, as a list of (table, columns, referenced_table, referenced_columns) tuples.
+    Composite keys are grouped; referenced_columns is None when the key references the primary key implicitly.
+    """
+    conn = sqlite3.connect(database_dir)
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")
+    tables = [table[0] for table in cursor.fetchall()]
+    foreign_keys = []
+    for table in tables:
+        cursor.execute(f'PRAGMA foreign_key_list("{table}")')
+        keys = {}
+        for fk_id, fk_seq, fk_table, fk_from, fk_to, _, _, _ in cursor.fetchall():
+            keys.setdefault(fk_id, (fk_table, []))[1].append((fk_seq, fk_from, fk_to))
+        for fk_table, columns in keys.values():
+            columns.sort()
+            to_columns = [to for _, _, to in columns]
+            foreign_keys.append((table, [frm for _, frm, _ in columns], fk_table, None if None in to_columns else to_columns))
+    conn.close()
+    return foreign_keys
+
+
+def sample_local_database(database_source_dir, database_sample_dir, fraction=0.1, seed=0, verbose=True, replace=False):
+    """
+    Write a referentially consistent sample of a SQLite database.
+    A deterministic fraction of the rows of every table is sampled (by a hash of the rowid), then every row referenced
+    through a foreign key by a sampled row is added, transitively, so that all foreign keys of the sample resolve.
+    Rowids are preserved. Indexes and views are copied. Returns a dictionary with the number of sampled and total rows per table.
+    If sampling fails, the partially written sample is deleted and the error is raised.
+    Input:
+    - database_source_dir: the path to the original database
+    - database_sample_dir: the path to the sample database
+    - fraction: the fraction of the rows of each table to sample before adding the referenced rows
+    - seed: the seed of the row hash
+    """
+    if os.path.exists(database_sample_dir):
+        if not replace:
+            raise Exception(f"Database {database_sample_dir} already exists. Set replace=True to overwrite.")
+        os.remove(database_sample_dir)
+    foreign_keys = get_foreign_keys(database_source_dir)
+
+    # Connect to the sample database and attach the original database
+    conn = sqlite3.connect(database_sample_dir, isolation_level=None)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode = OFF")
+        cursor.execute("PRAGMA synchronous = OFF")
+        cursor.execute("ATTACH DATABASE ? AS source", (database_source_dir,))
+        cursor.execute("SELECT type, name, sql FROM source.sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'")
+        objects = cursor.fetchall()
+        tables = [name for object_type, name, _ in objects if object_type == 'table']
+        table_names = {table.lower(): table for table in tables}
+        columns, primary_keys, without_rowid = {}, {}, set()
+        for table in tables:
+            cursor.execute(f'PRAGMA source.table_info("{table}")')
+            info = cursor.fetchall()
+            columns[table] = [f'"{col[1]}"' for col in info]
+            primary_keys[table] = [col[1] for col in sorted(info, key=lambda col: col[5]) if col[5] > 0]
+            try:
+                cursor.execute(f'SELECT rowid FROM source."{table}" LIMIT 0')
+            except sqlite3.OperationalError:
+                without_rowid.add(table)
+
+        if verbose:
+            print(f"Sampling {fraction:.1%} of the rows of {len(tables)} tables...")
+        cursor.execute("BEGIN")
+        for object_type, name, sql in objects:
+            if object_type == 'table':
+                cursor.execute(sql)
+
+        # Sample the rows of every table
+        buckets = 1000003
+        for table in tables:
+            column_list = ', '.join(columns[table])
+            if table in without_rowid:
+                # WITHOUT ROWID tables: the first rows of the table
+                cursor.execute(f'SELECT COUNT(*) FROM source."{table}"')
+                cursor.execute(f'INSERT INTO main."{table}" SELECT * FROM source."{table}" LIMIT ?', (int(fraction * cursor.fetchone()[0]),))
+            else:
+                cursor.execute(f'INSERT INTO main."{table}" (rowid, {column_list}) SELECT rowid, {column_list} FROM source."{table}" '
+                               f'WHERE abs(rowid * 2654435761 + ?) % ? < ?', (seed * 40503, buckets, int(fraction * buckets)))
+
+        # Add the referenced rows until all foreign keys resolve
+        changed = True
+        while changed:
+            changed = False
+            for table, from_columns, ref_table, to_columns in foreign_keys:
+                ref_table = table_names.get(ref_table.lower())
+                if ref_table is None:
+                    continue
+                to_columns = to_columns or primary_keys[ref_table] or ['rowid']
+                keys = ', '.join(f's."{to}"' for to in to_columns)
+                referenced_keys = ', '.join(f'm."{frm}"' for frm in from_columns)
+                column_list = ', '.join(columns[ref_table])
+                source_column_list = ', '.join(f's.{col}' for col in columns[ref_table])
+                # Rows already in the sample are identified by their rowid, or by their primary key in WITHOUT ROWID tables
+                if ref_table in without_rowid:
+                    row_key = ', '.join(f'"{col}"' for col in primary_keys[ref_table])
+                    source_row_key = ', '.join(f's."{col}"' for col in primary_keys[ref_table])
+                    insert = f'INSERT INTO main."{ref_table}" ({column_list}) SELECT {source_column_list} '
+                else:
+                    row_key, source_row_key = 'rowid', 's.rowid'
+                    insert = f'INSERT INTO main."{ref_table}" (rowid, {column_list}) SELECT s.rowid, {source_column_list} '
+                total_changes = conn.total_changes
+                cursor.execute(insert + f'FROM source."{ref_table}" AS s WHERE ({keys}) IN (SELECT {referenced_keys} FROM main."{table}" AS m) '
+                               f'AND ({source_row_key}) NOT IN (SELECT {row_key} FROM main."{ref_table}")')
+                changed = changed or conn.total_changes > total_changes
+        cursor.execute("COMMIT")
+
+        # Create the indexes and views after loading the data
+        for object_type, name, sql in objects:
+            if object_type in ('index', 'view'):
+                cursor.execute(sql)
+    except Exception:
+        # The sample is written without a journal: delete the partial database
+        conn.close()
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            try:
+                os.remove(database_sample_dir + suffix)
+            except OSError:
+                pass
+        raise
+
+    stats = {}
+    for table in tables:
+        cursor.execute(f'SELECT (SELECT COUNT(*) FROM main."{table}"), (SELECT COUNT(*) FROM source."{table}")')
+        stats[table] = cursor.fetchone()
+    cursor.execute("DETACH DATABASE source")
+    cursor.execute("PRAGMA journal_mode = DELETE")
+    conn.close()
+    if verbose:
+        n_sampled, n_total = sum(v[0] for v in stats.values()), sum(v[1] for v in stats.values())
+        print(f"Sampled {n_sampled} of {n_total} rows into {database_sample_dir}.")
+    return stats
+
+
 def get_view_name_from_definition(view_definition):
-    view_definition = view_definition.lower()
-    if re.findall(r'create view if not exists (.*?) as', view_definition):
-        view_name = re.findall(r'create view if not exists (.*?) as', view_definition)
-        return view_name[0].strip()
-    elif re.findall(r'create or replace view (.*?) as', view_definition):
-        view_name = re.findall(r'create or replace view (.*?) as', view_definition)
-        return view_name[0].strip()
-    elif re.findall(r'create view (.*?) as', view_definition):
-        view_name = re.findall(r'create view (.*?) as', view_definition)
-        return view_name[0].strip()
-    else:
-        return None
\ No newline at end of file
+    """
+    Get the (lower-cased) name of the first view defined in the given SQL text, or None if there is no CREATE VIEW statement.
+    """
+    for statement in iter_sql_statements(view_definition):
+        if statement.statement_type == "CREATE VIEW" and statement.object_name:
+            return statement.object_name.lower()
+    return None
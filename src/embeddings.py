@@ -0,0 +1,119 @@
+"""
+Batched text embeddings.
+Texts are deduplicated, looked up in an on-disk cache keyed by (model, text hash), and the missing ones are sent in
+batches bounded by number of texts and tokens, a few batches at a time. Embeddings are stored as float32 blobs.
+"""
+import sqlite3
+import hashlib
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.llm_client import embed
+from src.utils import count_tokens
+
+# Limits of a single embeddings request
+MAX_BATCH_SIZE = 2048
+MAX_BATCH_TOKENS = 300000
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    SQLite-backed cache of text embeddings, keyed by model and text hash.
+    cache_file: path to the SQLite cache file.
+    """
+    def __init__(self, cache_file: str):
+        self._cache_file = cache_file
+        self._conn = sqlite3.connect(cache_file)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (model TEXT, text_hash TEXT, embedding BLOB, PRIMARY KEY (model, text_hash))")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache_file(self):
+        return self._cache_file
+
+    def get_many(self, model: str, hashes):
+        """
+        Look up the embeddings of the given text hashes. Returns a dictionary from hash to float32 array (missing hashes are left out).
+        """
+        hashes = list(hashes)
+        found = {}
+        # Stay below the SQLite limit on the number of query parameters
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start:start + 500]
+            rows = self._conn.execute(f"SELECT text_hash, embedding FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(chunk))})", [model] + chunk)
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+        self.hits += len(found)
+        self.misses += len(hashes) - len(found)
+        return found
+
+    def put_many(self, model: str, entries):
+        """
+        Cache many embeddings, given as (text_hash, embedding) pairs, and commit.
+        """
+        self._conn.executemany("INSERT OR REPLACE INTO embeddings (model, text_hash, embedding) VALUES (?, ?, ?)",
+                               ((model, key, np.asarray(embedding, dtype=np.float32).tobytes()) for key, embedding in entries))
+        self._conn.commit()
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
+
+
+def make_batches(texts, model, max_batch_size=MAX_BATCH_SIZE, max_batch_tokens=MAX_BATCH_TOKENS):
+    """
+    Split a list of texts into batches of at most max_batch_size texts and max_batch_tokens tokens.
+    Returns lists of indices into texts.
+    """
+    batches = [[]]
+    batch_tokens = 0
+    for idx, text in enumerate(texts):
+        tokens = count_tokens(text, model)
+        if batches[-1] and (len(batches[-1]) >= max_batch_size or batch_tokens + tokens > max_batch_tokens):
+            batches.append([])
+            batch_tokens = 0
+        batches[-1].append(idx)
+        batch_tokens += tokens
+    return [batch for batch in batches if batch]
+
+
+def batch_embeddings(texts, model="text-embedding-3-small", cache_file=None, max_batch_size=MAX_BATCH_SIZE, max_batch_tokens=MAX_BATCH_TOKENS, n_concurrent=4):
+    """
+    Embeddings of a list of texts, as a float32 array with one row per text (in order).
+    Identical texts are embedded once. If cache_file is provided, cached embeddings are reused and new ones are cached.
+    Up to n_concurrent requests run at a time; rate-limited requests are retried with backoff (see llm_client).
+    """
+    texts = list(texts)
+    hashes = [text_hash(text) for text in texts]
+    unique = dict(zip(hashes, texts))
+    cache = EmbeddingCache(cache_file) if cache_file else None
+    try:
+        vectors = cache.get_many(model, unique) if cache is not None else {}
+        missing = [key for key in unique if key not in vectors]
+        batches = make_batches([unique[key] for key in missing], model, max_batch_size=max_batch_size, max_batch_tokens=max_batch_tokens)
+        with ThreadPoolExecutor(max_workers=max(1, n_concurrent)) as executor:
+            futures = [executor.submit(embed, [unique[missing[idx]] for idx in batch], model) for batch in batches]
+            for batch, future in zip(batches, futures):
+                entries = [(missing[idx], np.asarray(embedding, dtype=np.float32)) for idx, embedding in zip(batch, future.result())]
+                vectors.update(entries)
+                if cache is not None:
+                    cache.put_many(model, entries)
+    finally:
+        if cache is not None:
+            cache.close()
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.stack([vectors[key] for key in hashes])
@@ -0,0 +1,130 @@
+"""
+Result-fingerprint equivalence of views.
+Candidate views are run on a small deterministic, referentially consistent sample of a SQLite database (see
+database_utils.sample_local_database), on a single in-memory connection, and their result sets are hashed independently
+of the order of the rows (and, optionally, of the columns). Views with the same fingerprint are grouped into equivalence classes.
+"""
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import tempfile
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.database_utils import sample_local_database
+
+_VIEW_DEFINITION = re.compile(r"^\s*CREATE\s+(?:TEMP\w*\s+)?VIEW\s+(?:IF\s+NOT\s+EXISTS\s+)?\S+\s+AS\s+(.*)$", re.IGNORECASE | re.DOTALL)
+
+
+def get_query(sql):
+    """
+    The query of a view definition ('CREATE VIEW ... AS <query>'), or the SQL itself if it is not a view definition.
+    """
+    match = _VIEW_DEFINITION.match(sql)
+    return (match.group(1) if match else sql).strip().rstrip(';')
+
+
+def sample_connection(db_file, fraction=0.1, seed=0):
+    """
+    Open an in-memory SQLite connection holding a deterministic, referentially consistent sample of the database
+    (see database_utils.sample_local_database), with its views.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sample_file = os.path.join(tmp_dir, 'sample.db')
+        sample_local_database(db_file, sample_file, fraction=fraction, seed=seed, verbose=False)
+        source = sqlite3.connect(sample_file)
+        conn = sqlite3.connect(':memory:')
+        source.backup(conn)
+        source.close()
+    return conn
+
+
+def _value_repr(value):
+    return repr(round(value, 9)) if isinstance(value, float) else repr(value)
+
+def _value_hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest(), 'big')
+
+def _column_order(rows, n_columns):
+    """
+    Canonical order of the columns of a result: by the multiset hash of their values (ties keep their position).
+    """
+    column_hashes = [0] * n_columns
+    for row in rows:
+        for i, value in enumerate(row):
+            column_hashes[i] = (column_hashes[i] + _value_hash(value)) % (1 << 128)
+    return sorted(range(n_columns), key=lambda i: column_hashes[i])
+
+def result_fingerprint(conn, query, timeout=1.0, ignore_column_order=True, batch_size=1000):
+    """
+    Run a query with a time cap (in seconds) and fingerprint its result set.
+    The fingerprint is a multiset hash (sum of the row hashes), so it does not depend on the order of the rows.
+    If ignore_column_order is True, the columns are put in a canonical order first (see _column_order), which holds the
+    result of the query in memory (the sample is small).
+    Returns (fingerprint, status), with status 'ok', 'empty', 'timeout' or 'error' and fingerprint None unless status is 'ok'.
+    """
+    deadline = time.monotonic() + timeout
+    conn.set_progress_handler(lambda: int(time.monotonic() > deadline), 1000)
+    try:
+        cursor = conn.execute(query)
+        n_columns = len(cursor.description)
+        rows = []
+        n_rows = 0
+        total = 0
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            n_rows += len(batch)
+            batch = [[_value_repr(value) for value in row] for row in batch]
+            if ignore_column_order:
+                rows += batch
+            else:
+                for row in batch:
+                    total = (total + _value_hash('\x1f'.join(row))) % (1 << 128)
+    except sqlite3.OperationalError as e:
+        return None, 'timeout' if 'interrupted' in str(e) else 'error'
+    except sqlite3.Error:
+        return None, 'error'
+    finally:
+        conn.set_progress_handler(None, 0)
+    if n_rows == 0:
+        # An empty result on the sample says nothing about the equivalence of the views
+        return None, 'empty'
+    if ignore_column_order:
+        order = _column_order(rows, n_columns)
+        for row in rows:
+            total = (total + _value_hash('\x1f'.join(row[i] for i in order))) % (1 << 128)
+    return f"{n_columns}:{n_rows}:{total:032x}", 'ok'
+
+
+def equivalence_classes(db_file, views, fraction=0.1, timeout=1.0, ignore_column_order=True):
+    """
+    Group views (view definitions or queries) into equivalence classes by the fingerprint of their results on a sample of the database.
+    Views whose results cannot be fingerprinted (empty result, timeout or error) form singleton classes.
+    Returns the list of classes (lists of view indices, in order of first occurrence) and the list of statuses of the views.
+    """
+    conn = sample_connection(db_file, fraction=fraction)
+    classes = {}
+    statuses = []
+    try:
+        for idx, sql in enumerate(views):
+            fingerprint, status = result_fingerprint(conn, get_query(sql), timeout=timeout, ignore_column_order=ignore_column_order)
+            statuses.append(status)
+            classes.setdefault(fingerprint if fingerprint is not None else ('view', idx), []).append(idx)
+    finally:
+        conn.close()
+    return list(classes.values()), statuses
+
+
+def dedupe_equivalent_views(db_file, views, sql_key='sql', fraction=0.1, timeout=1.0):
+    """
+    Keep the first view dictionary of each equivalence class. Returns the list of unique views and a report.
+    """
+    classes, statuses = equivalence_classes(db_file, [view[sql_key] for view in views], fraction=fraction, timeout=timeout)
+    unique_views = [views[members[0]] for members in classes]
+    report = {'total': len(views), 'equivalent_duplicates': len(views) - len(unique_views), 'unique': len(unique_views)}
+    for status in ('ok', 'empty', 'timeout', 'error'):
+        report[status] = statuses.count(status)
+    return unique_views, report
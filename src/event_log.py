@@ -0,0 +1,127 @@
+"""
+Structured event log of the schema refinement process.
+Events are appended as JSON lines while the chats run: messages, tool calls, code blocks and chat summaries.
+"""
+import json
+import time
+import uuid
+
+class EventLogger:
+    """
+    Append-only JSONL event log. Every event carries the run id, the current sample id and the current chat id.
+    """
+    def __init__(self, log_file: str, run_id: str = None):
+        self._log_file = log_file
+        self._f = open(log_file, "a", buffering=1)
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.sample_id = None
+        self.chat_id = None
+        self._n_chats = 0
+
+    @property
+    def log_file(self):
+        return self._log_file
+
+    def log(self, event: str, **fields):
+        """
+        Append an event to the log.
+        """
+        record = {"ts": time.time(), "event": event, "run_id": self.run_id, "sample_id": self.sample_id, "chat_id": self.chat_id}
+        record.update(fields)
+        self._f.write(json.dumps(record, default=str) + "\n")
+
+    def start_sample(self, sample_id, tables=None):
+        self.sample_id = sample_id
+        self.log("sample_start", tables=tables)
+
+    def start_chat(self, **fields):
+        """
+        Start a new chat. Chat ids are unique within a run.
+        """
+        self.chat_id = self._n_chats
+        self._n_chats += 1
+        self.log("chat_start", **fields)
+        return self.chat_id
+
+    def end_chat(self, status: str = "ok", **fields):
+        self.log("chat_end", status=status, **fields)
+        self.chat_id = None
+
+    def log_message(self, sender: str, recipient: str, message):
+        """
+        Log a message sent by an agent. Tool calls and tool responses are logged as separate events.
+        """
+        if isinstance(message, str):
+            message = {"content": message}
+        # The content of a tool response message repeats the tool responses, logged below
+        if not message.get("tool_responses"):
+            self.log("message", sender=sender, recipient=recipient, content=message.get("content"), role=message.get("role"))
+        for tool_call in message.get("tool_calls") or []:
+            function = tool_call.get("function", {})
+            self.log("tool_call", sender=sender, recipient=recipient, call_id=tool_call.get("id"), name=function.get("name"), arguments=function.get("arguments"))
+        for tool_response in message.get("tool_responses") or []:
+            self.log("tool_response", sender=sender, recipient=recipient, call_id=tool_response.get("tool_call_id"), content=tool_response.get("content"))
+
+    def close(self):
+        self._f.close()
+
+
+def iter_events(log_file: str):
+    """
+    Stream the events of an event log.
+    """
+    with open(log_file, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # The last line of a log that is still being written may be incomplete
+                continue
+
+
+def iter_chats(log_file: str):
+    """
+    Stream the chats of an event log, in a single pass. Each chat is a dictionary with the run id, sample id, chat id,
+    the list of message events (including tool calls and responses), the code blocks, the summary and the final status.
+    """
+    chats = {}
+    for event in iter_events(log_file):
+        key = (event.get("run_id"), event.get("chat_id"))
+        if event["event"] == "chat_start":
+            chats[key] = {"run_id": key[0], "sample_id": event.get("sample_id"), "chat_id": key[1], "messages": [], "code_blocks": [], "summary": None, "status": None}
+            continue
+        chat = chats.get(key)
+        if chat is None:
+            continue
+        if event["event"] in ("message", "tool_call", "tool_response"):
+            chat["messages"].append(event)
+        elif event["event"] == "code_block":
+            chat["code_blocks"].append(event)
+        elif event["event"] == "summary":
+            chat["summary"] = event.get("summary")
+        elif event["event"] == "chat_end":
+            chat["status"] = event.get("status")
+            yield chats.pop(key)
+    # Chats that did not finish (e.g., interrupted run)
+    for chat in chats.values():
+        chat["status"] = "incomplete"
+        yield chat
+
+
+def chat_transcript(chat):
+    """
+    Render a chat as a plain text transcript.
+    """
+    transcript = ""
+    for event in chat["messages"]:
+        if event["event"] == "message":
+            if event.get("content"):
+                transcript += f"{event['sender']} (to {event['recipient']}):\n\n{event['content']}\n\n"
+        elif event["event"] == "tool_call":
+            transcript += f"{event['sender']} (to {event['recipient']}):\n\nSuggested tool call ({event.get('call_id')}): {event.get('name')}\nArguments: {event.get('arguments')}\n\n"
+        elif event["event"] == "tool_response":
+            transcript += f"{event['sender']} (to {event['recipient']}):\n\nResponse from calling tool ({event.get('call_id')}):\n{event.get('content')}\n\n"
+    return transcript.strip()
@@ -1,11 +1,11 @@
 import os
-import json
 import argparse
-from openai import OpenAI
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.llm_client import get_client
 
 def finetune(training_file, suffix, base_model='gpt-3.5-turbo', n_epochs=4):
-    api_key = [c['api_key'] for c in json.load(open('OAI_CONFIG_LIST')) if c['model'] == base_model][0]
-    client = OpenAI(api_key=api_key)
+    client = get_client(base_model)
 
     # Upload the training file to the OpenAI API
     file = client.files.create(
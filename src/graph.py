@@ -2,6 +2,7 @@ import os
 import re
 import random
 import sqlite3
+import numpy as np
 import pandas as pd
 import networkx as nx
 
@@ -16,6 +17,9 @@ def schema_graph(db_dir, save_dir=None):
     tables = cursor.fetchall()
     table_names = [table[0] for table in tables]
 
+    cursor.execute("PRAGMA schema_version")
+    version = cursor.fetchone()[0]
+
     # Query to get the foreign-primary key pairs
     fk_pk_pairs = []
     for table_id, table_name in enumerate(table_names):
@@ -30,16 +34,20 @@ def schema_graph(db_dir, save_dir=None):
     conn.close()
     
     # Make the schema graph 
-    G = nx.DiGraph()
+    G = nx.DiGraph(schema_version=version)
 
     # Create nodes representing tables
     for table_id, table_name in enumerate(table_names):
         G.add_node(table_id, name=table_name)
 
-    # Create edges representing foreign-primary key pairs
-    for table_id, _, fk_table_id, _, _, _ in fk_pk_pairs:
-        G.add_edge(table_id, fk_table_id)
-        G.add_edge(fk_table_id, table_id)
+    # Create edges representing foreign-primary key pairs, annotated with the joined columns
+    for table_id, table_name, fk_table_id, fk_table, fk_from, fk_to in fk_pk_pairs:
+        join = (table_name, fk_from, fk_table, fk_to)
+        for u, v in ((table_id, fk_table_id), (fk_table_id, table_id)):
+            if not G.has_edge(u, v):
+                G.add_edge(u, v, joins=[])
+            if join not in G.edges[u, v]['joins']:
+                G.edges[u, v]['joins'].append(join)
 
     if save_dir is not None:
         # Save the schema graph
@@ -48,57 +56,180 @@ def schema_graph(db_dir, save_dir=None):
     return G
 
 
-def sample_connected_subgraph_nodes(G, size):
+def graph_csr(G):
+    """
+    Compressed sparse row adjacency of a networkx graph: (nodes, indptr, indices), where the neighbors of nodes[i]
+    are nodes[indices[indptr[i]:indptr[i+1]]]. Edges are treated as undirected.
+    For schema graphs (which carry the 'schema_version' of their database in G.graph), the arrays are computed once and
+    cached in G.graph for that schema version; they are recomputed on every call for other graphs.
+    """
+    version = G.graph.get('schema_version')
+    cached = G.graph.get('_csr')
+    if version is not None and cached is not None and cached[0] == version:
+        return cached[1]
+    nodes = list(G.nodes)
+    node_index = {node: i for i, node in enumerate(nodes)}
+    neighbors = [set() for _ in nodes]
+    for u, v in G.edges:
+        if u != v:
+            neighbors[node_index[u]].add(node_index[v])
+            neighbors[node_index[v]].add(node_index[u])
+    indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(n) for n in neighbors])
+    indices = np.fromiter((j for n in neighbors for j in sorted(n)), dtype=np.int64, count=indptr[-1])
+    csr = (nodes, indptr, indices)
+    if version is not None:
+        G.graph['_csr'] = (version, csr)
+    return csr
+
+
+def _random_non_member(rng, n_nodes, member, n_tries=8):
+    # Rejection sampling while the sample is small compared to the graph, then an explicit draw
+    for _ in range(n_tries):
+        node = int(rng.integers(n_nodes))
+        if node not in member:
+            return node
+    return int(rng.choice(np.setdiff1d(np.arange(n_nodes), list(member))))
+
+def sample_connected_subgraphs(G, size, n_samples=1, seed=None):
+    """
+    Samples n_samples random connected node sets of size 'size' from a networkx graph.
+    Each sample starts from a random node and repeatedly adds a random node of its frontier (the neighbors of the
+    nodes sampled so far, read from the CSR adjacency). If the frontier is empty (the connected component is exhausted),
+    a random node outside the sample is added. Returns an array of shape (n_samples, size) of node positions in list(G.nodes).
+    """
+    nodes, indptr, indices = graph_csr(G)
+    n_nodes = len(nodes)
+    if size > n_nodes:
+        raise ValueError(f"size ({size}) should be at most the number of nodes in the graph ({n_nodes}).")
+    rng = np.random.default_rng(seed)
+    samples = np.empty((n_samples, size), dtype=np.int64)
+    for s in range(n_samples):
+        member = set()
+        frontier = []
+        in_frontier = set()
+        for step in range(size):
+            if frontier:
+                # Swap a random frontier node to the end and pop it
+                i = int(rng.integers(len(frontier)))
+                frontier[i], frontier[-1] = frontier[-1], frontier[i]
+                node = frontier.pop()
+            else:
+                node = _random_non_member(rng, n_nodes, member)
+            samples[s, step] = node
+            member.add(node)
+            for neighbor in indices[indptr[node]:indptr[node + 1]].tolist():
+                if neighbor not in member and neighbor not in in_frontier:
+                    in_frontier.add(neighbor)
+                    frontier.append(neighbor)
+    return samples
+
+
+def sample_connected_subgraph_nodes(G, size, seed=None):
     """
     Samples a random connected subgraph of size 'size' from a networkx graph.
     """
-
-    # Start with a random node
-    node = random.choice(list(G.nodes))
-    subgraph_nodes = [node]
-
-    # Grow the subgraph until it reaches the desired size
-    while len(subgraph_nodes) < size:
-        neighbors_1_hop = [neighbor[1] for neighbor in nx.bfs_edges(G, node, depth_limit=1)]
-        neighbors = list(set(neighbors_1_hop) - set(subgraph_nodes))
-        if neighbors:
-            node = random.choice(neighbors)
-            subgraph_nodes.append(node)
-        # If no new neighbors, start from a random node in the subgraph
-        elif len(set(subgraph_nodes) - {node}):
-            node = random.choice(list(set(subgraph_nodes) - {node}))
-            subgraph_nodes.append(node)
-        # If no new neighbors and no other nodes in the subgraph, start from a random node in the graph
-        elif len(set(G.nodes) - set(subgraph_nodes)):
-            node = random.choice(list(set(G.nodes) - set(subgraph_nodes)))
-            subgraph_nodes.append(node)
-        # If no new neighbors and no other nodes in the graph, break
-        else:
-            break
-
-    subgraph = G.subgraph(subgraph_nodes).copy()
+    nodes = graph_csr(G)[0]
+    sample = sample_connected_subgraphs(G, size, n_samples=1, seed=seed)[0]
+    subgraph = G.subgraph([nodes[i] for i in sample]).copy()
 
     return subgraph
 
 
-def schema_subgraph(G, n_nodes=5):
+def schema_subgraph(G, n_nodes=5, seed=None):
     """
     Returns a subgraph of the schema graph with n_nodes.
     """
+    return schema_subgraphs(G, n_nodes=n_nodes, n_samples=1, seed=seed)[0]
+
 
-    # Get the subgraph
+def schema_subgraphs(G, n_nodes=5, n_samples=1, seed=None):
+    """
+    Returns the table names of n_samples connected subgraphs of the schema graph with n_nodes each.
+    """
     if n_nodes > len(G.nodes):
         raise ValueError(f"n_nodes ({n_nodes}) should be less than the number of nodes in the schema graph ({len(G.nodes)}).")
-    subgraph = sample_connected_subgraph_nodes(G, n_nodes)
+    nodes = graph_csr(G)[0]
+    samples = sample_connected_subgraphs(G, n_nodes, n_samples=n_samples, seed=seed)
 
-    # Get the subgraph nodes
-    subgraph_nodes = G.subgraph(subgraph).nodes
-    
     # Retrieve sampled table names
-    sampled_tables = [G.nodes[node]['name'] for node in subgraph_nodes] 
+    return [[G.nodes[nodes[i]]['name'] for i in sample] for sample in samples]
 
-    # Return the sampled tables
-    return sampled_tables
+
+class CoverageScheduler:
+    """
+    Chooses connected table subsets of the schema graph for successive refinement chats, favoring tables and
+    foreign-key edges that have been explored the least, weighted by the number of views each table yielded so far.
+    G: the schema graph (nodes with a 'name' attribute).
+    n_nodes: number of tables per sample.
+    n_candidates: number of random connected candidates scored for each sample.
+    edge_weight: weight of the uncovered edges relative to the tables in the score of a candidate.
+    yield_weight: weight of the past view yield (views per visit) of a table in its score.
+    """
+    def __init__(self, G, n_nodes=5, n_candidates=64, edge_weight=0.5, yield_weight=1.0, seed=None):
+        if n_nodes > len(G.nodes):
+            raise ValueError(f"n_nodes ({n_nodes}) should be less than the number of nodes in the schema graph ({len(G.nodes)}).")
+        self._G = G
+        self._n_nodes = n_nodes
+        self._n_candidates = n_candidates
+        self._edge_weight = edge_weight
+        self._yield_weight = yield_weight
+        self._rng = np.random.default_rng(seed)
+        nodes, indptr, indices = graph_csr(G)
+        self._names = [G.nodes[node]['name'] for node in nodes]
+        self._index = {name: i for i, name in enumerate(self._names)}
+        # Undirected edges (u < v)
+        sources = np.repeat(np.arange(len(nodes)), np.diff(indptr))
+        keep = sources < indices
+        self._edges = (sources[keep], indices[keep])
+        self._table_visits = np.zeros(len(nodes), dtype=np.int64)
+        self._table_views = np.zeros(len(nodes), dtype=np.float64)
+        self._edge_visits = np.zeros(len(self._edges[0]), dtype=np.int64)
+        self._n_samples = 0
+
+    def next_sample(self):
+        """
+        Returns the table names of the next sample, and marks its tables and edges as visited.
+        """
+        candidates = sample_connected_subgraphs(self._G, self._n_nodes, n_samples=self._n_candidates, seed=self._rng)
+        member = np.zeros((len(candidates), len(self._names)), dtype=bool)
+        member[np.arange(len(candidates))[:, None], candidates] = True
+        # Gain of a table: high if rarely visited, boosted by its views per visit
+        yield_rate = self._table_views / np.maximum(self._table_visits, 1)
+        table_gain = (1.0 + self._yield_weight * yield_rate) / (1.0 + self._table_visits)
+        edge_gain = 1.0 / (1.0 + self._edge_visits)
+        covered_edges = member[:, self._edges[0]] & member[:, self._edges[1]]
+        scores = member @ table_gain + self._edge_weight * (covered_edges @ edge_gain)
+        best = int(np.argmax(scores))
+        self._table_visits[candidates[best]] += 1
+        self._edge_visits[covered_edges[best]] += 1
+        self._n_samples += 1
+        return [self._names[i] for i in candidates[best]]
+
+    def record_yield(self, views_per_table):
+        """
+        Record the number of views produced for each table (a dictionary from table name to number of views).
+        """
+        for table, n_views in views_per_table.items():
+            if table in self._index:
+                self._table_views[self._index[table]] += n_views
+
+    def coverage(self):
+        """
+        Report of the coverage of the schema: the number and fraction of tables and foreign-key edges sampled at least once.
+        """
+        n_tables, n_edges = len(self._table_visits), len(self._edge_visits)
+        tables_covered = int((self._table_visits > 0).sum())
+        edges_covered = int((self._edge_visits > 0).sum())
+        return {
+            "n_samples": self._n_samples,
+            "tables_covered": tables_covered,
+            "n_tables": n_tables,
+            "table_coverage": tables_covered / n_tables if n_tables else 1.0,
+            "edges_covered": edges_covered,
+            "n_edges": n_edges,
+            "edge_coverage": edges_covered / n_edges if n_edges else 1.0,
+        }
 
 
 if __name__ == '__main__':
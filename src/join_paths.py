@@ -0,0 +1,194 @@
+"""
+Join-path index.
+Precomputed shortest join paths over the foreign-key graph of a schema, used to answer which joins connect
+a set of tables (an approximate Steiner tree) without reading the whole schema.
+"""
+import os
+import json
+import hashlib
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import shortest_path
+
+# Join path indexes, by schema fingerprint
+_index_cache = {}
+
+
+class JoinPathIndex:
+    """
+    All-pairs shortest join paths over a foreign-key graph.
+    tables: the table names.
+    joins: the foreign keys, as (table, column, referenced_table, referenced_column) tuples.
+    """
+    def __init__(self, tables, joins, distances=None, predecessors=None):
+        self._tables = list(tables)
+        self._index = {table.lower(): i for i, table in enumerate(self._tables)}
+        self._joins = [tuple(join) for join in joins]
+        # Join conditions of each (undirected) edge
+        self._edge_joins = {}
+        for join in self._joins:
+            u, v = self._index[join[0].lower()], self._index[join[2].lower()]
+            if u != v:
+                self._edge_joins.setdefault((min(u, v), max(u, v)), []).append(join)
+        if distances is None:
+            n = len(self._tables)
+            edges = np.array(list(self._edge_joins), dtype=np.int64).reshape(-1, 2)
+            adjacency = csr_matrix((np.ones(len(edges)), (edges[:, 0], edges[:, 1])), shape=(n, n))
+            distances, predecessors = shortest_path(adjacency, directed=False, unweighted=True, return_predecessors=True)
+            # Path lengths are small integers: float32 is exact and halves the memory
+            distances = distances.astype(np.float32)
+        self._distances = distances
+        self._predecessors = predecessors
+        # Join trees already computed, by set of tables
+        self._tree_cache = {}
+
+    @classmethod
+    def from_schema_graph(cls, G):
+        """
+        Build the index from a schema graph whose edges are annotated with their joins (see Database.schema_graph).
+        """
+        return cls(*_graph_joins(G))
+
+    @property
+    def fingerprint(self):
+        return schema_fingerprint(self._tables, self._joins)
+
+    def __contains__(self, table):
+        return table.lower() in self._index
+
+    def _table_id(self, table):
+        try:
+            return self._index[table.lower()]
+        except KeyError:
+            raise KeyError(f"Table {table} not found in the schema.")
+
+    def distance(self, table_a, table_b):
+        """
+        Number of joins on the shortest join path between two tables (inf if they are not connected).
+        """
+        return float(self._distances[self._table_id(table_a), self._table_id(table_b)])
+
+    def _path_ids(self, a, b):
+        path = [b]
+        while path[-1] != a:
+            previous = self._predecessors[a, path[-1]]
+            if previous < 0:
+                return None
+            path.append(previous)
+        return path[::-1]
+
+    def path(self, table_a, table_b):
+        """
+        Tables on a shortest join path from table_a to table_b, or None if they are not connected.
+        """
+        path = self._path_ids(self._table_id(table_a), self._table_id(table_b))
+        return [self._tables[i] for i in path] if path is not None else None
+
+    def join_tree(self, tables):
+        """
+        Joins connecting the given tables: an approximate Steiner tree, built as the minimum spanning tree of the
+        shortest-path distances between the tables, expanded into the shortest paths.
+        Returns the list of joins (table, column, referenced_table, referenced_column) and the list of groups of
+        tables that could not be connected to each other (a single group if all tables are connected).
+        Results are cached by set of tables.
+        """
+        terminals = list(dict.fromkeys(self._table_id(table) for table in tables))
+        if not terminals:
+            return [], []
+        key = tuple(sorted(terminals))
+        if key not in self._tree_cache:
+            self._tree_cache[key] = self._join_tree(list(key))
+        return self._tree_cache[key]
+
+    def _join_tree(self, terminals):
+        # Prim's algorithm on the metric closure of the terminals
+        in_tree = [terminals[0]]
+        remaining = terminals[1:]
+        components = [[terminals[0]]]
+        tree_edges = []
+        while remaining:
+            sub = self._distances[np.ix_(in_tree, remaining)]
+            i, j = np.unravel_index(np.argmin(sub), sub.shape)
+            if np.isinf(sub[i, j]):
+                # No path to the remaining tables: start a new component
+                in_tree.append(remaining.pop(0))
+                components.append([in_tree[-1]])
+                continue
+            tree_edges.append((in_tree[i], remaining[j]))
+            components[-1].append(remaining[j])
+            in_tree.append(remaining.pop(j))
+        # Expand the tree edges into shortest paths, skipping edges that would close a cycle
+        parent = {}
+        def find(x):
+            while parent.get(x, x) != x:
+                x = parent[x]
+            return x
+        joins = []
+        for a, b in tree_edges:
+            path = self._path_ids(a, b)
+            for u, v in zip(path, path[1:]):
+                root_u, root_v = find(u), find(v)
+                if root_u != root_v:
+                    parent[root_u] = root_v
+                    joins += self._edge_joins[(min(u, v), max(u, v))]
+        groups = [[self._tables[i] for i in component] for component in components]
+        return joins, groups
+
+    def join_hint(self, tables):
+        """
+        Compact textual description of how the given tables join, one join condition per line.
+        """
+        joins, groups = self.join_tree(tables)
+        lines = [f"{table}.{column} = {ref_table}.{ref_column}" for table, column, ref_table, ref_column in joins]
+        if len(groups) > 1:
+            lines.append("No join path between: " + "; ".join(', '.join(group) for group in groups))
+        return '\n'.join(lines)
+
+    def save(self, path):
+        np.savez_compressed(path, tables=json.dumps(self._tables), joins=json.dumps(self._joins), distances=self._distances, predecessors=self._predecessors)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(json.loads(str(data['tables'])), json.loads(str(data['joins'])), distances=data['distances'], predecessors=data['predecessors'])
+
+
+def _graph_joins(G):
+    """
+    Table names and joins (the 'joins' attribute of the edges) of a schema graph.
+    """
+    tables = [G.nodes[node]['name'] for node in G.nodes]
+    joins = {}
+    for _, _, edge_joins in G.edges(data='joins'):
+        for join in edge_joins or []:
+            joins[tuple(join)] = None
+    return tables, list(joins)
+
+
+def schema_fingerprint(tables, joins):
+    """
+    Fingerprint of a foreign-key graph: a hash of its tables and joins.
+    """
+    data = json.dumps([sorted(table.lower() for table in tables), sorted([str(x).lower() for x in join] for join in joins)])
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def join_path_index(G, cache_dir=None):
+    """
+    Get the join-path index of a schema graph. Indexes are cached in memory by schema fingerprint and,
+    if cache_dir is provided, saved to 'join_paths_<fingerprint>.npz' files, so they are computed once per schema.
+    """
+    tables, joins = _graph_joins(G)
+    fingerprint = schema_fingerprint(tables, joins)
+    if fingerprint in _index_cache:
+        return _index_cache[fingerprint]
+    cache_file = os.path.join(cache_dir, f"join_paths_{fingerprint[:16]}.npz") if cache_dir else None
+    if cache_file and os.path.exists(cache_file):
+        index = JoinPathIndex.load(cache_file)
+    else:
+        index = JoinPathIndex(tables, joins)
+        if cache_file:
+            os.makedirs(cache_dir, exist_ok=True)
+            index.save(cache_file)
+    _index_cache[fingerprint] = index
+    return index
@@ -0,0 +1,138 @@
+"""
+Lexical (BM25) view index.
+An in-process inverted index over the views: their names, descriptions, referenced tables and columns (from the parsed
+query, if available) and SQL identifiers, scored with BM25. Used as a first-stage retrieval that needs no embedding call;
+the embeddings then only re-rank the candidates (hybrid_search).
+"""
+import numpy as np
+from collections import Counter
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.schema_linking import identifier_tokens
+
+_SQL_KEYWORDS = frozenset("""select from where join inner left right outer full cross on as and or not null is in like
+between group by order having limit offset distinct count sum avg min max case when then else end union intersect except
+create view asc desc cast coalesce ifnull all""".split())
+
+# Repetitions of the tokens of each field in the document of a view (a simple form of field weighting)
+FIELD_WEIGHTS = {'view_name': 3, 'tables': 2, 'columns': 2, 'view_description': 1, 'sql': 1}
+
+
+def _ast_identifiers(node):
+    """
+    Table and column identifiers ('__table__', '__table.column__') of a parsed query (process_sql AST).
+    """
+    if isinstance(node, dict):
+        for value in node.values():
+            yield from _ast_identifiers(value)
+    elif isinstance(node, (list, tuple)):
+        for value in node:
+            yield from _ast_identifiers(value)
+    elif isinstance(node, str) and node.startswith('__') and node != '__all__':
+        yield node
+
+def view_tokens(view):
+    """
+    Tokens of the document of a view (a dictionary with some of the keys 'view_name', 'view_description', 'tables',
+    'columns', 'sql' and 'sql_parsed'), with the fields repeated according to FIELD_WEIGHTS.
+    """
+    tokens = []
+    for field, weight in FIELD_WEIGHTS.items():
+        value = view.get(field)
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            continue
+        text = ' '.join(map(str, value)) if isinstance(value, (set, list, tuple)) else str(value)
+        field_tokens = identifier_tokens(text)
+        if field == 'sql':
+            field_tokens = [token for token in field_tokens if token not in _SQL_KEYWORDS]
+        tokens += field_tokens * weight
+    if isinstance(view.get('sql_parsed'), dict):
+        tokens += identifier_tokens(' '.join(set(_ast_identifiers(view['sql_parsed'])))) * FIELD_WEIGHTS['columns']
+    return tokens
+
+
+class BM25Index:
+    """
+    BM25 index over tokenized documents. The BM25 weight of each (term, document) pair is precomputed, so a query
+    only sums the postings of its terms.
+    """
+    def __init__(self, documents, k1=1.2, b=0.75):
+        documents = [Counter(tokens) for tokens in documents]
+        self._n_documents = len(documents)
+        lengths = np.array([sum(counts.values()) for counts in documents], dtype=np.float64)
+        average_length = lengths.mean() if len(lengths) and lengths.mean() > 0 else 1.0
+        postings = {}
+        for doc, counts in enumerate(documents):
+            for term, tf in counts.items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(doc)
+                postings[term][1].append(tf)
+        self._postings = {}
+        for term, (docs, tfs) in postings.items():
+            docs = np.array(docs, dtype=np.int64)
+            tfs = np.array(tfs, dtype=np.float64)
+            idf = np.log(1 + (self._n_documents - len(docs) + 0.5) / (len(docs) + 0.5))
+            weights = idf * tfs * (k1 + 1) / (tfs + k1 * (1 - b + b * lengths[docs] / average_length))
+            self._postings[term] = (docs, weights.astype(np.float32))
+
+    @classmethod
+    def from_views(cls, views, **kwargs):
+        """
+        Index view dictionaries (see view_tokens), e.g., the records of a view catalog.
+        """
+        return cls([view_tokens(view) for view in views], **kwargs)
+
+    def __len__(self):
+        return self._n_documents
+
+    def scores(self, query):
+        """
+        BM25 scores of all documents for a query (a string).
+        """
+        postings = [self._postings[term] for term in set(identifier_tokens(query)) if term in self._postings]
+        if not postings:
+            return np.zeros(self._n_documents, dtype=np.float32)
+        docs = np.concatenate([p[0] for p in postings])
+        weights = np.concatenate([p[1] for p in postings])
+        return np.bincount(docs, weights=weights, minlength=self._n_documents).astype(np.float32)
+
+    def search(self, query, k=5):
+        """
+        Indices and scores of the top-k documents with a positive score, in decreasing order of score.
+        """
+        scores = self.scores(query)
+        matches = np.flatnonzero(scores > 0)
+        k = min(k, len(matches))
+        if k == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        top = matches[np.argpartition(-scores[matches], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return top, scores[top]
+
+
+def _min_max(x):
+    if len(x) == 0 or x.max() == x.min():
+        return np.ones_like(x)
+    return (x - x.min()) / (x.max() - x.min())
+
+def hybrid_search(lexical_index, query, k=5, n_candidates=50, query_embedding=None, dense_index=None, alpha=0.5):
+    """
+    Two-stage retrieval: the top n_candidates documents by BM25 and, if a query embedding and a dense index
+    (retrieval.RetrievalIndex) are given, the top-k documents by cosine similarity, re-ranked by
+    alpha * (normalized BM25 score) + (1 - alpha) * (normalized cosine similarity). If no document matches the query
+    lexically, falls back to the dense index alone.
+    Returns the indices and fused scores of the top-k documents (min(k, number of documents) with a dense index).
+    """
+    candidates, lexical_scores = lexical_index.search(query, k=n_candidates)
+    if query_embedding is None or dense_index is None:
+        return candidates[:k], lexical_scores[:k]
+    if len(candidates) == 0:
+        return dense_index.search(query_embedding, k=k)
+    # Dense candidates complete the lexical matches, so that k documents are returned
+    dense_candidates, _ = dense_index.search(query_embedding, k=k)
+    candidates = np.concatenate([candidates, np.setdiff1d(dense_candidates[dense_candidates >= 0], candidates)])
+    lexical_scores = lexical_index.scores(query)[candidates]
+    fused = alpha * _min_max(lexical_scores) + (1 - alpha) * _min_max(dense_index.similarities(query_embedding, candidates))
+    order = np.argsort(-fused, kind='stable')[:k]
+    return candidates[order], fused[order]
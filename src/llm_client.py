@@ -0,0 +1,166 @@
+"""
+Shared LLM clients.
+The OAI_CONFIG_LIST configuration is loaded once (and reloaded when the file changes), and one OpenAI client
+(with its pool of keep-alive HTTP connections) is kept per model and configuration. Requests are retried with
+exponential backoff and jitter on connection errors, timeouts, rate limits and server errors.
+A config entry can set a 'base_url' (e.g., a local OpenAI-compatible server).
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import weakref
+import threading
+import openai
+
+# Errors worth retrying
+RETRY_ERRORS = (openai.APIConnectionError, openai.APITimeoutError, openai.RateLimitError, openai.InternalServerError)
+
+_config_cache = {}
+_clients = {}
+# Async clients, per event loop: they are dropped with their loop
+_async_clients = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+
+def config_list(model=None, config_file="OAI_CONFIG_LIST"):
+    """
+    The configurations of config_file (filtered by model, if provided), in the format of autogen.config_list_from_json.
+    As in autogen, if an environment variable named config_file is set, it holds either the path of the file or the JSON configuration itself.
+    """
+    source = os.environ.get(config_file, config_file)
+    if source.lstrip().startswith('['):
+        configs = json.loads(source)
+    elif os.path.exists(source):
+        key = (source, os.path.getmtime(source))
+        if key not in _config_cache:
+            with open(source) as f:
+                _config_cache[key] = json.load(f)
+        configs = _config_cache[key]
+    else:
+        raise FileNotFoundError(f"Config file {source} not found.")
+    return [dict(config) for config in configs if model is None or config.get('model') == model]
+
+def get_config(model, config_file="OAI_CONFIG_LIST"):
+    configs = config_list(model, config_file=config_file)
+    if not configs:
+        raise ValueError(f"Model {model} not found in {config_file}.")
+    return configs[0]
+
+
+def get_client(model, async_client=False, timeout=240, config_file="OAI_CONFIG_LIST"):
+    """
+    The shared (sync or async) OpenAI client of a model. Clients are created once per model configuration and reused,
+    so their HTTP connections are kept alive across calls. Retries are done by the callers of this module.
+    Async clients are bound to the running event loop, and cached per loop.
+    """
+    config = get_config(model, config_file=config_file)
+    key = (config.get('api_key'), config.get('base_url'), timeout)
+    with _clients_lock:
+        if async_client:
+            clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+        else:
+            clients = _clients
+        if key not in clients:
+            client_class = openai.AsyncOpenAI if async_client else openai.OpenAI
+            clients[key] = client_class(api_key=config.get('api_key'), base_url=config.get('base_url'), timeout=timeout, max_retries=0)
+        return clients[key]
+
+
+def _backoff(attempt, base_delay, max_delay):
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+def with_retries(call, max_retries=5, base_delay=1.0, max_delay=30.0):
+    """
+    Call call() and retry on transient errors, sleeping with exponential backoff and jitter between attempts.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return call()
+        except RETRY_ERRORS:
+            if attempt == max_retries:
+                raise
+            time.sleep(_backoff(attempt, base_delay, max_delay))
+
+async def with_retries_async(call, max_retries=5, base_delay=1.0, max_delay=30.0):
+    """
+    Async version of with_retries: call is a function returning an awaitable.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return await call()
+        except RETRY_ERRORS:
+            if attempt == max_retries:
+                raise
+            await asyncio.sleep(_backoff(attempt, base_delay, max_delay))
+
+
+def _messages(user_message, system_message):
+    return [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": user_message},
+    ]
+
+def _stream_content(stream):
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+def chat(user_message, system_message, model='gpt-4o', max_tokens=2048, temperature=0.0, stream=False, timeout=240, max_retries=5):
+    """
+    Get the response of a chat model. If stream is True, returns a generator of the pieces of the response as they arrive
+    (only the request that opens the stream is retried).
+    """
+    client = get_client(model, timeout=timeout)
+    response = with_retries(lambda: client.chat.completions.create(
+        model=model,
+        messages=_messages(user_message, system_message),
+        temperature=temperature,
+        max_tokens=max_tokens,
+        top_p=1,
+        stream=stream,
+    ), max_retries=max_retries)
+    if stream:
+        return _stream_content(response)
+    return response.choices[0].message.content
+
+async def _astream_content(stream):
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+async def achat(user_message, system_message, model='gpt-4o', max_tokens=2048, temperature=0.0, stream=False, timeout=240, max_retries=5):
+    """
+    Async version of chat. If stream is True, returns an async generator of the pieces of the response.
+    """
+    client = get_client(model, async_client=True, timeout=timeout)
+    response = await with_retries_async(lambda: client.chat.completions.create(
+        model=model,
+        messages=_messages(user_message, system_message),
+        temperature=temperature,
+        max_tokens=max_tokens,
+        top_p=1,
+        stream=stream,
+    ), max_retries=max_retries)
+    if stream:
+        return _astream_content(response)
+    return response.choices[0].message.content
+
+
+def embed(texts, model="text-embedding-3-small", timeout=240, max_retries=5):
+    """
+    Embeddings of a list of texts, in order.
+    """
+    client = get_client(model, timeout=timeout)
+    response = with_retries(lambda: client.embeddings.create(input=list(texts), model=model), max_retries=max_retries)
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+async def aembed(texts, model="text-embedding-3-small", timeout=240, max_retries=5):
+    """
+    Async version of embed.
+    """
+    client = get_client(model, async_client=True, timeout=timeout)
+    response = await with_retries_async(lambda: client.embeddings.create(input=list(texts), model=model), max_retries=max_retries)
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
@@ -1,6 +1,8 @@
 import re
 import json
 import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
 import autogen
 import sys
 import os
@@ -8,6 +10,9 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from src.database import SQLiteDatabase
 from src.process_sql import Schema, get_sql
 from src.database_utils import get_view_name_from_definition
+from src.event_log import iter_chats, chat_transcript
+from src.ast_cache import ASTCache, schema_fingerprint
+from src.llm_client import config_list
 
 
 def get_llm_assistant():
@@ -32,8 +37,7 @@ def get_llm_assistant():
         llm_config = {
                 "cache_seed": None,
                 "temperature": 0.0,
-                "config_list": autogen.config_list_from_json("OAI_CONFIG_LIST",
-                                                            filter_dict={"model": 'gpt-4o'}),
+                "config_list": config_list('gpt-4o'),
                 "timeout": 240,
             },
         human_input_mode="NEVER",
@@ -67,15 +71,39 @@ def parse_chats_from_log(chat_log_file):
     # parsed_chats = [chat[:-len("Analyst (to chat_manager):")] for chat in parsed_chats if chat.endswith("Analyst (to chat_manager):")] # remove the suffix
     return parsed_chats
 
-def parse_chats_from_autogen_log(chat_log_file):
-    raise NotImplementedError("This function is not implemented yet.")
+def iter_chats_from_event_log(event_log_file):
+    """
+    Stream the transcripts of the chats recorded in a structured event log (see src/event_log.py), in a single pass.
+    """
+    for chat in iter_chats(event_log_file):
+        transcript = chat_transcript(chat)
+        if transcript:
+            yield transcript
+
+def parse_chats(chat_log_file):
+    """
+    Parse the chats from a structured event log ('.jsonl', streamed one chat at a time) or, for older runs, from the captured stdout log.
+    Returns an iterable of chat transcripts.
+    """
+    if chat_log_file.endswith('.jsonl'):
+        return iter_chats_from_event_log(chat_log_file)
+    return parse_chats_from_log(chat_log_file)
+
+def write_chats(parsed_chats, f):
+    """
+    Write each chat to an open chats file as it is parsed, and pass it on.
+    """
+    for chatid, chat in enumerate(parsed_chats):
+        f.write(json.dumps({"chat_id": chatid, "chat": chat}) + '\n')
+        yield chat
 
 def instruction_generation(parsed_chats, instructions_file, chats_file=None, run_name='log'):
     # For each chat, ask the LLM agent to generate task - view pairs
     llm_assistant = get_llm_assistant()
+    n_chats = f" / {len(parsed_chats)}" if hasattr(parsed_chats, '__len__') else ""
     for chatid, chat in enumerate(parsed_chats):
         # Generate task - view pairs
-        print(f"Generating task - view pairs for {run_name}, chat {chatid+1} / {len(parsed_chats)}...")
+        print(f"Generating task - view pairs for {run_name}, chat {chatid+1}{n_chats}...")
         try:
             response = llm_assistant.generate_reply(messages=[{"content": f"Please help me summarize the following conversation transcript: {chat}", "role": "user"}])
         except:
@@ -84,7 +112,7 @@ def instruction_generation(parsed_chats, instructions_file, chats_file=None, run
         # find all the task - view pairs from the response using regex .findall "{any string here}"
         try:
             task_view_pairs = re.findall(r'{"task description": "(.*?)", "views": \[(.*?)\]}', response)
-            print(f"Found {len(task_view_pairs)} task - view pairs for {run_name}, chat {chatid+1} / {len(parsed_chats)}")
+            print(f"Found {len(task_view_pairs)} task - view pairs for {run_name}, chat {chatid+1}{n_chats}")
         except:
             print("Parsing error. Skipping this chat.")
             continue
@@ -132,52 +160,157 @@ def simplify_join_condition(sql_statement):
         sql_statement = sql_statement.replace(join_opt.lower(), 'join')
     return sql_statement
 
-def parse_sql(db, sql):
-    schema = Schema(db.schema_dictionary(include_views=True))
-    try:
-        # parse the SQL given the schema
-        sql_parsed = get_sql(schema, sql)
-    except Exception as e:
-        # error parsing the SQL
-        return str(e)
-    return sql_parsed
-
-def process_views(database, workspace, chat_log_file, generate_instructions=False):
-    # Parse the chat log into individual chats
-    parsed_chats_file = os.path.join(workspace, f'refine_{database.db_name}_chats.jsonl')
-    parsed_chats = parse_chats_from_log(chat_log_file)
-    with(open(parsed_chats_file, "a")) as f:
-        for chatid, chat in enumerate(parsed_chats):
-            f.write(json.dumps({"chat_id": chatid, "chat": chat}) + '\n')
+class SchemaCache:
+    """
+    Parsing schema (tables and views) of a database. The schema is introspected once and rebuilt only when the database schema changes.
+    """
+    def __init__(self, database):
+        self._database = database
+        self._version = None
+        self._schema = None
+
+    def get(self):
+        version = self._database.schema_version()
+        if self._schema is None or version != self._version:
+            self._schema = Schema(self._database.schema_dictionary(include_views=True))
+            self._version = version
+        return self._schema
 
-    # Generate Task-View pairs for each chat in the log file, to be used for instruction tuning
+def parse_sql(db, sql, schema=None, ast_cache=None, fingerprint=None):
+    """
+    Parse a SQL query. Returns the parsed query (dict), or the error message (str) if parsing fails.
+    schema: the parsing schema; if None, the schema is introspected from the database (pass it when parsing many queries).
+    ast_cache: an optional ASTCache; statements already parsed with the same schema are not parsed again.
+    fingerprint: the fingerprint of the schema (see ast_cache.schema_fingerprint); computed if None.
+    """
+    sql_parsed, error = parse_many(db, [sql], schema=schema, ast_cache=ast_cache, fingerprint=fingerprint)[0]
+    return sql_parsed if error is None else error
+
+def parse_many(db, sqls, schema_cache=None, schema=None, ast_cache=None, fingerprint=None, executor=None, chunk_size=64):
+    """
+    Parse a batch of SQL queries with a single schema lookup.
+    schema: the parsing schema; if None, it is looked up from the database (through schema_cache, if provided).
+    ast_cache: an optional ASTCache; statements already parsed with the same schema are not parsed again, and the new
+    parse results are cached.
+    fingerprint: the fingerprint of the schema (see ast_cache.schema_fingerprint); computed if None.
+    executor: an optional process pool started with _init_parse_worker; the statements to parse are sent to it in chunks of chunk_size.
+    Returns a list of (sql_parsed, error) pairs, with sql_parsed None if parsing fails and error None if it succeeds.
+    """
+    if schema is None:
+        schema = (schema_cache or SchemaCache(db)).get()
+    results = [None] * len(sqls)
+    keys = [None] * len(sqls)
+    if ast_cache is not None:
+        fingerprint = fingerprint or schema_fingerprint(schema)
+        for i, sql in enumerate(sqls):
+            keys[i] = ASTCache.key(sql, fingerprint)
+            results[i] = ast_cache.get(keys[i])
+    to_parse = [i for i, result in enumerate(results) if result is None]
+    if executor is not None and to_parse:
+        # The workers parse with the schema they were started with
+        chunks = [[sqls[i] for i in to_parse[start:start + chunk_size]] for start in range(0, len(to_parse), chunk_size)]
+        parsed = [result for chunk in executor.map(_parse_in_worker, chunks) for result in chunk]
+    else:
+        parsed = []
+        for i in to_parse:
+            try:
+                parsed.append((get_sql(schema, sqls[i]), None))
+            except Exception as e:
+                parsed.append((None, str(e)))
+    for i, result in zip(to_parse, parsed):
+        results[i] = result
+    if ast_cache is not None and to_parse:
+        ast_cache.put_many((keys[i], sql_parsed, error) for i, (sql_parsed, error) in zip(to_parse, parsed))
+        ast_cache.commit()
+    return results
+
+def process_views(database, workspace, chat_log_file, generate_instructions=False, use_ast_cache=True, ast_cache_file=None, n_workers=1, chunk_size=64):
+    """
+    Post-process the refinement chats. chat_log_file is either the structured event log ('.jsonl') or the captured stdout log.
+    use_ast_cache: reuse the parsed view definitions of previous runs (keyed by the SQL and the database schema).
+    ast_cache_file: path to the AST cache; defaults to 'refine_<database_name>_ast_cache.db' in the workspace.
+    n_workers: number of parsing processes; the view definitions are parsed in the main process if 1.
+    chunk_size: number of view definitions sent to a parsing process at once.
+    """
+    # Parse the chat log into individual chats, writing each chat as it is parsed
+    parsed_chats_file = os.path.join(workspace, f'refine_{database.db_name}_chats.jsonl')
     instructions_file = os.path.join(workspace, f'refine_{database.db_name}_task_views.jsonl')
-    if generate_instructions:
-        instruction_generation(parsed_chats, instructions_file, run_name=chat_log_file.split('.')[0])
+    with(open(parsed_chats_file, "a")) as f:
+        parsed_chats = write_chats(parse_chats(chat_log_file), f)
+        if generate_instructions:
+            # Generate Task-View pairs for each chat in the log file, to be used for instruction tuning
+            instruction_generation(parsed_chats, instructions_file, run_name=chat_log_file.split('.')[0])
+        else:
+            for _ in parsed_chats:
+                pass
     if not os.path.exists(instructions_file):
         assert False, f"Task-View pairs file {instructions_file} does not exist. Please generate the instructions first."
     
-    # Parse the SQL queries for the views generated by the LLM
+    # Parse the SQL queries for the views generated by the LLM. The database is not modified here, so the schema is built once.
+    schema = SchemaCache(database).get()
+    fingerprint = schema_fingerprint(schema)
+    ast_cache = None
+    if use_ast_cache:
+        ast_cache = ASTCache(ast_cache_file or os.path.join(workspace, f'refine_{database.db_name}_ast_cache.db'))
+    executor = None
+    if n_workers > 1:
+        # The schema is shipped to each worker once, when the worker starts
+        executor = ProcessPoolExecutor(max_workers=n_workers, initializer=_init_parse_worker, initargs=(schema.schema,))
     views_parsed_file = os.path.join(workspace, f'refine_{database.db_name}_sql_parsed.jsonl')
     instructions_file_parsed_only = os.path.join(workspace, f'refine_{database.db_name}_task_views_parsed_only.jsonl')
-    with open(views_parsed_file, 'w') as f_views_parsed:
-        f_views_parsed.write('')
-        with open(instructions_file, 'r') as f, open(instructions_file_parsed_only, 'w') as f_parsed:
-            for line in f:
-                entry = json.loads(line)
-                # Extract the SQL queries
-                view_text = entry['messages'][2]['content']
-                sql_statements = get_sql_from_text(view_text)
-                # Process the SQL queries
-                parsing_successful = True
-                for stmt in sql_statements:
-                    sql_parsed = parse_sql(database, get_query_from_view_definition(simplify_join_condition(stmt)))
-                    if not isinstance(sql_parsed, dict):
-                        parsing_successful = False
-                    view_name = get_view_name_from_definition(stmt)
-                    f_views_parsed.write(json.dumps({"view_name": view_name, "sql": stmt, "sql_parsed": sql_parsed}) + '\n')
-                if parsing_successful:
-                    f_parsed.write(json.dumps(entry) + '\n')
+    try:
+        with open(views_parsed_file, 'w') as f_views_parsed, open(instructions_file, 'r') as f, open(instructions_file_parsed_only, 'w') as f_parsed:
+            # The entries are parsed in batches (a few chunks per worker), so that memory stays bounded
+            entries = (json.loads(line) for line in f if line.strip())
+            batch_size = 2 * chunk_size * max(n_workers, 1)
+            for batch in iter(lambda: list(itertools.islice(entries, batch_size)), []):
+                _process_view_batch(batch, schema, fingerprint, ast_cache, executor, chunk_size, f_views_parsed, f_parsed)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if ast_cache is not None:
+            ast_cache.close()
+
+def _init_parse_worker(schema_dict):
+    """
+    Initialize a parsing worker process with the parsing schema.
+    """
+    global _worker_schema
+    _worker_schema = Schema(schema_dict)
+
+def _parse_in_worker(sqls):
+    return parse_many(None, sqls, schema=_worker_schema)
+
+def _process_view_batch(batch, schema, fingerprint, ast_cache, executor, chunk_size, f_views_parsed, f_parsed):
+    """
+    Parse the view definitions of a batch of Task-View entries, and write the parsed views and the successfully parsed entries.
+    """
+    views = []      # (entry index, view definition, query)
+    for entry_idx, entry in enumerate(batch):
+        # Extract the SQL queries
+        view_text = entry['messages'][2]['content']
+        for stmt in get_sql_from_text(view_text):
+            views.append((entry_idx, stmt, get_query_from_view_definition(simplify_join_condition(stmt))))
+    parsed = parse_many(None, [query for _, _, query in views], schema=schema, ast_cache=ast_cache, fingerprint=fingerprint, executor=executor, chunk_size=chunk_size)
+    parsing_successful = [True] * len(batch)
+    for (entry_idx, stmt, _), (sql_parsed, error) in zip(views, parsed):
+        if error is not None:
+            sql_parsed = error
+            parsing_successful[entry_idx] = False
+        view_name = get_view_name_from_definition(stmt)
+        f_views_parsed.write(json.dumps({"view_name": view_name, "sql": stmt, "sql_parsed": sql_parsed}) + '\n')
+    for entry, successful in zip(batch, parsing_successful):
+        if successful:
+            f_parsed.write(json.dumps(entry) + '\n')
+
+def iter_parsed_views(views_parsed_file):
+    """
+    Stream the parsed views of a 'refine_<database_name>_sql_parsed.jsonl' file, one view dictionary at a time.
+    """
+    with open(views_parsed_file, 'r') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
 
 
 def main():
@@ -188,11 +321,13 @@ def main():
     parser.add_argument("--workspace", type=str, help="Results workspace directory.")
     parser.add_argument("--db_name", type=str, help="Database name.")
     parser.add_argument("--db_file", type=str, help="Path to the '.db' file.")
-    parser.add_argument("--log_file", type=str, help="Path to the chat log file.")
+    parser.add_argument("--log_file", type=str, help="Path to the chat log file: the JSONL event log, or the captured stdout log.")
     parser.add_argument("--gen_instruct", action='store_true', help="Generate instructions for fine-tuning.")
+    parser.add_argument("--no_ast_cache", action='store_true', help="Parse all view definitions again, without the AST cache.")
+    parser.add_argument("--n_workers", type=int, default=1, help="Number of parsing processes.")
     args = parser.parse_args()
     db = SQLiteDatabase(args.db_name, args.db_file)
-    process_views(db, args.workspace, args.log_file, generate_instructions=args.gen_instruct)
+    process_views(db, args.workspace, args.log_file, generate_instructions=args.gen_instruct, use_ast_cache=not args.no_ast_cache, n_workers=args.n_workers)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -29,9 +29,9 @@ Code modified by: Agapi Rissaki, 16 August 2024
 # }
 ################################
 
+import re
 import json
 import sqlite3
-from nltk import word_tokenize
 
 CLAUSE_KEYWORDS = ('select', 'from', 'where', 'group', 'order', 'limit', 'intersect', 'union', 'except')
 JOIN_KEYWORDS = ('join', 'on', 'as')
@@ -57,6 +57,14 @@ class Schema:
     def __init__(self, schema):
         self._schema = schema
         self._idMap = self._map(self._schema)
+        self._columns = None
+
+    @property
+    def columns(self):
+        """Set of column names of each table, for constant-time membership tests"""
+        if self._columns is None:
+            self._columns = {table: set(cols) for table, cols in self._schema.items()}
+        return self._columns
 
     @property
     def schema(self):
@@ -94,7 +102,63 @@ def get_schema_from_json(fpath):
     return schema
 
 
+# Single-pass SQL lexer. Whitespace and comments are skipped; string values are wrapped by "" (as in tokenize_nltk).
+_SQL_LEXEME = re.compile(r"""
+    (?P<skip>\s+|--[^\n]*|/\*.*?\*/)
+  | (?P<string>["'][^"']*["'])
+  | (?P<quote>["'])
+  | (?P<ident>`[^`]*`|\[[^\]]*\])
+  | (?P<op>!=|>=|<=|<>|\|\||[(),;=<>!+\-*/%])
+  | (?P<word>[^\s"'`\[\](),;=<>!+\-*/%|]+(?:(?<=\.)\*)?)
+  | (?P<other>.)
+""", re.VERBOSE | re.DOTALL)
+# Tokens after which a '-' or '+' followed by a digit is the sign of a number, not an arithmetic operator
+_NOT_OPERAND = frozenset(CLAUSE_KEYWORDS + JOIN_KEYWORDS + WHERE_OPS + COND_OPS + ORDER_OPS + UNIT_OPS + (
+    '(', ',', ';', 'select', 'distinct', 'by', 'having', 'case', 'when', 'then', 'else', 'offset', '%', '<>', '||'))
+
+
 def tokenize(string):
+    """
+    Tokenize a SQL query in a single pass: lower-cased keywords and identifiers, string values wrapped by "",
+    and the operators !=, >=, <= as single tokens ('<>' is normalized to '!=').
+    """
+    toks = []
+    sign_end = -1  # end position of a '-' or '+' that may be the sign of the next number
+    for match in _SQL_LEXEME.finditer(str(string)):
+        kind = match.lastgroup
+        if kind == 'skip':
+            continue
+        if kind == 'word':
+            tok = match.group().lower()
+            # signed number, e.g., '> -1'
+            if match.start() == sign_end and (tok[0].isdigit() or tok[0] == '.'):
+                toks[-1] += tok
+            else:
+                toks.append(tok)
+        elif kind == 'string':
+            # ' and " both delimit string values, as in tokenize_nltk
+            toks.append('"' + match.group()[1:-1] + '"')
+        elif kind == 'op':
+            tok = match.group()
+            if tok == '<>':
+                tok = '!='
+            elif tok in ('-', '+') and (not toks or toks[-1] in _NOT_OPERAND):
+                sign_end = match.end()
+            toks.append(tok)
+        elif kind == 'ident':
+            toks.append(match.group()[1:-1].lower())
+        elif kind == 'quote':
+            assert False, "Unexpected quote"
+        else:
+            toks.append(match.group())
+    return toks
+
+
+def tokenize_nltk(string):
+    """
+    Original tokenizer, based on NLTK's word_tokenize. Kept as a reference for equivalence checks (see tests/test_process_sql.py and src/benchmark.py).
+    """
+    from nltk import word_tokenize
     string = str(string)
     string = string.replace("\'", "\"")  # ensures all string values wrapped by "" problem??
     quote_idxs = [idx for idx, char in enumerate(string) if char == '"']
@@ -148,14 +212,15 @@ def scan_candidate_alias(toks):
     """Scan tokens that contain . and extract a candidate alias as first part of the token. 
     Scan the index of each candidate alias and build the map"""
     candidate_alias = [tok.split('.')[0] for tok in toks if '.' in tok]
+    # index of the first occurrence of each token, built in a single pass
+    first_idx = {}
+    for idx, tok in enumerate(toks):
+        first_idx.setdefault(tok, idx)
     alias_dict = {}
     for alias in candidate_alias:
         # check if the candidate alias exists in the token list
-        alias_idx = None
-        for idx, tok in enumerate(toks):
-            if alias==tok:
-                alias_idx = idx
-                break
+        alias_idx = first_idx.get(alias)
+        assert alias_idx is not None, "Alias {} not found".format(alias)
         # if the previous token is AS then the token before AS is the table name
         if toks[alias_idx-1] == 'as':
             alias_dict[alias] = toks[alias_idx-2]
@@ -190,7 +255,7 @@ def parse_col(toks, start_idx, tables_with_alias, schema, default_tables=None):
 
     for alias in default_tables:
         table = tables_with_alias[alias]
-        if tok in schema.schema[table]:
+        if tok in schema.columns[table]:
             key = table + "." + tok
             return start_idx+1, schema.idMap[key]
 
@@ -286,7 +351,7 @@ def parse_value(toks, start_idx, tables_with_alias, schema, default_tables=None)
         idx += 1
 
     if toks[idx] == 'select':
-        idx, val = parse_sql(toks, idx, tables_with_alias, schema)
+        idx, val = parse_sql(toks, idx, tables_with_alias, schema, preprocessed=True)
     elif "\"" in toks[idx]:  # token is a string value
         val = toks[idx]
         idx += 1
@@ -376,10 +441,11 @@ def parse_from(toks, start_idx, tables_with_alias, schema):
     """
     Assume in the from clause, all table units are combined with join
     """
-    assert 'from' in toks[start_idx:], "'from' not found"
-
     len_ = len(toks)
-    idx = toks.index('from', start_idx) + 1
+    try:
+        idx = toks.index('from', start_idx) + 1
+    except ValueError:
+        assert False, "'from' not found"
     default_tables = []
     table_units = []
     conds = []
@@ -391,7 +457,7 @@ def parse_from(toks, start_idx, tables_with_alias, schema):
             idx += 1
 
         if toks[idx] == 'select':
-            idx, sql = parse_sql(toks, idx, tables_with_alias, schema)
+            idx, sql = parse_sql(toks, idx, tables_with_alias, schema, preprocessed=True)
             table_units.append((TABLE_TYPE['sql'], sql))
         else:
             if idx < len_ and toks[idx] == 'join':
@@ -504,12 +570,27 @@ def parse_limit(toks, start_idx):
     return idx, None
 
 
-def parse_sql(toks, start_idx, tables_with_alias, schema):
+def remove_alias_tokens(toks):
+    """Remove AS from the tokens as well as the alias that follows it, in a single pass"""
+    toks_updated = []
+    prev_is_as = False
+    for tok in toks:
+        is_as = tok == 'as'
+        if not is_as and not prev_is_as:
+            toks_updated.append(tok)
+        prev_is_as = is_as
+    return toks_updated
+
+
+def parse_sql(toks, start_idx, tables_with_alias, schema, preprocessed=False):
+    """
+        :param preprocessed: whether the AS tokens (and aliases) were already removed with remove_alias_tokens.
+        Nested queries reuse the preprocessed token list, so the tokens are preprocessed once per query.
+    """
     ### Added by Agapi Rissaki ###
     # remove AS from the tokens as well as the alias
-    as_idxs = [idx for idx, tok in enumerate(toks) if tok == 'as']
-    toks_updated = [tok for idx, tok in enumerate(toks) if (idx not in as_idxs) and (idx-1 not in as_idxs)]
-    toks = toks_updated
+    if not preprocessed:
+        toks = remove_alias_tokens(toks)
     ##############################
 
     isBlock = False # indicate whether this is a block of sql/sub-sql
@@ -556,7 +637,7 @@ def parse_sql(toks, start_idx, tables_with_alias, schema):
     if idx < len_ and toks[idx] in SQL_OPS:
         sql_op = toks[idx]
         idx += 1
-        idx, IUE_sql = parse_sql(toks, idx, tables_with_alias, schema)
+        idx, IUE_sql = parse_sql(toks, idx, tables_with_alias, schema, preprocessed=True)
         sql[sql_op] = IUE_sql
     return idx, sql
 
@@ -570,7 +651,7 @@ def load_data(fpath):
 def get_sql(schema, query):
     toks = tokenize(query)
     tables_with_alias = get_tables_with_alias_(schema.schema, toks)
-    _, sql = parse_sql(toks, 0, tables_with_alias, schema)
+    _, sql = parse_sql(remove_alias_tokens(toks), 0, tables_with_alias, schema, preprocessed=True)
     return sql
 
 
@@ -1,3 +1,4 @@
+import re
 import yaml
 import json
 import argparse
@@ -8,8 +9,11 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from src.database import SQLiteDatabase
-from src.database_utils import get_view_name_from_definition
-from src.graph import schema_subgraph
+from src.sql_splitter import iter_sql_statements
+from src.event_log import EventLogger
+from src.chat_store import ChatStore
+from src.graph import schema_subgraphs, CoverageScheduler
+from src.llm_client import config_list
 
 
 def extract_codeblock_from_message_history(chat_history):
@@ -35,25 +39,70 @@ def extract_view_definitions_from_code(chat_code_history):
 def extract_view_names_from_code(chat_code_history):
     """
     Retrieves the view names from the code blocks containing the view definitions.
+    A code block might contain several view definition statements.
     """
-    # TODO: code might contain several view definition statements. We need to separate them to extract all view names.
     view_names = []
     for codeblock in chat_code_history:
-        code = codeblock.code
-        # separate the code into lines
-        code_lines = code.split("\n")
-        for line in code_lines:
-            view_name = get_view_name_from_definition(line)
-            if view_name:
-                view_names.append(view_name)
+        # separate the code into statements
+        for statement in iter_sql_statements(codeblock.code):
+            if statement.statement_type == "CREATE VIEW" and statement.object_name:
+                view_names.append(statement.object_name.lower())
     # Remove duplicates
     view_names = list(set(view_names))
     return view_names
 
-def run_analytics_chat_with_verification(analyst, critic, coder, verifier, schema_wording, chat_manager_config, n_rounds=8, n_chats=40, n_verification_rounds=6):
+def count_views_per_table(code_history, tables):
+    """
+    Count the CREATE VIEW statements in the code history that mention each of the given tables.
+    """
+    patterns = {table: re.compile(r'\b' + re.escape(table) + r'\b', re.IGNORECASE) for table in tables}
+    views_per_table = {table: 0 for table in tables}
+    for code in code_history:
+        for statement in iter_sql_statements(code):
+            if statement.statement_type == "CREATE VIEW":
+                for table, pattern in patterns.items():
+                    if pattern.search(statement.text):
+                        views_per_table[table] += 1
+    return views_per_table
+
+def get_schema_wording(database, selected_tables=None, sample_data=False, token_budget=None, event_logger=None):
+    """
+    Get the schema wording of the database (or of the selected tables), compressed to fit token_budget tokens if provided.
+    """
+    if token_budget is None:
+        return database.schema_wording(selected_tables=selected_tables, include_sample_data=sample_data)
+    schema_wording, report = database.schema_wording_budgeted(token_budget, selected_tables=selected_tables, include_sample_data=sample_data)
+    if report['steps'] or report['dropped_tables']:
+        print(f"Schema wording compressed from {report['full_tokens']} to {report['tokens']} tokens ({', '.join(report['steps'])}{'; dropped tables: ' + ', '.join(report['dropped_tables']) if report['dropped_tables'] else ''}).")
+    if event_logger:
+        event_logger.log("schema_wording", **report)
+    return schema_wording
+
+def register_event_logging(agents, event_logger):
+    """
+    Log every message sent by the agents to the event log, as it happens.
+    """
+    def log_message(sender, message, recipient, silent):
+        event_logger.log_message(sender.name, recipient.name, message)
+        return message
+    for agent in agents:
+        agent.register_hook("process_message_before_send", log_message)
+
+def log_chat_result(event_logger, result, chat_code):
+    """
+    Log the code blocks and the summary of a finished chat to the event log.
+    """
+    for codeblock in chat_code:
+        event_logger.log("code_block", language=codeblock.language, code=codeblock.code)
+    event_logger.log("summary", summary=result.summary)
+    event_logger.end_chat(status="ok")
+
+def run_analytics_chat_with_verification(analyst, critic, coder, verifier, schema_wording, chat_manager_config, n_rounds=8, n_chats=40, n_verification_rounds=6, event_logger=None, chat_store=None, code_store=None, sample_id=None):
     """
     Run the group chat with verification. The chat involves the analyst, critic, coder, and verifier.
     The analyst and critic discuss to define the analysis task and views. The coder and verifier discuss to verify the views.
+    If a chat_store is provided, each chat is appended to it when it finishes and the returned chat history is empty.
+    If a code_store is provided, each view definition is appended to it as soon as it is extracted from a chat.
     """
 
     def state_transition(last_speaker, groupchat):
@@ -111,6 +160,8 @@ END SCHEMA
             init_message += "Here are some database views we defined in previous discussion(s): \n\n{}\n\n".format('\n'.join([f"{i+1}. {v}" for i, v in enumerate(prev_defined_views)]))
             init_message += "Let's try something different this time. We need to explore more aspects of the data and define new views.\n\n"
         init_message += "First, please suggest an analysis task for me to work on."
+        if event_logger:
+            event_logger.start_chat(chat_iter=chat_iter, n_chats=n_chats)
         try:
             groupchat = autogen.GroupChat(agents=[analyst, critic, coder, verifier], messages=[], max_round=n_rounds+n_verification_rounds, speaker_selection_method=state_transition)
             manager = autogen.GroupChatManager(groupchat=groupchat, llm_config=chat_manager_config, system_message=manager_system_message, human_input_mode="NEVER")
@@ -121,23 +172,37 @@ END SCHEMA
                 is_termination_msg=lambda msg: "goodbye" in msg["content"].lower(),
             )
             prev_chat_summaries.append(result.summary)
-            chat_history.append(result.chat_history)
+            # Persist the chat as soon as it finishes, instead of keeping it in memory
+            if chat_store is not None:
+                chat_store.append({"sample_id": sample_id, "chat_iter": chat_iter, "summary": result.summary, "chat": result.chat_history})
+            else:
+                chat_history.append(result.chat_history)
             chat_code = extract_codeblock_from_message_history(result.chat_history)
-            code_history += extract_view_definitions_from_code(chat_code)
+            view_definitions = extract_view_definitions_from_code(chat_code)
+            if code_store is not None:
+                for code in view_definitions:
+                    code_store.append({"sample_id": sample_id, "chat_iter": chat_iter, "code": code})
+            code_history += view_definitions
             prev_defined_views += extract_view_names_from_code(chat_code)
+            if event_logger:
+                log_chat_result(event_logger, result, chat_code)
         # Handle any chat error: e.g., maximum context length error, etc. 
         # Gracefully exit the sequential session, returning the progress so far.
         except Exception as e:
             print(f"Error in chat {chat_iter+1} / {n_chats}: {e}.")
+            if event_logger:
+                event_logger.end_chat(status="error", error=str(e))
             break
 
     return chat_history, code_history
 
 
-def run_analytics_chat(analyst, critic, schema_wording, n_rounds=8, n_chats=40):
+def run_analytics_chat(analyst, critic, schema_wording, n_rounds=8, n_chats=40, event_logger=None, chat_store=None, code_store=None, sample_id=None):
     """
     Run the group chat without verification. The chat involves the analyst and critic only.
     The analyst and critic discuss to define the analysis task and views.
+    If a chat_store is provided, each chat is appended to it when it finishes and the returned chat history is empty.
+    If a code_store is provided, each view definition is appended to it as soon as it is extracted from a chat.
     """
     # Initiate the chat
     chat_history = []
@@ -158,6 +223,8 @@ END SCHEMA
             init_message += "Here are some database views we defined in previous discussion(s): \n\n{}\n\n".format('\n'.join([f"{i+1}. {v}" for i, v in enumerate(prev_defined_views)]))
             init_message += "Let's try something different this time. We need to explore more aspects of the data and define new views.\n\n"
         init_message += "First, please suggest an analysis task for me to work on."
+        if event_logger:
+            event_logger.start_chat(chat_iter=chat_iter, n_chats=n_chats)
         try:
             result = analyst.initiate_chat(
                 critic,
@@ -167,29 +234,58 @@ END SCHEMA
                 is_termination_msg=lambda msg: "goodbye" in msg["content"].lower(),
             )
             prev_chat_summaries.append(result.summary)
-            chat_history.append(result.chat_history)
+            # Persist the chat as soon as it finishes, instead of keeping it in memory
+            if chat_store is not None:
+                chat_store.append({"sample_id": sample_id, "chat_iter": chat_iter, "summary": result.summary, "chat": result.chat_history})
+            else:
+                chat_history.append(result.chat_history)
             chat_code = extract_codeblock_from_message_history(result.chat_history)
-            code_history += extract_view_definitions_from_code(chat_code)
+            view_definitions = extract_view_definitions_from_code(chat_code)
+            if code_store is not None:
+                for code in view_definitions:
+                    code_store.append({"sample_id": sample_id, "chat_iter": chat_iter, "code": code})
+            code_history += view_definitions
             prev_defined_views += extract_view_names_from_code(chat_code)
+            if event_logger:
+                log_chat_result(event_logger, result, chat_code)
         # Handle any chat error: e.g., maximum context length error, etc. 
         # Gracefully exit the sequential session, returning the progress so far.
         except Exception as e:
             print(f"Error in chat {chat_iter+1} / {n_chats}: {e}.")
+            if event_logger:
+                event_logger.end_chat(status="error", error=str(e))
             break
 
     return chat_history, code_history
 
 
-def refine_schema(database, workspace, instructions_file, cache_seed=0, temperature=0.2, llm_timeout=240, model="gpt-4", verify=False, n_chats=10, n_rounds=8, n_verification_rounds=6, exec_timeout=60, subsample=False, n_samples=50, sample_size=5, sample_data=False):
+def refine_schema(database, workspace, instructions_file, cache_seed=0, temperature=0.2, llm_timeout=240, model="gpt-4", verify=False, n_chats=10, n_rounds=8, n_verification_rounds=6, exec_timeout=60, subsample=False, n_samples=50, sample_size=5, sample_data=False, event_log_file=None, chat_store=None, code_store=None, sample_fraction=None, scheduler="random", coverage_target=None, schema_token_budget=None):
+    """
+    Run the multi-agent schema refinement. Returns the chat history and the code history (view definitions).
+    event_log_file: If provided, messages, tool calls, code blocks and chat summaries are appended to this JSONL event log as they happen.
+    chat_store: If provided (a ChatStore), every chat is persisted as soon as it finishes and is not kept in the returned chat history.
+    code_store: If provided (a ChatStore), every view definition is persisted as soon as it is produced and is not kept in the returned code history.
+    sample_fraction: If provided, the agents work on a referentially consistent sample of the database with this fraction of rows,
+    written to the workspace. The views accepted on the sample are then validated and materialized on the full database.
+    scheduler: how the table subsets are chosen with subsample=True: "random" (the default) draws independent connected subsets,
+    "coverage" favors the tables and foreign-key edges explored the least (weighted by the views they yielded).
+    coverage_target: If provided, stop sampling once this fraction of the tables has been covered (coverage scheduler only).
+    schema_token_budget: If provided, the schema wording given to the agents is compressed to fit this number of tokens.
+    """
+    # Run the agents against a sample of the data; the accepted views are validated on the full database at the end
+    full_database = database
+    if sample_fraction:
+        database = full_database.sample_database(os.path.join(workspace, f"{database.db_name}_sample.db"), fraction=sample_fraction)
+        sample_views = set(database.get_views())
     # Start runtime logging
     logging_session_id = autogen.runtime_logging.start(logger_type="file", config={"filename": f'refine_{database.db_name}_{cache_seed}.log'})
+    event_logger = EventLogger(event_log_file) if event_log_file else None
 
     # Define the default LLM configuration 
     llm_config = {
         "cache_seed": cache_seed,
         "temperature": temperature,
-        "config_list": autogen.config_list_from_json("OAI_CONFIG_LIST",
-                                                    filter_dict={"model": model}),
+        "config_list": config_list(model),
         "timeout": llm_timeout,
     }
 
@@ -259,37 +355,74 @@ def refine_schema(database, workspace, instructions_file, cache_seed=0, temperat
         # Register the tool function with the user proxy agent.
         verifier.register_for_execution(name="materialize_view_tool")(materialize_view_tool)
 
+    # Log the messages of all the agents
+    if event_logger:
+        register_event_logging([analyst, critic, coder, verifier] if verify else [analyst, critic], event_logger)
+
     if not subsample:
         # Get the schema wording
-        schema_wording = database.schema_wording(selected_tables=None, include_sample_data=sample_data)
+        schema_wording = get_schema_wording(database, selected_tables=None, sample_data=sample_data, token_budget=schema_token_budget, event_logger=event_logger)
 
         # Setup the multi-agent chat
         if verify:
-            chat_history, code_history = run_analytics_chat_with_verification(analyst, critic, coder, verifier, schema_wording, chat_manager_config=llm_config, n_chats=n_chats, n_rounds=n_rounds, n_verification_rounds=n_verification_rounds)
+            chat_history, code_history = run_analytics_chat_with_verification(analyst, critic, coder, verifier, schema_wording, chat_manager_config=llm_config, n_chats=n_chats, n_rounds=n_rounds, n_verification_rounds=n_verification_rounds, event_logger=event_logger, chat_store=chat_store, code_store=code_store)
         else:
-            chat_history, code_history = run_analytics_chat(analyst, critic, schema_wording, n_chats=n_chats, n_rounds=n_rounds)
+            chat_history, code_history = run_analytics_chat(analyst, critic, schema_wording, n_chats=n_chats, n_rounds=n_rounds, event_logger=event_logger, chat_store=chat_store, code_store=code_store)
+        if code_store is not None:
+            code_history = []
     else:
         # Construct the schema graph
         schema_graph = database.schema_graph()
+        if scheduler == "coverage":
+            coverage_scheduler = CoverageScheduler(schema_graph, n_nodes=sample_size, seed=cache_seed)
+            schema_samples = (coverage_scheduler.next_sample() for _ in range(n_samples))
+        else:
+            # Draw all the schema samples at once
+            coverage_scheduler = None
+            schema_samples = schema_subgraphs(schema_graph, n_nodes=sample_size, n_samples=n_samples, seed=cache_seed)
         chat_history = []
         code_history = []
-        for i in range(n_samples):
-            # Subsample the database schema and get the schema wording for the sample
-            selected_tables = schema_subgraph(schema_graph, n_nodes=sample_size)
-            schema_wording_i = database.schema_wording(selected_tables=selected_tables, include_sample_data=sample_data)
+        for i, selected_tables in enumerate(schema_samples):
+            # Get the schema wording for the sample
+            if event_logger:
+                event_logger.start_sample(i, tables=selected_tables)
+            schema_wording_i = get_schema_wording(database, selected_tables=selected_tables, sample_data=sample_data, token_budget=schema_token_budget, event_logger=event_logger)
             
             # Setup the multi-agent chat
             if verify:
-                chat_history_i, code_history_i = run_analytics_chat_with_verification(analyst, critic, coder, verifier, schema_wording_i, chat_manager_config=llm_config, n_chats=n_chats, n_rounds=n_rounds, n_verification_rounds=n_verification_rounds)
+                chat_history_i, code_history_i = run_analytics_chat_with_verification(analyst, critic, coder, verifier, schema_wording_i, chat_manager_config=llm_config, n_chats=n_chats, n_rounds=n_rounds, n_verification_rounds=n_verification_rounds, event_logger=event_logger, chat_store=chat_store, code_store=code_store, sample_id=i)
             else:
-                chat_history_i, code_history_i = run_analytics_chat(analyst, critic, schema_wording_i, n_chats=n_chats, n_rounds=n_rounds)
+                chat_history_i, code_history_i = run_analytics_chat(analyst, critic, schema_wording_i, n_chats=n_chats, n_rounds=n_rounds, event_logger=event_logger, chat_store=chat_store, code_store=code_store, sample_id=i)
 
             # Append the chat and code history
             chat_history += chat_history_i
-            code_history += code_history_i
+            if code_store is None:
+                code_history += code_history_i
+
+            # Update the coverage of the schema
+            if coverage_scheduler:
+                coverage_scheduler.record_yield(count_views_per_table(code_history_i, selected_tables))
+                coverage = coverage_scheduler.coverage()
+                print(f"Schema coverage after {coverage['n_samples']} samples: {coverage['tables_covered']}/{coverage['n_tables']} tables, {coverage['edges_covered']}/{coverage['n_edges']} foreign-key edges.")
+                if event_logger:
+                    event_logger.log("coverage", **coverage)
+                if coverage_target is not None and coverage['table_coverage'] >= coverage_target:
+                    break
+
+    # Validate the views accepted on the sample against the full database
+    if sample_fraction:
+        for view_name, view_definition in database.get_views().items():
+            if view_name in sample_views:
+                continue
+            result = full_database.materialize_view(view_definition, verbose=False, persist=True)
+            print(result)
+            if event_logger:
+                event_logger.log("view_validation", view_name=view_name, result=result)
 
     # End logging
     autogen.runtime_logging.stop()
+    if event_logger:
+        event_logger.close()
 
     return chat_history, code_history
 
@@ -314,16 +447,22 @@ def main():
     parser.add_argument("--n_samples", type=int, default=20, help="Number of schema samples.")
     parser.add_argument("--n_sampled_tables", type=int, default=5, help="Number of tables in each schema sample.")
     parser.add_argument("--sample_data", action="store_true", help="Sample data from the database to include in the schema wording.")
+    parser.add_argument("--event_log", type=str, default=None, help="Path to the JSONL event log. Defaults to 'refine_<db_name>_events.jsonl' in the workspace.")
+    parser.add_argument("--compress_history", action="store_true", help="Gzip-compress the chats in the chat history store.")
+    parser.add_argument("--scheduler", type=str, default="random", choices=["random", "coverage"], help="How the schema samples are chosen with --subsample.")
+    parser.add_argument("--coverage_target", type=float, default=None, help="Stop sampling once this fraction of the tables has been covered (coverage scheduler).")
+    parser.add_argument("--schema_token_budget", type=int, default=None, help="Compress the schema wording given to the agents to fit this number of tokens.")
+    parser.add_argument("--sample_fraction", type=float, default=None, help="Run the agents on a sample of the database with this fraction of rows (and the rows they reference), validating the accepted views on the full database.")
     args = parser.parse_args()
     os.makedirs(args.workspace, exist_ok=True)
+    event_log_file = args.event_log or os.path.join(args.workspace, f"refine_{args.db_name}_events.jsonl")
+    # Chats and view definitions are written to their stores as soon as they are produced
+    chat_store = ChatStore(os.path.join(args.workspace, "chat_history"), compress=args.compress_history)
+    code_store = ChatStore(os.path.join(args.workspace, "code_history"), compress=args.compress_history)
     db = SQLiteDatabase(args.db_name, args.db_file)
-    chat_history, code_history = refine_schema(db, args.workspace, args.instr_file, cache_seed=args.cache_seed, temperature=args.temperature, llm_timeout=args.timeout, model=args.model, verify=args.verify, n_chats=args.n_chats, n_rounds=args.n_rounds, n_verification_rounds=args.n_verification_rounds, subsample=args.subsample, n_samples=args.n_samples, sample_size=args.n_sampled_tables, sample_data=args.sample_data)
-    with open(os.path.join(args.workspace, "chat_history.txt"), "w") as f:
-        for chat in chat_history:
-            f.write(json.dumps(chat) + "\n")
-    with open(os.path.join(args.workspace, "code_history.sql"), "w") as f:
-        for code in code_history:
-            f.write(code + "\n")
+    refine_schema(db, args.workspace, args.instr_file, cache_seed=args.cache_seed, temperature=args.temperature, llm_timeout=args.timeout, model=args.model, verify=args.verify, n_chats=args.n_chats, n_rounds=args.n_rounds, n_verification_rounds=args.n_verification_rounds, subsample=args.subsample, n_samples=args.n_samples, sample_size=args.n_sampled_tables, sample_data=args.sample_data, event_log_file=event_log_file, chat_store=chat_store, code_store=code_store, sample_fraction=args.sample_fraction, scheduler=args.scheduler, coverage_target=args.coverage_target, schema_token_budget=args.schema_token_budget)
+    chat_store.close()
+    code_store.close()
 
 
 if __name__ == "__main__":
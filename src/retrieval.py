@@ -0,0 +1,115 @@
+"""
+Top-k view retrieval.
+Exact cosine-similarity search over a normalized float32 embedding matrix (one matrix product and an argpartition per
+batch of queries), and an optional inverted-file (IVF) mode for very large catalogs: the views are partitioned by
+spherical k-means and a query only scans the partitions of its n_probe nearest centroids.
+"""
+import numpy as np
+
+
+def normalize_rows(X):
+    """
+    Rows of X scaled to unit norm, as float32 (rows of zeros are left unchanged).
+    """
+    X = np.asarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=-1, keepdims=True)
+    return X / np.where(norms > 0, norms, 1)
+
+def top_k(scores, k):
+    """
+    Indices and values of the k largest scores of each row, in decreasing order.
+    """
+    scores = np.atleast_2d(scores)
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.zeros((scores.shape[0], 0), dtype=np.int64), np.zeros((scores.shape[0], 0), dtype=scores.dtype)
+    indices = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    values = np.take_along_axis(scores, indices, axis=1)
+    order = np.argsort(-values, axis=1, kind='stable')
+    return np.take_along_axis(indices, order, axis=1), np.take_along_axis(values, order, axis=1)
+
+
+def spherical_kmeans(X, n_clusters, n_iter=10, seed=0):
+    """
+    K-means on unit vectors with cosine similarity. Returns the (normalized) centroids and the assignment of the rows.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = X[rng.choice(len(X), size=n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assignment = np.argmax(X @ centroids.T, axis=1)
+        counts = np.bincount(assignment, minlength=n_clusters)
+        # Sum the rows of each cluster
+        order = np.argsort(assignment, kind='stable')
+        sums = np.zeros_like(centroids)
+        sums[counts > 0] = np.add.reduceat(X[order], np.concatenate([[0], np.cumsum(counts)[:-1]])[counts > 0], axis=0)
+        # Re-seed empty clusters with random rows
+        empty = counts == 0
+        sums[empty] = X[rng.choice(len(X), size=int(empty.sum()), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids, np.argmax(X @ centroids.T, axis=1)
+
+
+class RetrievalIndex:
+    """
+    Cosine-similarity index over an embedding matrix (e.g., the embeddings of a view catalog).
+    If normalize is False, the embeddings are assumed to be unit vectors and are used as is (a memory-mapped matrix is not copied).
+    """
+    def __init__(self, embeddings, normalize=True):
+        self._embeddings = normalize_rows(embeddings) if normalize else np.asarray(embeddings, dtype=np.float32)
+        self._centroids = None
+
+    def __len__(self):
+        return len(self._embeddings)
+
+    def build_ivf(self, n_lists=None, n_iter=10, sample_size=20000, seed=0):
+        """
+        Build the inverted lists for approximate search. n_lists defaults to about 4 * sqrt(n); the centroids are trained on a sample of the rows.
+        """
+        n = len(self._embeddings)
+        n_lists = min(n, n_lists or int(4 * np.sqrt(n)))
+        rng = np.random.default_rng(seed)
+        sample = self._embeddings[np.sort(rng.choice(n, size=min(n, sample_size), replace=False))]
+        self._centroids, _ = spherical_kmeans(sample, n_lists, n_iter=n_iter, seed=seed)
+        assignment = np.concatenate([np.argmax(self._embeddings[start:start + 65536] @ self._centroids.T, axis=1) for start in range(0, n, 65536)])
+        # Rows of each list, stored contiguously
+        self._list_rows = np.argsort(assignment, kind='stable')
+        self._list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=n_lists))])
+        self._list_embeddings = self._embeddings[self._list_rows]
+        return self
+
+    def search(self, queries, k=5, n_probe=None, batch_size=1024):
+        """
+        Top-k rows by cosine similarity for one query (a vector) or a batch of queries (a matrix).
+        Exact by default; if n_probe is given (and build_ivf was called), only the n_probe nearest inverted lists are scanned.
+        Returns the indices and similarities, as arrays of shape (k,) for one query or (n_queries, k) for a batch
+        (in IVF mode, if the scanned lists hold fewer than k rows, the missing results have index -1).
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        single = queries.ndim == 1
+        queries = normalize_rows(np.atleast_2d(queries))
+        if n_probe is not None and self._centroids is not None:
+            indices, scores = self._search_ivf(queries, k, n_probe)
+        else:
+            results = [top_k(queries[start:start + batch_size] @ self._embeddings.T, k) for start in range(0, len(queries), batch_size)]
+            indices = np.concatenate([r[0] for r in results])
+            scores = np.concatenate([r[1] for r in results])
+        return (indices[0], scores[0]) if single else (indices, scores)
+
+    def similarities(self, query, rows):
+        """
+        Cosine similarities between a query and the given rows (e.g., to re-rank candidates).
+        """
+        return self._embeddings[np.asarray(rows)] @ normalize_rows(query)
+
+    def _search_ivf(self, queries, k, n_probe):
+        probes, _ = top_k(queries @ self._centroids.T, n_probe)
+        k = min(k, len(self._embeddings))
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for q, lists in enumerate(probes):
+            positions = np.concatenate([np.arange(self._list_offsets[l], self._list_offsets[l + 1]) for l in lists])
+            candidate_indices, candidate_scores = top_k(self._list_embeddings[positions] @ queries[q], k)
+            found = candidate_indices.shape[1]
+            indices[q, :found] = self._list_rows[positions[candidate_indices[0]]]
+            scores[q, :found] = candidate_scores[0]
+        return indices, scores
@@ -0,0 +1,155 @@
+"""
+Schema linking.
+Scores the tables and columns of a database against a natural language question, using an inverted index over
+the identifiers and sampled column values (and optionally precomputed table embeddings), and expands the selected
+tables along foreign-key paths, so that only the relevant slice of the schema is put in the prompt.
+"""
+import os
+import re
+import math
+import pickle
+import numpy as np
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.join_paths import join_path_index
+
+_STOPWORDS = frozenset("""a an and are as at be by did do does for from give has have how i in is it list many me much
+most least my of on or per show that the their them there these this those to was were what when where which who
+whose with each all any than more""".split())
+
+# Weight of a match, by the kind of indexed item
+NAME_WEIGHTS = {'table': 3.0, 'column': 2.0, 'value': 1.5}
+
+
+def _stem(token):
+    if len(token) > 4 and token.endswith('ies'):
+        return token[:-3] + 'y'
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+def identifier_tokens(text):
+    """
+    Split identifiers and text into lower-cased, stemmed word tokens (snake_case, camelCase and digits are split).
+    """
+    text = re.sub(r'([a-z])([A-Z])', r'\1 \2', str(text))
+    return [_stem(token) for token in re.findall(r'[a-z]+|\d+', text.lower()) if token not in _STOPWORDS]
+
+
+class SchemaLinker:
+    """
+    Lexical schema linker over a database.
+    n_values: number of distinct text values sampled per column.
+    table_embeddings: optional dictionary from table name to a (normalized) embedding of its description; if provided,
+    link() also scores tables by their similarity with the question embedding.
+    """
+    def __init__(self, database, n_values=50, max_value_length=64, table_embeddings=None):
+        self._database = database
+        schema = database.schema_dictionary()
+        # The schema dictionary lower-cases the table names: link to the names of the database (as in the schema graph and wording)
+        table_names = {table.lower(): table for table in database.get_tables()}
+        self._tables = [table_names.get(table, table) for table in schema]
+        self._columns = [list(schema[table]) for table in schema]
+        # token -> {(table id, column id or -1): weight}
+        postings = {}
+        def add(tokens, key, weight):
+            for token in set(tokens):
+                entry = postings.setdefault(token, {})
+                entry[key] = max(entry.get(key, 0.0), weight)
+        for t, table in enumerate(self._tables):
+            add(identifier_tokens(table), (t, -1), NAME_WEIGHTS['table'])
+            for c, column in enumerate(self._columns[t]):
+                add(identifier_tokens(column), (t, c), NAME_WEIGHTS['column'])
+                if n_values:
+                    for value in self._sample_values(table, column, n_values, max_value_length):
+                        add(identifier_tokens(value), (t, c), NAME_WEIGHTS['value'])
+        # Per token: the best weight per table (arrays, for vectorized scoring), scaled by the inverse document frequency
+        n_tables = len(self._tables)
+        self._table_postings = {}
+        self._column_postings = {}
+        for token, entry in postings.items():
+            best = {}
+            for (t, c), weight in entry.items():
+                best[t] = max(best.get(t, 0.0), weight)
+            idf = math.log(1.0 + n_tables / len(best))
+            self._table_postings[token] = (np.fromiter(best, dtype=np.int64, count=len(best)), np.fromiter(best.values(), dtype=np.float64, count=len(best)) * idf)
+            self._column_postings[token] = {key: weight * idf for key, weight in entry.items() if key[1] >= 0}
+        self._join_index = None
+        self._join_graph = None
+        self._table_embeddings = None
+        if table_embeddings:
+            self._table_embeddings = np.array([table_embeddings.get(table, np.zeros(len(next(iter(table_embeddings.values()))))) for table in self._tables], dtype=np.float32)
+
+    def _sample_values(self, table, column, n_values, max_value_length):
+        result = self._database.run_sql_query(f'SELECT DISTINCT "{column}" FROM "{table}" LIMIT {int(n_values)}')
+        if isinstance(result, str):
+            # Error in executing the query
+            return []
+        return [row[0] for row in result if isinstance(row[0], str) and len(row[0]) <= max_value_length]
+
+    def _get_join_index(self):
+        # The schema graph is cached by the database until the schema changes
+        G = self._database.schema_graph()
+        if G is not self._join_graph:
+            self._join_index = join_path_index(G)
+            self._join_graph = G
+        return self._join_index
+
+    def save(self, path):
+        database, join_graph, join_index = self._database, self._join_graph, self._join_index
+        self._database, self._join_graph, self._join_index = None, None, None
+        try:
+            with open(path, 'wb') as f:
+                pickle.dump(self, f, protocol=5)
+        finally:
+            self._database, self._join_graph, self._join_index = database, join_graph, join_index
+
+    @classmethod
+    def load(cls, path, database):
+        with open(path, 'rb') as f:
+            linker = pickle.load(f)
+        linker._database = database
+        return linker
+
+    def score_tables(self, question, question_embedding=None, embedding_weight=5.0):
+        """
+        Score every table against the question. Returns an array of scores, aligned with the tables of the schema.
+        """
+        scores = np.zeros(len(self._tables))
+        for token in set(identifier_tokens(question)):
+            posting = self._table_postings.get(token)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+        if question_embedding is not None and self._table_embeddings is not None:
+            scores += embedding_weight * np.maximum(self._table_embeddings @ np.asarray(question_embedding, dtype=np.float32), 0)
+        return scores
+
+    def link(self, question, top_k=5, expand=True, max_hops=3, question_embedding=None):
+        """
+        Link a question to the schema. Returns a dictionary with the selected 'tables' (the top_k tables by score, plus,
+        if expand is True, the tables on the join paths connecting the top tables within max_hops joins of the best one),
+        the matched 'columns' of each top table, and the 'scores' of the top tables.
+        """
+        scores = self.score_tables(question, question_embedding=question_embedding)
+        top = [t for t in np.argsort(-scores, kind='stable')[:top_k] if scores[t] > 0]
+        tables = [self._tables[t] for t in top]
+        if expand and len(tables) > 1:
+            join_index = self._get_join_index()
+            connected = [table for table in tables if table in join_index and join_index.distance(tables[0], table) <= max_hops]
+            joins, _ = join_index.join_tree(connected)
+            for table, _, ref_table, _ in joins:
+                for name in (table, ref_table):
+                    if name not in tables:
+                        tables.append(name)
+        columns = {}
+        top_set = set(top)
+        for token in set(identifier_tokens(question)):
+            for (t, c), weight in self._column_postings.get(token, {}).items():
+                if t in top_set:
+                    columns.setdefault(self._tables[t], {})
+                    columns[self._tables[t]][self._columns[t][c]] = columns[self._tables[t]].get(self._columns[t][c], 0.0) + weight
+        return {
+            'tables': tables,
+            'columns': {table: sorted(cols, key=cols.get, reverse=True) for table, cols in columns.items()},
+            'scores': {self._tables[t]: float(scores[t]) for t in top},
+        }
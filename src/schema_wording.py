@@ -0,0 +1,166 @@
+"""
+Token-budgeted schema wording.
+Renders table descriptions (DDL with sample rows, as in SQLiteDatabase.schema_wording) and compresses them
+progressively until they fit a token budget: fewer sample rows, no sample rows, abbreviated types,
+wide tables collapsed to their key and top-ranked columns, summarized foreign keys, column lists only,
+and finally fewer tables. The report lists what was cut.
+"""
+import re
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.utils import count_tokens
+
+_TYPE_ABBREVIATIONS = [
+    (re.compile(r'^(big|small|tiny|medium)?int(eger)?(\(\d+\))?$', re.I), 'int'),
+    (re.compile(r'^(n?var)?char(acter)?\s*(varying)?(\(\d+\))?$|^(n|long|medium|tiny)?text$|^string$|^clob$', re.I), 'text'),
+    (re.compile(r'^(real|float\d*|double( precision)?|decimal(\(.*\))?|numeric(\(.*\))?|number(\(.*\))?)$', re.I), 'num'),
+    (re.compile(r'^(date|datetime|timestamp\w*|time)(\(\d+\))?$', re.I), 'date'),
+    (re.compile(r'^bool(ean)?$', re.I), 'bool'),
+]
+
+# Compression steps, in order, with the options they set
+COMPRESSION_STEPS = [
+    ('fewer sample rows', {'sample_size': 2}),
+    ('drop sample rows', {'sample_size': 0}),
+    ('abbreviate types', {'abbreviate_types': True}),
+    ('collapse wide tables', {'max_columns': 12}),
+    ('summarize foreign keys', {'summarize_fks': True}),
+    ('collapse wide tables further', {'max_columns': 6}),
+    ('column names only', {'names_only': True}),
+]
+
+
+def abbreviate_type(type_):
+    for pattern, abbreviation in _TYPE_ABBREVIATIONS:
+        if pattern.match(type_.strip()):
+            return abbreviation
+    return type_.lower()
+
+
+def _ranked_columns(table, referenced_columns, max_columns):
+    """
+    The columns kept when a table is collapsed: primary key, foreign key and referenced columns first,
+    then the other columns in table order, up to max_columns (key columns are always kept).
+    """
+    fk_columns = {fk_from for fk_from, _, _ in table['fks']}
+    keys = [column for column in table['columns'] if column[5] or column[1] in fk_columns or column[1] in referenced_columns]
+    others = [column for column in table['columns'] if column not in keys]
+    kept = keys + others[:max(0, max_columns - len(keys))]
+    return [column for column in table['columns'] if column in kept]
+
+
+def render_table(table, sample_size=5, abbreviate_types=False, max_columns=None, summarize_fks=False, names_only=False, referenced_columns=frozenset()):
+    """
+    Render one table. table is a dictionary with the table 'name', its 'columns' (PRAGMA table_info rows:
+    cid, name, type, notnull, default, pk), its 'fks' ((column, referenced_table, referenced_column) tuples)
+    and its 'sample_rows'.
+    """
+    columns = table['columns']
+    if max_columns is not None and len(columns) > max_columns:
+        columns = _ranked_columns(table, referenced_columns, max_columns)
+    n_omitted = len(table['columns']) - len(columns)
+
+    if names_only:
+        text = f"{table['name']}({', '.join(column[1] for column in columns)}{', ...' if n_omitted else ''})\n"
+        if table['fks']:
+            text += "  -- joins: " + ", ".join(f"{fk_from} -> {fk_table}.{fk_to}" for fk_from, fk_table, fk_to in table['fks']) + "\n"
+        return text
+
+    lines = []
+    for cid, name, type_, notnull, dflt_value, pk in columns:
+        line = f"  {name} {abbreviate_type(type_) if abbreviate_types else type_}"
+        if not abbreviate_types:
+            if notnull == 1:
+                line += " NOT NULL"
+            if dflt_value:
+                line += f" DEFAULT {dflt_value}"
+        if pk == 1:
+            line += " PK" if abbreviate_types else " PRIMARY KEY"
+        lines.append(line)
+    text = f"CREATE TABLE {table['name']} (\n" + ",\n".join(lines) + "\n"
+    if n_omitted:
+        text += f"  -- {n_omitted} more columns\n"
+    if summarize_fks and table['fks']:
+        text += "  -- joins: " + ", ".join(f"{fk_from} -> {fk_table}.{fk_to}" for fk_from, fk_table, fk_to in table['fks']) + "\n"
+    else:
+        for fk_from, fk_table, fk_to in table['fks']:
+            text += f"  FOREIGN KEY ({fk_from}) REFERENCES {fk_table}({fk_to})\n"
+    text += ");\n\n"
+
+    if sample_size:
+        rows = table['sample_rows'][:sample_size]
+        if not rows:
+            text += "-- Sample Data: No sample data available\n\n"
+        else:
+            positions = [column[0] for column in columns]
+            text += "-- Sample Data:\n"
+            for row in rows:
+                text += f"{tuple(row[i] for i in positions) if n_omitted else row}\n"
+    text += "\n"
+    return text
+
+
+def _referenced_columns(tables):
+    """
+    Columns of each table referenced by a foreign key of the given tables.
+    """
+    referenced = {}
+    for table in tables:
+        for _, fk_table, fk_to in table['fks']:
+            referenced.setdefault(fk_table, set()).add(fk_to)
+    return referenced
+
+def render_schema(tables, **options):
+    """
+    Render the given tables with the given options (see render_table).
+    """
+    referenced = _referenced_columns(tables)
+    return ''.join(render_table(table, referenced_columns=referenced.get(table['name'], frozenset()), **options) for table in tables)
+
+
+def budgeted_schema_wording(tables, token_budget, sample_size=5, model="gpt-4o"):
+    """
+    Render the tables within token_budget tokens, applying the compression steps in order until the text fits.
+    If the column lists alone do not fit, the tables with the fewest foreign keys are dropped last-first.
+    Returns the text and a report: the tokens of the full and final text, the steps applied and the dropped tables.
+    """
+    options = {'sample_size': sample_size}
+    text = render_schema(tables, **options)
+    report = {'token_budget': token_budget, 'full_tokens': count_tokens(text, model), 'steps': [], 'dropped_tables': []}
+    tokens = report['full_tokens']
+    for step, step_options in COMPRESSION_STEPS:
+        if tokens <= token_budget:
+            break
+        if 'sample_size' in step_options and step_options['sample_size'] >= options['sample_size']:
+            continue
+        options.update(step_options)
+        text = render_schema(tables, **options)
+        tokens = count_tokens(text, model)
+        report['steps'].append(step)
+    if tokens > token_budget:
+        # Keep the most connected tables
+        degree = {table['name']: len(table['fks']) for table in tables}
+        for table in tables:
+            for _, fk_table, _ in table['fks']:
+                degree[fk_table] = degree.get(fk_table, 0) + 1
+        kept = sorted(tables, key=lambda table: -degree[table['name']])
+        # Tokens of each table, counted once and subtracted as the tables are dropped
+        referenced = _referenced_columns(tables)
+        table_tokens = [count_tokens(render_table(table, referenced_columns=referenced.get(table['name'], frozenset()), **options), model) for table in kept]
+        tokens = sum(table_tokens)
+        while kept and tokens > token_budget:
+            report['dropped_tables'].append(kept.pop()['name'])
+            tokens -= table_tokens.pop()
+        kept_names = {table['name'] for table in kept}
+        text = render_schema([table for table in tables if table['name'] in kept_names], **options)
+        tokens = count_tokens(text, model)
+        # The text may take a few more tokens than its tables did separately
+        while kept and tokens > token_budget:
+            table = kept.pop()
+            report['dropped_tables'].append(table['name'])
+            kept_names.discard(table['name'])
+            text = render_schema([table for table in tables if table['name'] in kept_names], **options)
+            tokens = count_tokens(text, model)
+    report['tokens'] = tokens
+    return text, report
@@ -0,0 +1,251 @@
+"""
+SQL statement splitter.
+Splits SQL scripts into statements in a single incremental pass. The splitter is aware of
+string literals, quoted identifiers, comments and trigger bodies (BEGIN ... END), and classifies
+every statement (e.g., CREATE VIEW, INSERT) together with the name of the object it defines.
+"""
+import re
+from typing import NamedTuple, Optional
+
+# Tokens of interest outside of literals and comments
+_NORMAL = re.compile(r"""(?P<word>[A-Za-z_][A-Za-z0-9_$]*)|(?P<semi>;)|(?P<quote>['"`\[])|(?P<line_comment>--)|(?P<block_comment>/\*)|(?P<punct>[.(])""")
+# Same as above, without words (used once the statement is classified, outside of triggers)
+_NORMAL_NO_WORDS = re.compile(r"""(?P<semi>;)|(?P<quote>['"`\[])|(?P<line_comment>--)|(?P<block_comment>/\*)""")
+_CLOSING_QUOTE = {"'": "'", '"': '"', '`': '`', '[': ']'}
+
+# Number of leading tokens used to classify a statement
+_HEAD_SIZE = 16
+_CREATE_MODIFIERS = {'or', 'replace', 'temp', 'temporary', 'unique', 'virtual', 'materialized', 'secure', 'recursive', 'global', 'local', 'transient', 'volatile'}
+_EXISTENCE_CLAUSE = {'if', 'not', 'exists'}
+_INSERT_MODIFIERS = {'or', 'replace', 'rollback', 'abort', 'fail', 'ignore', 'into', 'overwrite'}
+
+
+class SQLStatement(NamedTuple):
+    text: str
+    statement_type: str
+    object_name: Optional[str]
+
+
+def _qualified_name(head, idx):
+    """
+    Read a (possibly schema-qualified) object name from the head tokens, starting at idx.
+    """
+    parts = []
+    while idx < len(head) and head[idx][0] in ('word', 'ident'):
+        parts.append(head[idx][1])
+        if idx + 1 < len(head) and head[idx + 1] == ('punct', '.'):
+            idx += 2
+        else:
+            break
+    return '.'.join(parts) if parts else None
+
+
+def classify_statement(head):
+    """
+    Classify a statement given its leading tokens. Returns the statement type and the object name.
+    Head tokens are (kind, value) pairs, where kind is 'word' (lower-cased keyword or identifier), 'ident' (quoted identifier) or 'punct'.
+    """
+    words = [value if kind == 'word' else None for kind, value in head]
+    if not words or words[0] is None:
+        return 'UNKNOWN', None
+    first = words[0]
+    idx = 1
+    if first in ('create', 'drop', 'alter'):
+        if first == 'create':
+            while idx < len(words) and words[idx] in _CREATE_MODIFIERS:
+                idx += 1
+        if idx >= len(words) or words[idx] is None:
+            return first.upper(), None
+        object_type = words[idx]
+        idx += 1
+        while idx < len(words) and words[idx] in _EXISTENCE_CLAUSE:
+            idx += 1
+        return f"{first.upper()} {object_type.upper()}", _qualified_name(head, idx)
+    if first in ('insert', 'replace'):
+        while idx < len(words) and words[idx] in _INSERT_MODIFIERS:
+            idx += 1
+        return 'INSERT', _qualified_name(head, idx)
+    if first == 'update':
+        while idx < len(words) and words[idx] in ('or', 'rollback', 'abort', 'replace', 'fail', 'ignore'):
+            idx += 1
+        return 'UPDATE', _qualified_name(head, idx)
+    if first == 'delete':
+        if idx < len(words) and words[idx] == 'from':
+            idx += 1
+        return 'DELETE', _qualified_name(head, idx)
+    return first.upper(), None
+
+
+class SQLStatementSplitter:
+    """
+    Incremental SQL statement splitter. Feed chunks of text with feed() and collect the completed statements.
+    Call close() at the end of the input to flush the last (possibly unterminated) statement.
+    """
+    def __init__(self, strip_terminator: bool = True):
+        self._strip_terminator = strip_terminator
+        self._pending_line = ''
+        self._reset_statement()
+        self._quote = None           # closing character of the open literal / quoted identifier
+        self._in_block_comment = False
+
+    def _reset_statement(self):
+        self._parts = []             # text of the current statement
+        self._head = []              # leading tokens of the current statement
+        self._has_code = False       # whether the statement contains anything but comments and whitespace
+        self._is_trigger = False
+        self._block_depth = 0        # BEGIN/CASE ... END nesting inside a trigger body
+        self._quoted_ident = None    # characters of a quoted identifier in the head
+
+    def _end_statement(self, statements):
+        if self._has_code:
+            text = ''.join(self._parts).strip()
+            statement_type, object_name = classify_statement(self._head)
+            statements.append(SQLStatement(text, statement_type, object_name))
+        self._reset_statement()
+
+    def _add_head(self, token):
+        if len(self._head) < _HEAD_SIZE:
+            self._head.append(token)
+            # Detect CREATE [TEMP] TRIGGER early, so that semicolons in the trigger body are not treated as terminators
+            if token == ('word', 'trigger') and self._head[0] == ('word', 'create') and len(self._head) <= 3:
+                self._is_trigger = True
+
+    def _scan_line(self, line, statements):
+        pos = 0
+        length = len(line)
+        while pos < length:
+            if self._in_block_comment:
+                end = line.find('*/', pos)
+                if end < 0:
+                    self._parts.append(line[pos:])
+                    return
+                self._parts.append(line[pos:end + 2])
+                self._in_block_comment = False
+                pos = end + 2
+                continue
+            if self._quote is not None:
+                # Find the closing quote, skipping doubled (escaped) quotes
+                end = line.find(self._quote, pos)
+                while end >= 0 and self._quote != ']' and line.startswith(self._quote, end + 1):
+                    end = line.find(self._quote, end + 2)
+                if end < 0:
+                    self._parts.append(line[pos:])
+                    if self._quoted_ident is not None:
+                        self._quoted_ident.append(line[pos:])
+                    return
+                self._parts.append(line[pos:end + 1])
+                if self._quoted_ident is not None:
+                    self._quoted_ident.append(line[pos:end])
+                    identifier = ''.join(self._quoted_ident)
+                    if self._quote != ']':
+                        identifier = identifier.replace(self._quote * 2, self._quote)
+                    self._add_head(('ident', identifier))
+                    self._quoted_ident = None
+                self._quote = None
+                pos = end + 1
+                continue
+
+            # Words are only needed while classifying the statement, or inside triggers
+            pattern = _NORMAL if (self._is_trigger or len(self._head) < _HEAD_SIZE) else _NORMAL_NO_WORDS
+            match = pattern.search(line, pos)
+            if match is None:
+                segment = line[pos:]
+                if not self._has_code and segment.strip():
+                    self._has_code = True
+                    self._add_head(('punct', segment.strip()[0]))
+                self._parts.append(segment)
+                return
+            start = match.start()
+            if start > pos:
+                segment = line[pos:start]
+                if not self._has_code and segment.strip():
+                    self._has_code = True
+                    self._add_head(('punct', segment.strip()[0]))
+                self._parts.append(segment)
+            kind = match.lastgroup
+            token = match.group()
+            pos = match.end()
+            if kind == 'line_comment':
+                end = line.find('\n', pos)
+                end = length if end < 0 else end
+                self._parts.append(line[start:end])
+                pos = end
+            elif kind == 'block_comment':
+                self._parts.append(token)
+                self._in_block_comment = True
+            elif kind == 'quote':
+                self._parts.append(token)
+                self._has_code = True
+                self._quote = _CLOSING_QUOTE[token]
+                if token != "'" and len(self._head) < _HEAD_SIZE:
+                    self._quoted_ident = []
+                elif token == "'":
+                    self._add_head(('literal', None))
+            elif kind == 'semi':
+                if self._is_trigger and self._block_depth > 0:
+                    self._parts.append(token)
+                else:
+                    if not self._strip_terminator:
+                        self._parts.append(token)
+                    self._end_statement(statements)
+            else:
+                self._parts.append(token)
+                self._has_code = True
+                if kind == 'word':
+                    word = token.lower()
+                    self._add_head(('word', word))
+                    if self._is_trigger:
+                        if word in ('begin', 'case'):
+                            self._block_depth += 1
+                        elif word == 'end' and self._block_depth > 0:
+                            self._block_depth -= 1
+                else:
+                    self._add_head(('punct', token))
+
+    def feed(self, chunk: str):
+        """
+        Feed a chunk of SQL text. Returns the list of statements completed by this chunk.
+        """
+        statements = []
+        lines = (self._pending_line + chunk).split('\n')
+        self._pending_line = lines.pop()
+        for line in lines:
+            self._scan_line(line + '\n', statements)
+        return statements
+
+    def close(self):
+        """
+        Signal the end of the input. Returns the last statement, if any, in a list.
+        """
+        statements = []
+        if self._pending_line:
+            self._scan_line(self._pending_line, statements)
+            self._pending_line = ''
+        self._end_statement(statements)
+        self._quote = None
+        self._in_block_comment = False
+        return statements
+
+
+def iter_sql_statements(source, strip_terminator: bool = True, chunk_size: int = 1 << 16):
+    """
+    Stream the statements of a SQL script as SQLStatement tuples (text, statement_type, object_name).
+    source: a string, an open text file, or any iterable of text chunks (e.g., file lines).
+    """
+    splitter = SQLStatementSplitter(strip_terminator=strip_terminator)
+    if isinstance(source, str):
+        chunks = (source[i:i + chunk_size] for i in range(0, len(source), chunk_size))
+    elif hasattr(source, 'read'):
+        chunks = iter(lambda: source.read(chunk_size), '')
+    else:
+        chunks = source
+    for chunk in chunks:
+        yield from splitter.feed(chunk)
+    yield from splitter.close()
+
+
+def split_sql_statements(source, strip_terminator: bool = True):
+    """
+    Split a SQL script into a list of statement strings.
+    """
+    return [statement.text for statement in iter_sql_statements(source, strip_terminator=strip_terminator)]
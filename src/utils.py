@@ -1,31 +1,18 @@
 import re
 import json
-from openai import OpenAI
+import functools
 from collections.abc import Iterable
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.llm_client import chat, embed
 
-def prompt_llm(user_message, system_message, tokens=2048, model='gpt-4o'):
-    api_key = [c['api_key'] for c in json.load(open('OAI_CONFIG_LIST')) if c['model'] == model][0]
-    client = OpenAI(api_key=api_key)
-
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
-                    {
-                        "role": "system",
-                        "content": system_message
-                    },
-                    {
-                        "role": "user",
-                        "content": user_message
-                    }
-                ],
-        temperature=0.0,
-        max_tokens=2048,
-        top_p=1
-    )
-    response = response.choices[0].message.content
-
-    return response
+def prompt_llm(user_message, system_message, tokens=2048, model='gpt-4o', stream=False):
+    return chat(user_message, system_message, model=model, max_tokens=tokens, stream=stream)
 
 def extract_json_from_llm_response(response, verbose=True):
     """
@@ -60,13 +47,26 @@ def extract_json_from_llm_response(response, verbose=True):
     return json_data
 
 def text_embedding(text, model="text-embedding-3-small"):
-    api_key = [c['api_key'] for c in json.load(open('OAI_CONFIG_LIST')) if c['model'] == model][0]
-    client = OpenAI(api_key=api_key)
-    return client.embeddings.create(input = [text], model=model).data[0].embedding
+    return embed([text], model=model)[0]
 
 def flatten(xs):
     for x in xs:
         if isinstance(x, Iterable) and not isinstance(x, (str, bytes)):
             yield from flatten(x)
         else:
-            yield x
\ No newline at end of file
+            yield x
+
+@functools.lru_cache(maxsize=None)
+def _token_encoding(model):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+def count_tokens(text, model="gpt-4o"):
+    """
+    Count the tokens of a text for the given model with tiktoken. Falls back to an estimate (4 characters per token) if tiktoken is not installed.
+    """
+    if tiktoken is None:
+        return (len(text) + 3) // 4
+    return len(_token_encoding(model).encode(text, disallowed_special=()))
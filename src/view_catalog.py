@@ -0,0 +1,162 @@
+"""
+View catalog storage.
+The metadata of the views (name, description, tables, columns, SQL, ...) is stored in SQLite, one pickled record per view,
+and their embeddings in a contiguous float32 '.npy' matrix, row i holding the embedding of view i. The matrix is opened
+memory-mapped, so loading is near-instant and does not copy the data. Views can be appended and deleted; compact()
+removes the deleted views from both files.
+"""
+import os
+import pickle
+import sqlite3
+import numpy as np
+import pandas as pd
+
+# Fixed size of the .npy header, so that it can be rewritten in place when rows are appended
+_NPY_HEADER_SIZE = 128
+
+
+def _write_npy_header(f, n_rows, dim):
+    header = repr({'descr': '<f4', 'fortran_order': False, 'shape': (n_rows, dim)})
+    header = header.ljust(_NPY_HEADER_SIZE - 10 - 1) + '\n'
+    f.seek(0)
+    f.write(b'\x93NUMPY\x01\x00' + len(header).to_bytes(2, 'little') + header.encode('latin1'))
+
+
+class ViewCatalog:
+    """
+    Catalog of views and their embeddings.
+    path: path prefix of the catalog files ('<path>.db' for the metadata, '<path>.npy' for the embeddings).
+    """
+    def __init__(self, path: str):
+        self._path = path
+        self._conn = sqlite3.connect(f"{path}.db")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS views (row INTEGER PRIMARY KEY, deleted INTEGER NOT NULL DEFAULT 0, record BLOB)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS catalog (key TEXT PRIMARY KEY, value)")
+        self._conn.commit()
+
+    @property
+    def embeddings_file(self):
+        return f"{self._path}.npy"
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM views WHERE deleted = 0").fetchone()[0]
+
+    def _n_rows(self):
+        return self._conn.execute("SELECT COUNT(*) FROM views").fetchone()[0]
+
+    def _dim(self):
+        row = self._conn.execute("SELECT value FROM catalog WHERE key = 'dim'").fetchone()
+        return row[0] if row else None
+
+    def append(self, records, embeddings):
+        """
+        Append views: a list of metadata dictionaries and the matrix of their embeddings (one row per view).
+        Returns the rows of the new views.
+        """
+        records = list(records)
+        if not records:
+            return []
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(len(records), -1)
+        dim = self._dim()
+        if dim is None:
+            dim = embeddings.shape[1]
+            self._conn.execute("INSERT INTO catalog (key, value) VALUES ('dim', ?)", (dim,))
+        elif embeddings.shape[1] != dim:
+            raise ValueError(f"Embeddings have dimension {embeddings.shape[1]}, expected {dim}.")
+        start = self._n_rows()
+        # Write the embeddings first: rows without metadata are ignored (and overwritten) on the next append
+        mode = 'r+b' if os.path.exists(self.embeddings_file) else 'w+b'
+        with open(self.embeddings_file, mode) as f:
+            f.seek(_NPY_HEADER_SIZE + start * dim * 4)
+            f.write(embeddings.tobytes())
+            f.truncate()
+            _write_npy_header(f, start + len(records), dim)
+        self._conn.executemany("INSERT INTO views (row, record) VALUES (?, ?)",
+                               ((start + i, pickle.dumps(record, protocol=5)) for i, record in enumerate(records)))
+        self._conn.commit()
+        return list(range(start, start + len(records)))
+
+    def delete(self, rows):
+        """
+        Mark views as deleted. Their data is removed on compact().
+        """
+        self._conn.executemany("UPDATE views SET deleted = 1 WHERE row = ?", ((int(row),) for row in rows))
+        self._conn.commit()
+
+    def compact(self):
+        """
+        Rewrite the catalog without the deleted views. The remaining views are renumbered in order.
+        """
+        kept = [row for row, in self._conn.execute("SELECT row FROM views WHERE deleted = 0 ORDER BY row")]
+        if len(kept) == self._n_rows():
+            return
+        dim = self._dim()
+        embeddings = self._open_embeddings()
+        tmp_file = f"{self._path}.tmp.npy"
+        with open(tmp_file, 'w+b') as f:
+            f.seek(_NPY_HEADER_SIZE)
+            # Copy the kept rows in chunks, to bound the memory
+            for start in range(0, len(kept), 65536):
+                f.write(np.ascontiguousarray(embeddings[kept[start:start + 65536]]).tobytes())
+            _write_npy_header(f, len(kept), dim)
+        del embeddings
+        os.replace(tmp_file, self.embeddings_file)
+        self._conn.execute("DELETE FROM views WHERE deleted = 1")
+        self._conn.execute("UPDATE views SET row = -1 - row")
+        self._conn.executemany("UPDATE views SET row = ? WHERE row = ?", ((i, -1 - row) for i, row in enumerate(kept)))
+        self._conn.commit()
+        self._conn.execute("VACUUM")
+
+    def _open_embeddings(self):
+        n_rows = self._n_rows()
+        if n_rows == 0:
+            return np.zeros((0, self._dim() or 0), dtype=np.float32)
+        embeddings = np.load(self.embeddings_file, mmap_mode='r')
+        return embeddings[:n_rows]
+
+    def embeddings(self):
+        """
+        The embedding matrix of the views, in row order. A read-only memory map of the file if no views are deleted
+        (a copy of the remaining rows otherwise; call compact() to avoid it).
+        """
+        embeddings = self._open_embeddings()
+        deleted = [row for row, in self._conn.execute("SELECT row FROM views WHERE deleted = 1 ORDER BY row")]
+        if deleted:
+            return np.delete(embeddings, deleted, axis=0)
+        return embeddings
+
+    def records(self):
+        """
+        The metadata dictionaries of the views, in row order.
+        """
+        return [pickle.loads(record) for record, in self._conn.execute("SELECT record FROM views WHERE deleted = 0 ORDER BY row")]
+
+    def to_dataframe(self):
+        """
+        The metadata of the views as a DataFrame (aligned with the rows of embeddings()).
+        """
+        return pd.DataFrame.from_records(self.records())
+
+    def close(self):
+        self._conn.close()
+
+
+def write_view_catalog(path, df, embeddings):
+    """
+    Write a DataFrame of views and their embeddings to a new catalog at path (replacing any existing one).
+    """
+    for suffix in ('.db', '.npy'):
+        if os.path.exists(f"{path}{suffix}"):
+            os.remove(f"{path}{suffix}")
+    catalog = ViewCatalog(path)
+    catalog.append(df.to_dict('records'), embeddings)
+    catalog.close()
+
+def load_view_catalog(path):
+    """
+    Load a catalog: the DataFrame of the views and their (memory-mapped) embedding matrix.
+    """
+    catalog = ViewCatalog(path)
+    df, embeddings = catalog.to_dataframe(), catalog.embeddings()
+    catalog.close()
+    return df, embeddings
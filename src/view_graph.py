@@ -0,0 +1,56 @@
+"""
+View-overlap graph.
+Views are connected when they share columns. The columns are mapped to integer ids, the views form a sparse view x column
+incidence matrix X, and the number of shared columns of every pair of views is read from the sparse product X @ X.T.
+"""
+import numpy as np
+import networkx as nx
+from scipy.sparse import csr_matrix, triu
+
+
+def view_column_incidence(column_sets, max_views_per_column=None):
+    """
+    Sparse incidence matrix (views x columns, float32) of the columns referenced by each view, and the list of columns.
+    Columns referenced by more than max_views_per_column views are left out (they connect almost every pair of views).
+    """
+    column_ids = {}
+    rows, cols = [], []
+    for view, columns in enumerate(column_sets):
+        for column in set(columns):
+            rows.append(view)
+            cols.append(column_ids.setdefault(column, len(column_ids)))
+    X = csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(len(column_sets), len(column_ids)))
+    columns = list(column_ids)
+    if max_views_per_column is not None:
+        keep = np.flatnonzero(np.diff(X.tocsc().indptr) <= max_views_per_column)
+        X = X[:, keep]
+        columns = [columns[i] for i in keep]
+    return X, columns
+
+def view_overlap_matrix(column_sets, min_overlap=1, max_views_per_column=None):
+    """
+    Sparse (CSR) matrix of the number of columns shared by each pair of distinct views, keeping the pairs that share
+    at least min_overlap columns.
+    """
+    X, _ = view_column_incidence(column_sets, max_views_per_column=max_views_per_column)
+    overlap = (X @ X.T).tocsr()
+    overlap.setdiag(0)
+    overlap.data[overlap.data < min_overlap] = 0
+    overlap.eliminate_zeros()
+    return overlap
+
+def view_overlap_graph(column_sets, view_names=None, nodes=None, min_overlap=1, max_views_per_column=None):
+    """
+    Graph of the views (e.g., for louvain_communities): one node per view (with its 'node_name', if view_names is given)
+    and an edge between views that share columns, with the number of shared columns as 'edge_weight'.
+    nodes: the node ids of the views (e.g., the index of the view dataframe); defaults to 0..n-1.
+    """
+    overlap = triu(view_overlap_matrix(column_sets, min_overlap=min_overlap, max_views_per_column=max_views_per_column), k=1).tocoo()
+    nodes = list(nodes) if nodes is not None else list(range(len(column_sets)))
+    G = nx.Graph()
+    if view_names is not None:
+        G.add_nodes_from((node, {'node_name': name}) for node, name in zip(nodes, view_names))
+    else:
+        G.add_nodes_from(nodes)
+    G.add_weighted_edges_from(((nodes[u], nodes[v], int(w)) for u, v, w in zip(overlap.row.tolist(), overlap.col.tolist(), overlap.data.tolist())), weight='edge_weight')
+    return G
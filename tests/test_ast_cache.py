@@ -0,0 +1,41 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.ast_cache import ASTCache, normalize_sql, schema_fingerprint
+from src.process_sql import Schema, get_sql
+
+SCHEMA = Schema({"orders": ["id", "customer_id", "amount"], "customers": ["id", "name"]})
+
+
+def test_round_trip_across_connections(tmp_path):
+    cache_file = str(tmp_path / "ast_cache.db")
+    fingerprint = schema_fingerprint(SCHEMA)
+    sql = "SELECT o.amount FROM orders AS o JOIN customers AS c ON o.customer_id = c.id WHERE o.amount > 10"
+    sql_parsed = get_sql(SCHEMA, sql)
+    cache = ASTCache(cache_file)
+    cache.put(ASTCache.key(sql, fingerprint), sql_parsed)
+    cache.put_many([(ASTCache.key("SELECT nope FROM orders", fingerprint), None, "Error col: nope")])
+    cache.close()
+    cache = ASTCache(cache_file)
+    assert len(cache) == 2
+    assert cache.get(ASTCache.key(sql, fingerprint)) == (sql_parsed, None)
+    assert cache.get(ASTCache.key("SELECT nope FROM orders", fingerprint)) == (None, "Error col: nope")
+    assert cache.get(ASTCache.key("SELECT id FROM orders", fingerprint)) is None
+    assert (cache.hits, cache.misses) == (2, 1)
+    cache.close()
+
+
+def test_key_ignores_whitespace_and_keyword_case():
+    fingerprint = schema_fingerprint(SCHEMA)
+    assert ASTCache.key("SELECT id FROM orders", fingerprint) == ASTCache.key("select  id\n  from orders", fingerprint)
+    assert ASTCache.key("SELECT id FROM orders", fingerprint) != ASTCache.key("SELECT name FROM customers", fingerprint)
+    # Statements that cannot be tokenized fall back to the whitespace-collapsed text
+    assert normalize_sql("SELECT 'a\n  FROM") == "SELECT 'a FROM"
+
+
+def test_schema_fingerprint():
+    same = Schema({"CUSTOMERS": ["name", "ID"], "orders": ["amount", "customer_id", "id"]})
+    other = Schema({"orders": ["id", "customer_id", "amount", "status"], "customers": ["id", "name"]})
+    assert schema_fingerprint(SCHEMA) == schema_fingerprint(same)
+    assert schema_fingerprint(SCHEMA) != schema_fingerprint(other)
+    assert ASTCache.key("SELECT id FROM orders", schema_fingerprint(SCHEMA)) != ASTCache.key("SELECT id FROM orders", schema_fingerprint(other))
@@ -0,0 +1,65 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.canonicalize import dedupe_views, sql_fingerprint, text_fingerprint
+from src.postprocess import simplify_join_condition
+from src.process_sql import Schema, get_sql
+
+SCHEMA = Schema({'orders': ['id', 'customer_id', 'parent_id', 'amount'], 'customers': ['id', 'name']})
+
+
+def _fingerprint(sql):
+    return sql_fingerprint(get_sql(SCHEMA, sql))
+
+def test_structural_equivalence():
+    # Same query up to aliases, case, the order of the selected columns, of the join operands and of the conditions
+    assert _fingerprint("SELECT T1.amount, T2.name FROM orders AS T1 JOIN customers AS T2 ON T1.customer_id = T2.id WHERE T1.amount > 10 AND T2.name = 'a'") \
+        == _fingerprint("select c.name, o.amount from customers as c join orders as o on c.id = o.customer_id where c.name = 'a' and o.amount > 10")
+    assert _fingerprint("SELECT amount FROM orders WHERE amount > 10") != _fingerprint("SELECT amount FROM orders WHERE amount >= 10")
+
+def test_self_join_is_not_collapsed():
+    scan = _fingerprint("SELECT T1.amount FROM orders AS T1")
+    self_join = _fingerprint("SELECT T1.amount FROM orders AS T1 JOIN orders AS T2 ON T1.parent_id = T2.id")
+    assert scan != self_join
+    assert self_join == _fingerprint("SELECT a.amount FROM orders AS a JOIN orders AS b ON b.id = a.parent_id")
+    # Same conditions, one more copy of a table
+    assert _fingerprint("SELECT T1.amount FROM orders AS T1 JOIN orders AS T2") != scan
+    assert _fingerprint("SELECT T1.amount FROM orders AS T1 JOIN orders AS T2 JOIN customers AS T3 ON T1.customer_id = T3.id") \
+        != _fingerprint("SELECT T1.amount FROM orders AS T1 JOIN customers AS T3 ON T1.customer_id = T3.id")
+
+def test_text_fingerprint():
+    assert text_fingerprint("SELECT  amount\nFROM orders") == text_fingerprint("select amount from ORDERS")
+
+def test_dedupe_views():
+    sqls = ["SELECT amount FROM orders", "select amount from orders", "SELECT o.amount FROM orders AS o", "SELECT name FROM customers"]
+    views = [{'sql': sql, 'sql_parsed': get_sql(SCHEMA, sql)} for sql in sqls] + [{'sql': "SELECT broken", 'sql_parsed': "error"}]
+    unique_views, report = dedupe_views(views)
+    assert [view['sql'] for view in unique_views] == [sqls[0], sqls[3], "SELECT broken"]
+    assert report == {'total': 5, 'exact_duplicates': 1, 'structural_duplicates': 1, 'unique': 3}
+
+def _view(sql):
+    # The views are parsed with their joins simplified, as in postprocess
+    return {'sql': sql, 'sql_parsed': get_sql(SCHEMA, simplify_join_condition(sql))}
+
+def test_outer_joins_are_not_collapsed():
+    inner = "SELECT T1.amount, T2.name FROM orders AS T1 JOIN customers AS T2 ON T1.customer_id = T2.id"
+    left = "SELECT T1.amount, T2.name FROM orders AS T1 LEFT JOIN customers AS T2 ON T1.customer_id = T2.id"
+    left_outer = "SELECT T1.amount, T2.name FROM orders AS T1 left outer join customers AS T2 ON T1.customer_id = T2.id"
+    # The parsed forms are identical, the fingerprints of the texts are not
+    assert sql_fingerprint(_view(inner)['sql_parsed']) == sql_fingerprint(_view(left)['sql_parsed'])
+    assert sql_fingerprint(_view(left)['sql_parsed'], left) is None
+    unique_views, report = dedupe_views([_view(inner), _view(left), _view(left_outer)])
+    assert [view['sql'] for view in unique_views] == [inner, left, left_outer]
+    assert report['structural_duplicates'] == 0
+
+def test_limit_and_offset_are_kept():
+    sqls = ["SELECT amount FROM orders ORDER BY amount LIMIT 5",
+            "SELECT amount FROM orders ORDER BY amount LIMIT 5 OFFSET 10",
+            "SELECT amount FROM orders ORDER BY amount LIMIT 10",
+            "SELECT o.amount FROM orders AS o ORDER BY o.amount LIMIT 5 OFFSET 10"]
+    unique_views, report = dedupe_views([_view(sql) for sql in sqls])
+    assert [view['sql'] for view in unique_views] == sqls[:3]
+    assert report['structural_duplicates'] == 1
+    # Limits of subqueries are kept too
+    assert sql_fingerprint(_view(sqls[0])['sql_parsed'], "SELECT * FROM (SELECT amount FROM orders LIMIT 1) LIMIT 5") \
+        != sql_fingerprint(_view(sqls[0])['sql_parsed'], "SELECT * FROM (SELECT amount FROM orders LIMIT 2) LIMIT 5")
@@ -0,0 +1,48 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.chat_store import ChatStore
+
+import pytest
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_append_and_random_access(tmp_path, compress):
+    store = ChatStore(str(tmp_path / "chats"), compress=compress, segment_size=200)
+    records = [{"sample_id": i, "chat": "x" * 50} for i in range(10)]
+    assert [store.append(record) for record in records] == list(range(10))
+    # Small segments: the records are spread over several files
+    segments = sorted(f for f in os.listdir(store.directory) if f.startswith("segment-"))
+    assert len(segments) > 1
+    assert all(f.endswith(".gz") == compress for f in segments)
+    assert store[7] == records[7]
+    assert list(store) == records
+    assert list(store.iter_records(start=8)) == records[8:]
+    store.close()
+
+
+def test_reopen_and_reader_sees_new_records(tmp_path):
+    directory = str(tmp_path / "chats")
+    writer = ChatStore(directory)
+    writer.append({"n": 0})
+    reader = ChatStore(directory)
+    assert len(reader) == 1
+    writer.append({"n": 1})
+    assert reader[1] == {"n": 1}
+    assert list(reader.tail(start=1, poll_interval=0.01, timeout=0.05)) == [{"n": 1}]
+    writer.close()
+    # Appending after reopening continues the numbering, switching segments when the compression changes
+    writer = ChatStore(directory, compress=True)
+    assert writer.append({"n": 2}) == 2
+    writer.close()
+    assert list(ChatStore(directory)) == [{"n": 0}, {"n": 1}, {"n": 2}]
+
+
+def test_partial_index_line_is_ignored(tmp_path):
+    directory = str(tmp_path / "chats")
+    store = ChatStore(directory)
+    store.append({"n": 0})
+    store.close()
+    with open(os.path.join(directory, ChatStore.INDEX_FILE), "a") as f:
+        f.write("segment-00000.jsonl\t12")
+    assert list(ChatStore(directory)) == [{"n": 0}]
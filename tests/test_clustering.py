@@ -0,0 +1,56 @@
+import os
+import numpy as np
+import pytest
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.clustering import IncrementalClusterer, cluster_sweep
+
+
+def _blobs(n_per_cluster=100, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = np.array([[0, 0], [10, 0], [0, 10]], dtype=np.float32)
+    labels = np.repeat(np.arange(len(centers)), n_per_cluster)
+    return centers[labels] + rng.normal(scale=0.5, size=(len(labels), 2)).astype(np.float32), labels, centers
+
+def test_incremental_assignment():
+    X, labels, centers = _blobs()
+    clusterer = IncrementalClusterer.from_labels(X, labels)
+    new_labels = clusterer.add(centers + 0.1)
+    assert new_labels.tolist() == [0, 1, 2]
+    assert clusterer.counts.tolist() == [101, 101, 101]
+    assert not clusterer.needs_recluster()
+
+def test_far_away_views_open_clusters_and_trigger_recluster():
+    X, labels, _ = _blobs()
+    clusterer = IncrementalClusterer.from_labels(X, labels)
+    # A handful of views far from every cluster: a small fraction of the catalog, but all of the new views
+    new_labels = clusterer.add(np.array([[100, 100], [100.1, 100], [-100, -100]], dtype=np.float32))
+    assert new_labels.tolist() == [3, 3, 4]
+    assert clusterer.drift()['novel_fraction'] == 2 / 3
+    assert clusterer.needs_recluster()
+
+def test_save_load(tmp_path):
+    X, labels, centers = _blobs()
+    clusterer = IncrementalClusterer.from_labels(X, labels)
+    clusterer.add(centers)
+    clusterer.save(str(tmp_path / "clusters.npz"))
+    loaded = IncrementalClusterer.load(str(tmp_path / "clusters.npz"))
+    assert np.allclose(loaded.centroids, clusterer.centroids)
+    assert loaded.drift() == clusterer.drift()
+
+@pytest.mark.filterwarnings("ignore:Number of distinct clusters")
+def test_cluster_sweep_with_zero_inertia():
+    # 4 distinct points: the inertia is zero from k = 4 on
+    X = np.repeat(np.array([[0, 0], [5, 0], [0, 5], [5, 5]], dtype=np.float32), 5, axis=0)
+    sweep = cluster_sweep(X, [2, 3, 4, 5], n_init=1, n_workers=1)
+    assert sweep['ks'] == [2, 3, 4, 5]
+    assert sweep['inertia'][2] == sweep['inertia'][3] == 0
+    assert sweep['decrease_rate'][1] == float('inf') and sweep['decrease_rate'][2] == 0.0
+    assert sweep['best_k'] in (3, 4)
+
+def test_cluster_sweep_cache(tmp_path):
+    X, _, _ = _blobs(n_per_cluster=30)
+    cache_file = str(tmp_path / "sweep.db")
+    sweep = cluster_sweep(X, [2, 3, 4], n_init=1, n_workers=1, cache_file=cache_file)
+    assert sweep['best_k'] == 3
+    assert cluster_sweep(X, [2, 3, 4], n_init=1, n_workers=1, cache_file=cache_file) == sweep
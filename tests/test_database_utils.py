@@ -0,0 +1,96 @@
+import os
+import sqlite3
+import pytest
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src import database_utils
+from src.database_utils import bulk_load_local_database, sample_local_database
+
+DUMMY_DB_SQL = os.path.join(os.path.dirname(__file__), "..", "workspace", "dummy_db", "dummy_db.sql")
+
+
+def _dump(rows):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.execute("CREATE INDEX t_name ON t (name)")
+    conn.executemany("INSERT INTO t VALUES (?, ?)", rows)
+    conn.commit()
+    dump = "\n".join(conn.iterdump())
+    conn.close()
+    return dump
+
+def test_bulk_load_iterdump_round_trip(tmp_path):
+    rows = [(i, f"name '{i}'; --") for i in range(250)]
+    database_dir = str(tmp_path / "dump.db")
+    dump = _dump(rows)
+    assert "BEGIN TRANSACTION;" in dump and "COMMIT;" in dump
+    stats = bulk_load_local_database(database_dir, ddl=dump, chunk_size=100, verbose=False)
+    assert stats["rows"] == len(rows)
+    conn = sqlite3.connect(database_dir)
+    assert conn.execute("SELECT id, name FROM t ORDER BY id").fetchall() == rows
+    assert conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall() == [("t_name",)]
+    conn.close()
+
+def test_bulk_load_dump_file(tmp_path):
+    ddl_file = tmp_path / "dump.sql"
+    ddl_file.write_text(_dump([(1, "a"), (2, "b")]))
+    database_dir = str(tmp_path / "dump.db")
+    bulk_load_local_database(database_dir, ddl_file=str(ddl_file), verbose=False)
+    conn = sqlite3.connect(database_dir)
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 2
+    conn.close()
+
+def test_bulk_load_dummy_db(tmp_path):
+    with open(DUMMY_DB_SQL) as f:
+        ddl = f.read()
+    expected = sqlite3.connect(":memory:")
+    expected.executescript(ddl)
+    database_dir = str(tmp_path / "dummy.db")
+    bulk_load_local_database(database_dir, ddl_file=DUMMY_DB_SQL, verbose=False)
+    conn = sqlite3.connect(database_dir)
+    tables = [name for name, in expected.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+    assert tables == [name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+    for table in tables:
+        assert sorted(conn.execute(f"SELECT * FROM {table}").fetchall()) == sorted(expected.execute(f"SELECT * FROM {table}").fetchall())
+    conn.close()
+
+def test_bulk_load_failure_deletes_partial_database(tmp_path):
+    database_dir = str(tmp_path / "broken.db")
+    with pytest.raises(sqlite3.OperationalError):
+        bulk_load_local_database(database_dir, ddl="CREATE TABLE t (a INT); INSERT INTO t VALUES (1); INSERT INTO missing VALUES (1);", verbose=False)
+    assert not os.path.exists(database_dir)
+
+
+def _without_rowid_database(path):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE country (code TEXT PRIMARY KEY, name TEXT) WITHOUT ROWID;
+        CREATE TABLE region (country_code TEXT, region_id INTEGER, name TEXT, PRIMARY KEY (country_code, region_id)) WITHOUT ROWID;
+        CREATE TABLE city (id INTEGER PRIMARY KEY, name TEXT, country_code TEXT REFERENCES country,
+                           region_country TEXT, region_id INTEGER, FOREIGN KEY (region_country, region_id) REFERENCES region (country_code, region_id));
+    """)
+    conn.executemany("INSERT INTO country VALUES (?, ?)", [(f"c{i:03d}", f"Country {i}") for i in range(200)])
+    conn.executemany("INSERT INTO region VALUES (?, ?, ?)", [(f"c{i:03d}", j, f"Region {i}.{j}") for i in range(200) for j in range(3)])
+    conn.executemany("INSERT INTO city VALUES (?, ?, ?, ?, ?)", [(i, f"City {i}", f"c{199 - i % 200:03d}", f"c{i % 200:03d}", i % 3) for i in range(2000)])
+    conn.commit()
+    conn.close()
+
+def test_sample_with_without_rowid_parent_tables(tmp_path):
+    source, sample = str(tmp_path / "source.db"), str(tmp_path / "sample.db")
+    _without_rowid_database(source)
+    stats = sample_local_database(source, sample, fraction=0.1, verbose=False)
+    assert 0 < stats["city"][0] < 2000
+    conn = sqlite3.connect(sample)
+    # All foreign keys resolve, the referenced rows are not duplicated
+    assert conn.execute("PRAGMA foreign_key_check").fetchall() == []
+    assert conn.execute("SELECT COUNT(*) FROM country").fetchone()[0] == conn.execute("SELECT COUNT(DISTINCT code) FROM country").fetchone()[0]
+    assert conn.execute("SELECT COUNT(*) FROM country").fetchone()[0] > stats["country"][1] * 0.1
+    conn.close()
+
+def test_sample_failure_deletes_partial_sample(tmp_path, monkeypatch):
+    source, sample = str(tmp_path / "source.db"), str(tmp_path / "sample.db")
+    _without_rowid_database(source)
+    monkeypatch.setattr(database_utils, "get_foreign_keys", lambda _: [("city", ["missing_column"], "country", None)])
+    with pytest.raises(sqlite3.OperationalError):
+        sample_local_database(source, sample, verbose=False)
+    assert not os.path.exists(sample)
@@ -0,0 +1,65 @@
+import os
+import threading
+import numpy as np
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src import embeddings
+from src.embeddings import EmbeddingCache, batch_embeddings, make_batches, text_hash
+
+import pytest
+
+
+@pytest.fixture
+def fake_embed(monkeypatch):
+    """
+    Deterministic embed function that records its requests.
+    """
+    requests = []
+    lock = threading.Lock()
+    def embed(texts, model):
+        with lock:
+            requests.append(list(texts))
+        return [[len(text), sum(map(ord, text)) % 97, 1.0] for text in texts]
+    monkeypatch.setattr(embeddings, "embed", embed)
+    monkeypatch.setattr(embeddings, "count_tokens", lambda text, model=None: len(text.split()))
+    return requests
+
+
+def test_cache_round_trip(tmp_path):
+    cache_file = str(tmp_path / "embeddings.db")
+    cache = EmbeddingCache(cache_file)
+    cache.put_many("m", [(text_hash("a"), [0.5, 1.5]), (text_hash("b"), np.array([2.0, 3.0]))])
+    cache.close()
+    cache = EmbeddingCache(cache_file)
+    found = cache.get_many("m", [text_hash("a"), text_hash("b"), text_hash("c")])
+    assert set(found) == {text_hash("a"), text_hash("b")}
+    assert found[text_hash("a")].dtype == np.float32
+    np.testing.assert_array_equal(found[text_hash("b")], [2.0, 3.0])
+    assert cache.get_many("other-model", [text_hash("a")]) == {}
+    assert (cache.hits, cache.misses) == (2, 2)
+    cache.close()
+
+
+def test_make_batches(fake_embed):
+    texts = ["one two three", "four", "five six", "seven eight nine ten", "eleven"]
+    assert make_batches(texts, "m", max_batch_size=2, max_batch_tokens=100) == [[0, 1], [2, 3], [4]]
+    assert make_batches(texts, "m", max_batch_size=10, max_batch_tokens=5) == [[0, 1], [2], [3, 4]]
+    # A text above the token limit gets a batch of its own
+    assert make_batches(texts, "m", max_batch_size=10, max_batch_tokens=2) == [[0], [1], [2], [3], [4]]
+
+
+def test_batch_embeddings_dedupes_and_caches(tmp_path, fake_embed):
+    cache_file = str(tmp_path / "embeddings.db")
+    texts = ["orders by customer", "revenue per month", "orders by customer", "top products"]
+    X = batch_embeddings(texts, model="m", cache_file=cache_file, max_batch_size=2)
+    assert X.shape == (4, 3) and X.dtype == np.float32
+    np.testing.assert_array_equal(X[0], X[2])
+    np.testing.assert_array_equal(X[1], [len(texts[1]), sum(map(ord, texts[1])) % 97, 1.0])
+    assert sorted(text for request in fake_embed for text in request) == sorted(set(texts))
+    assert all(len(request) <= 2 for request in fake_embed)
+    # Only the new text is sent the second time
+    fake_embed.clear()
+    Y = batch_embeddings(texts + ["daily sessions"], model="m", cache_file=cache_file)
+    assert fake_embed == [["daily sessions"]]
+    np.testing.assert_array_equal(Y[:4], X)
+    assert batch_embeddings([], model="m").shape == (0, 0)
@@ -0,0 +1,61 @@
+import os
+import sqlite3
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.equivalence import equivalence_classes, get_query, result_fingerprint, sample_connection
+
+
+def _make_database(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT, city TEXT)")
+    conn.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY, customer_id INTEGER REFERENCES customers(id), amount REAL)")
+    conn.executemany("INSERT INTO customers VALUES (?, ?, ?)", [(i, f"c{i}", f"city{i % 3}") for i in range(1, 51)])
+    conn.executemany("INSERT INTO orders VALUES (?, ?, ?)", [(i, 1 + i % 50, i * 1.5) for i in range(1, 201)])
+    conn.execute("CREATE VIEW big_orders AS SELECT * FROM orders WHERE amount > 100")
+    conn.commit()
+    conn.close()
+
+def test_get_query():
+    assert get_query("CREATE VIEW v AS SELECT a FROM t;") == "SELECT a FROM t"
+    assert get_query("SELECT a FROM t") == "SELECT a FROM t"
+
+def test_sample_connection_is_referentially_consistent(tmp_path):
+    db_file = str(tmp_path / "db.sqlite")
+    _make_database(db_file)
+    conn = sample_connection(db_file, fraction=0.2)
+    n_orders = conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+    assert 0 < n_orders < 200
+    assert conn.execute("SELECT COUNT(*) FROM orders WHERE customer_id NOT IN (SELECT id FROM customers)").fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM big_orders").fetchone()[0] >= 0
+    conn.close()
+
+def test_fingerprint_ignores_row_and_column_order():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (a INTEGER, b TEXT)")
+    conn.executemany("INSERT INTO t VALUES (?, ?)", [(1, 'x'), (2, 'y'), (3, 'z')])
+    fingerprint, status = result_fingerprint(conn, "SELECT a, b FROM t ORDER BY a")
+    assert status == 'ok'
+    assert result_fingerprint(conn, "SELECT b, a FROM t ORDER BY a DESC")[0] == fingerprint
+    assert result_fingerprint(conn, "SELECT b, a FROM t", ignore_column_order=False)[0] != result_fingerprint(conn, "SELECT a, b FROM t", ignore_column_order=False)[0]
+    assert result_fingerprint(conn, "SELECT a, b FROM t WHERE a = 0") == (None, 'empty')
+    assert result_fingerprint(conn, "SELECT missing FROM t") == (None, 'error')
+
+def test_fingerprint_keeps_values_paired_within_rows():
+    # Same columns as multisets, but the values are paired differently: the results are not equivalent
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (a TEXT, b TEXT, c TEXT, d TEXT)")
+    conn.executemany("INSERT INTO t VALUES (?, ?, ?, ?)", [('1', '2', '1', '2'), ('2', '1', '1', '2')])
+    assert result_fingerprint(conn, "SELECT a, b FROM t")[0] != result_fingerprint(conn, "SELECT c, d FROM t")[0]
+
+def test_equivalence_classes(tmp_path):
+    db_file = str(tmp_path / "db.sqlite")
+    _make_database(db_file)
+    views = [
+        "CREATE VIEW v1 AS SELECT id, amount FROM orders WHERE amount > 100",
+        "CREATE VIEW v2 AS SELECT amount, id FROM orders WHERE NOT amount <= 100",
+        "CREATE VIEW v3 AS SELECT id FROM customers",
+        "SELECT nothing FROM nowhere",
+    ]
+    classes, statuses = equivalence_classes(db_file, views, fraction=1.0)
+    assert classes == [[0, 1], [2], [3]]
+    assert statuses == ['ok', 'ok', 'ok', 'error']
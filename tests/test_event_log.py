@@ -0,0 +1,53 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.event_log import EventLogger, iter_events, iter_chats, chat_transcript
+
+
+def write_log(log_file):
+    logger = EventLogger(str(log_file), run_id="run")
+    logger.start_sample(0, tables=["orders"])
+    logger.start_chat(task="views")
+    logger.log_message("analyst", "executor", "Let me look at the orders.")
+    logger.log_message("analyst", "executor", {"content": None, "tool_calls": [{"id": "c1", "function": {"name": "run_sql", "arguments": "{\"sql\": \"SELECT 1\"}"}}]})
+    logger.log_message("executor", "analyst", {"content": "1", "tool_responses": [{"tool_call_id": "c1", "content": "1"}]})
+    logger.log("code_block", code="CREATE VIEW v AS SELECT 1;")
+    logger.log("summary", summary="One view.")
+    logger.end_chat()
+    logger.start_chat(task="views")
+    logger.log_message("analyst", "executor", "Interrupted.")
+    logger.close()
+    return logger
+
+
+def test_events_carry_ids(tmp_path):
+    write_log(tmp_path / "events.jsonl")
+    events = list(iter_events(str(tmp_path / "events.jsonl")))
+    assert [e["event"] for e in events] == ["sample_start", "chat_start", "message", "message", "tool_call", "tool_response",
+                                            "code_block", "summary", "chat_end", "chat_start", "message"]
+    assert all(e["run_id"] == "run" and e["sample_id"] == 0 for e in events)
+    assert [e["chat_id"] for e in events if e["event"] == "chat_start"] == [0, 1]
+
+
+def test_iter_chats_skips_truncated_line_and_flags_incomplete(tmp_path):
+    log_file = tmp_path / "events.jsonl"
+    write_log(log_file)
+    with open(log_file, "a") as f:
+        f.write('{"event": "message", "run_id": "ru')
+    first, second = iter_chats(str(log_file))
+    assert first["status"] == "ok"
+    assert [m["event"] for m in first["messages"]] == ["message", "message", "tool_call", "tool_response"]
+    assert first["code_blocks"][0]["code"] == "CREATE VIEW v AS SELECT 1;"
+    assert first["summary"] == "One view."
+    assert second["status"] == "incomplete"
+    assert [m["content"] for m in second["messages"]] == ["Interrupted."]
+
+
+def test_chat_transcript(tmp_path):
+    write_log(tmp_path / "events.jsonl")
+    chat = next(iter_chats(str(tmp_path / "events.jsonl")))
+    assert chat_transcript(chat) == (
+        "analyst (to executor):\n\nLet me look at the orders.\n\n"
+        "analyst (to executor):\n\nSuggested tool call (c1): run_sql\nArguments: {\"sql\": \"SELECT 1\"}\n\n"
+        "executor (to analyst):\n\nResponse from calling tool (c1):\n1"
+    )
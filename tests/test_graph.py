@@ -0,0 +1,62 @@
+import os
+import numpy as np
+import networkx as nx
+import pytest
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.graph import CoverageScheduler, graph_csr, sample_connected_subgraphs, schema_subgraphs
+
+
+def _schema_graph(n_tables=30, seed=0, version=1):
+    G = nx.DiGraph(schema_version=version)
+    rng = np.random.default_rng(seed)
+    for i in range(n_tables):
+        G.add_node(i, name=f"table_{i}")
+    for i in range(1, n_tables):
+        j = int(rng.integers(i))
+        G.add_edge(i, j)
+        G.add_edge(j, i)
+    return G
+
+def test_graph_csr_is_cached_by_schema_version():
+    G = _schema_graph()
+    nodes, indptr, indices = graph_csr(G)
+    assert graph_csr(G)[1] is indptr
+    assert sorted(nodes[j] for j in indices[indptr[3]:indptr[4]]) == sorted(G.to_undirected().neighbors(nodes[3]))
+    # A new schema version invalidates the cache
+    G.add_node(30, name="table_30")
+    assert graph_csr(G)[1] is indptr
+    G.graph['schema_version'] = 2
+    assert len(graph_csr(G)[0]) == 31
+
+def test_graph_csr_without_schema_version_is_not_cached():
+    G = nx.path_graph(4)
+    assert len(graph_csr(G)[0]) == 4
+    G.add_edge(3, 4)
+    assert len(graph_csr(G)[0]) == 5
+
+def test_samples_are_connected():
+    G = _schema_graph()
+    nodes = graph_csr(G)[0]
+    samples = sample_connected_subgraphs(G, 6, n_samples=50, seed=0)
+    assert samples.shape == (50, 6)
+    for sample in samples:
+        assert len(set(sample.tolist())) == 6
+        assert nx.is_connected(G.to_undirected().subgraph([nodes[i] for i in sample]))
+    assert (sample_connected_subgraphs(G, 6, n_samples=50, seed=0) == samples).all()
+
+def test_samples_span_components():
+    # Two components of 3 nodes: a sample of 5 exhausts its component and continues in the other one
+    G = nx.Graph([(0, 1), (1, 2), (3, 4), (4, 5)])
+    for sample in sample_connected_subgraphs(G, 5, n_samples=20, seed=0):
+        assert len(set(sample.tolist())) == 5
+    with pytest.raises(ValueError):
+        sample_connected_subgraphs(G, 7)
+
+def test_schema_subgraphs_and_coverage():
+    G = _schema_graph()
+    assert all(len(tables) == 5 for tables in schema_subgraphs(G, n_nodes=5, n_samples=3, seed=0))
+    scheduler = CoverageScheduler(G, n_nodes=5, seed=0)
+    for _ in range(12):
+        scheduler.next_sample()
+    assert scheduler.coverage()['table_coverage'] == 1.0
@@ -0,0 +1,59 @@
+import os
+import math
+import networkx as nx
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src import join_paths
+from src.join_paths import JoinPathIndex, join_path_index
+
+# customers <- orders -> products, orders <- payments, and an unconnected table
+TABLES = ["Customers", "Orders", "Products", "Payments", "Logs"]
+JOINS = [
+    ("Orders", "customer_id", "Customers", "id"),
+    ("Orders", "product_id", "Products", "id"),
+    ("Payments", "order_id", "Orders", "id"),
+]
+
+
+def test_distance_and_path():
+    index = JoinPathIndex(TABLES, JOINS)
+    assert index.distance("customers", "ORDERS") == 1
+    assert index.distance("Customers", "Payments") == 2
+    assert math.isinf(index.distance("Customers", "Logs"))
+    assert index.path("Customers", "Payments") == ["Customers", "Orders", "Payments"]
+    assert index.path("Customers", "Logs") is None
+    assert "logs" in index and "invoices" not in index
+
+
+def test_join_tree():
+    index = JoinPathIndex(TABLES, JOINS)
+    joins, groups = index.join_tree(["Customers", "Products", "Payments"])
+    assert sorted(joins) == sorted(JOINS)
+    assert len(groups) == 1
+    joins, groups = index.join_tree(["Customers", "Logs"])
+    assert joins == []
+    assert sorted(map(sorted, groups)) == [["Customers"], ["Logs"]]
+    assert index.join_hint(["Customers", "Products"]).splitlines() == ["Orders.customer_id = Customers.id", "Orders.product_id = Products.id"]
+
+
+def test_save_load(tmp_path):
+    index = JoinPathIndex(TABLES, JOINS)
+    index.save(str(tmp_path / "index.npz"))
+    loaded = JoinPathIndex.load(str(tmp_path / "index.npz"))
+    assert loaded.fingerprint == index.fingerprint
+    assert loaded.path("Customers", "Payments") == index.path("Customers", "Payments")
+    assert sorted(loaded.join_tree(["Customers", "Payments"])[0]) == sorted(index.join_tree(["Customers", "Payments"])[0])
+
+
+def test_join_path_index_from_schema_graph(tmp_path, monkeypatch):
+    monkeypatch.setattr(join_paths, "_index_cache", {})
+    G = nx.DiGraph()
+    for i, table in enumerate(TABLES):
+        G.add_node(i, name=table)
+    for join in JOINS:
+        G.add_edge(TABLES.index(join[0]), TABLES.index(join[2]), joins=[join])
+    index = join_path_index(G, cache_dir=str(tmp_path))
+    assert os.listdir(tmp_path) == [f"join_paths_{index.fingerprint[:16]}.npz"]
+    assert join_path_index(G) is index
+    monkeypatch.setattr(join_paths, "_index_cache", {})
+    assert join_path_index(G, cache_dir=str(tmp_path)).distance("Customers", "Payments") == 2
@@ -0,0 +1,81 @@
+import os
+import numpy as np
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.lexical_index import BM25Index, hybrid_search, view_tokens
+from src.retrieval import RetrievalIndex
+from src.schema_linking import identifier_tokens
+
+import pytest
+
+VIEWS = [
+    {"view_name": "monthly_revenue", "view_description": "Total revenue per month.", "tables": ["orders"],
+     "sql": "CREATE VIEW monthly_revenue AS SELECT month, SUM(amount) FROM orders GROUP BY month"},
+    {"view_name": "customer_orders", "view_description": "Orders placed by each customer.", "tables": ["orders", "customers"],
+     "sql": "CREATE VIEW customer_orders AS SELECT c.name, o.id FROM orders o JOIN customers c ON o.customer_id = c.id"},
+    {"view_name": "top_products", "view_description": "Best selling products.", "tables": ["products"],
+     "sql_parsed": {"from": {"table_units": [["table_unit", "__products__"]]}, "select": [[0, "__products.name__"], [0, "__all__"]]}},
+    {"view_name": "active_sessions", "view_description": float("nan"), "tables": ["sessions"]},
+]
+
+
+def test_view_tokens():
+    tokens = view_tokens(VIEWS[0])
+    # SQL keywords are left out, the fields are weighted
+    assert "select" not in tokens and "group" not in tokens
+    assert tokens.count("monthly") > tokens.count("total")
+    assert "name" in view_tokens(VIEWS[2]) and "all" not in view_tokens(VIEWS[2])
+    assert "active" in view_tokens(VIEWS[3])
+
+
+def test_bm25_ranking():
+    index = BM25Index.from_views(VIEWS)
+    assert len(index) == 4
+    indices, scores = index.search("revenue by month")
+    assert indices.tolist() == [0]
+    indices, scores = index.search("orders of customers", k=5)
+    assert indices.tolist() == [1, 0]
+    assert scores[0] > scores[1] > 0
+    assert index.search("weather")[0].tolist() == []
+    assert not index.scores("weather").any()
+
+
+def test_bm25_prefers_rare_terms_and_short_documents():
+    documents = [identifier_tokens(text) for text in ["orders refunds", "orders", "orders orders status total amount date"]]
+    index = BM25Index(documents, k1=1.2, b=0.75)
+    indices, scores = index.search("refunds of orders", k=3)
+    assert indices.tolist() == [0, 1, 2]
+    # The term frequency saturates and is normalized by the document length
+    indices, scores = index.search("orders", k=3)
+    assert indices.tolist() == [1, 0, 2]
+    np.testing.assert_allclose(scores / scores[0], [1, 2.2 / 1.9 / 1.375, 4.4 / 4.1 / 1.375], rtol=1e-5)
+
+
+def test_hybrid_search():
+    index = BM25Index.from_views(VIEWS)
+    embeddings = np.eye(4, dtype=np.float32)
+    dense = RetrievalIndex(embeddings)
+    # Without embeddings: BM25 order
+    assert hybrid_search(index, "orders of customers")[0].tolist() == [1, 0]
+    # The embedding favors the second lexical candidate
+    indices, scores = hybrid_search(index, "orders of customers", query_embedding=embeddings[0], dense_index=dense, alpha=0.3)
+    assert indices.tolist()[:2] == [0, 1] and len(indices) == 4
+    assert scores[0] > scores[1] > scores[2]
+    # No lexical match: dense search only
+    indices, _ = hybrid_search(index, "weather", k=1, query_embedding=embeddings[3], dense_index=dense)
+    assert indices.tolist() == [3]
+
+
+@pytest.mark.parametrize("k", [1, 3, 4, 10])
+def test_hybrid_search_returns_k_results(k):
+    index = BM25Index.from_views(VIEWS)
+    embeddings = np.random.default_rng(0).normal(size=(4, 8)).astype(np.float32)
+    dense = RetrievalIndex(embeddings)
+    # A single lexical match
+    assert index.search("revenue")[0].tolist() == [0]
+    indices, scores = hybrid_search(index, "revenue", k=k, query_embedding=embeddings[2], dense_index=dense)
+    assert len(indices) == len(scores) == min(k, len(VIEWS))
+    assert len(set(indices.tolist())) == len(indices)
+    # The lexical match comes first, then the nearest view by embedding
+    assert indices[0] == 0
+    assert k == 1 or indices[1] == 2
@@ -0,0 +1,78 @@
+import os
+import json
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src import llm_client
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """
+    OpenAI-compatible stub: answers 429 to the first server.n_failures requests, then a chat completion.
+    """
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.n_requests += 1
+        if self.server.n_requests <= self.server.n_failures:
+            status, body = 429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}}
+        else:
+            status, body = 200, {"id": "1", "object": "chat.completion", "created": 0, "model": "stub-model",
+                                 "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "hello"}}]}
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+    server.n_requests = 0
+    server.n_failures = 1
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    config = [{"model": "stub-model", "api_key": "sk-test", "base_url": f"http://127.0.0.1:{server.server_address[1]}/v1"}]
+    monkeypatch.setenv("OAI_CONFIG_LIST", json.dumps(config))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def test_chat_retries_after_rate_limit(stub_server, monkeypatch):
+    delays = []
+    monkeypatch.setattr(llm_client.time, "sleep", delays.append)
+    assert llm_client.get_client("stub-model") is llm_client.get_client("stub-model")
+    assert llm_client.chat("hi", "You are a test.", model="stub-model") == "hello"
+    assert stub_server.n_requests == 2
+    assert len(delays) == 1 and 0 <= delays[0] <= 1.0
+
+def test_chat_raises_after_max_retries(stub_server, monkeypatch):
+    monkeypatch.setattr(llm_client.time, "sleep", lambda delay: None)
+    stub_server.n_failures = 10
+    client = llm_client.get_client("stub-model")
+    with pytest.raises(llm_client.openai.RateLimitError):
+        llm_client.with_retries(lambda: client.chat.completions.create(model="stub-model", messages=[{"role": "user", "content": "hi"}]), max_retries=2)
+    assert stub_server.n_requests == 3
+
+def test_async_clients_are_cached_per_loop(stub_server):
+    async def get_clients():
+        return llm_client.get_client("stub-model", async_client=True), llm_client.get_client("stub-model", async_client=True)
+    first, second = asyncio.run(get_clients())
+    assert first is second
+    assert asyncio.run(get_clients())[0] is not first
+
+def test_config_list(tmp_path, monkeypatch):
+    config_file = tmp_path / "OAI_CONFIG_LIST"
+    config_file.write_text(json.dumps([{"model": "a", "api_key": "1"}, {"model": "b", "api_key": "2"}]))
+    assert llm_client.config_list("b", config_file=str(config_file)) == [{"model": "b", "api_key": "2"}]
+    with pytest.raises(FileNotFoundError):
+        llm_client.config_list(config_file=str(tmp_path / "missing"))
+    monkeypatch.setenv("MISSING_CONFIG_LIST", str(tmp_path / "missing"))
+    with pytest.raises(FileNotFoundError):
+        llm_client.config_list(config_file="MISSING_CONFIG_LIST")
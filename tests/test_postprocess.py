@@ -0,0 +1,58 @@
+import os
+import json
+from concurrent.futures import ProcessPoolExecutor
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.ast_cache import ASTCache
+from src.event_log import EventLogger
+from src.postprocess import _init_parse_worker, parse_chats, parse_many, parse_sql, write_chats
+from src.process_sql import Schema
+
+
+def _event_log(path, n_chats=3):
+    logger = EventLogger(path)
+    for i in range(n_chats):
+        logger.start_chat()
+        logger.log_message("Critic", "chat_manager", f"Task {i}")
+        logger.log_message("Analyst", "chat_manager", f"CREATE VIEW v{i} AS SELECT {i};")
+        logger.end_chat()
+    logger.close()
+
+def test_chats_are_written_as_they_are_parsed(tmp_path):
+    log_file = str(tmp_path / "log.jsonl")
+    chats_file = str(tmp_path / "chats.jsonl")
+    _event_log(log_file)
+    with open(chats_file, "w", buffering=1) as f:
+        chats = write_chats(parse_chats(log_file), f)
+        first = next(chats)
+        assert "Task 0" in first
+        with open(chats_file) as written:
+            assert [json.loads(line)["chat_id"] for line in written] == [0]
+        assert len(list(chats)) == 2
+    with open(chats_file) as written:
+        records = [json.loads(line) for line in written]
+    assert [record["chat_id"] for record in records] == [0, 1, 2]
+    assert "CREATE VIEW v2 AS SELECT 2;" in records[2]["chat"]
+
+
+def _schema():
+    return Schema({'orders': ['id', 'customer_id', 'amount'], 'customers': ['id', 'name']})
+
+def test_parse_many_uses_the_ast_cache(tmp_path):
+    sqls = ["SELECT id FROM orders", "SELECT name FROM customers WHERE id > 1", "SELECT missing FROM nowhere"]
+    ast_cache = ASTCache(str(tmp_path / "ast_cache.db"))
+    results = parse_many(None, sqls, schema=_schema(), ast_cache=ast_cache)
+    assert isinstance(results[0][0], dict) and results[0][1] is None
+    assert results[2][0] is None and results[2][1]
+    assert (ast_cache.hits, ast_cache.misses, len(ast_cache)) == (0, 3, 3)
+    # Cached statements (up to whitespace and keyword case) are not parsed again
+    assert parse_many(None, ["select  id from ORDERS"] + sqls[1:], schema=_schema(), ast_cache=ast_cache) == results
+    assert ast_cache.hits == 3
+    assert parse_sql(None, sqls[2], schema=_schema(), ast_cache=ast_cache) == results[2][1]
+    ast_cache.close()
+
+def test_parse_many_in_worker_processes():
+    sqls = [f"SELECT amount FROM orders WHERE id = {i}" for i in range(10)] + ["SELECT missing FROM nowhere"]
+    schema = _schema()
+    with ProcessPoolExecutor(max_workers=2, initializer=_init_parse_worker, initargs=(schema.schema,)) as executor:
+        assert parse_many(None, sqls, schema=schema, executor=executor, chunk_size=3) == parse_many(None, sqls, schema=schema)
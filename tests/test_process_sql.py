@@ -0,0 +1,88 @@
+import os
+import pytest
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.benchmark import synthetic_view
+from src.process_sql import tokenize, tokenize_nltk, remove_alias_tokens
+
+# Statements on which tokenize and the NLTK-based tokenize_nltk (kept as a reference) agree
+CORPUS = [synthetic_view(seed=seed) for seed in range(5)] + [
+    "SELECT T1.name, COUNT(*) FROM singer AS T1 JOIN concert AS T2 ON T1.singer_id = T2.singer_id GROUP BY T1.name HAVING COUNT(*) > 1 ORDER BY T1.name DESC LIMIT 3",
+    "SELECT name FROM employee WHERE salary >= 5000.5 AND dept_id IN (SELECT id FROM dept WHERE city = 'New York')",
+    "CREATE VIEW v AS SELECT a, b FROM t WHERE c != 'x' OR d <= 10",
+    "SELECT DISTINCT country FROM stadium WHERE capacity BETWEEN 5000 AND 10000 UNION SELECT country FROM singer",
+    "SELECT avg(age), min(age), max(age) FROM singer WHERE country = \"France\"",
+    "SELECT T2.title FROM movie AS T2 WHERE T2.year > 2000 EXCEPT SELECT title FROM movie WHERE rating < 5",
+    "SELECT name FROM people WHERE name LIKE '%Smith%' AND NOT age = 30",
+    "SELECT count(DISTINCT T1.id) FROM a AS T1 JOIN b AS T2 ON T1.x = T2.y WHERE T2.z = 'it is done'",
+    "SELECT a FROM t WHERE b = 'x.y'",
+    "SELECT sum(amount) / count(*) FROM orders",
+    "a > -1",
+    "SELECT -1",
+]
+
+# Known divergences of tokenize from tokenize_nltk, all intended: (statement, tokenize, tokenize_nltk)
+DIVERGENCES = [
+    # '<>' is one token, normalized to '!=' (the parser rejects '<' followed by '>')
+    ("a<>b", ['a', '!=', 'b'], ['a', '<', '>', 'b']),
+    # Arithmetic is split; a '-' or '+' is only merged into a number when it is a sign ('> -1', 'SELECT -1')
+    ("SELECT a-1 FROM t", ['select', 'a', '-', '1', 'from', 't'], ['select', 'a-1', 'from', 't']),
+    # 'T1.*' is one token
+    ("SELECT T1.* FROM t AS T1", ['select', 't1.*', 'from', 't', 'as', 't1'], ['select', 't1.', '*', 'from', 't', 'as', 't1']),
+    # String values next to an operator are separate tokens (tokenize_nltk glues them to the operand)
+    ("SELECT a FROM t WHERE b='A'", ['select', 'a', 'from', 't', 'where', 'b', '=', '"A"'], ['select', 'a', 'from', 't', 'where', 'b=__val_24_26__']),
+    # Comments are skipped, and `...` and [...] identifiers are unquoted
+    ("SELECT `Order Id` FROM [Sales] -- comment", ['select', 'order id', 'from', 'sales'],
+     ['select', '`', 'order', 'id', '`', 'from', '[', 'sales', ']', '--', 'comment']),
+    ("SELECT a /* c */ FROM t", ['select', 'a', 'from', 't'], ['select', 'a', '/', '*', 'c', '*', '/', 'from', 't']),
+]
+
+
+def _nltk_available():
+    try:
+        tokenize_nltk("SELECT 1")
+    except (ImportError, LookupError):
+        return False
+    return True
+
+requires_nltk = pytest.mark.skipif(not _nltk_available(), reason="NLTK or its punkt data is not available")
+
+
+@requires_nltk
+@pytest.mark.parametrize("sql", CORPUS)
+def test_tokenize_matches_tokenize_nltk(sql):
+    assert tokenize(sql) == tokenize_nltk(sql)
+
+@pytest.mark.parametrize("sql, expected, expected_nltk", DIVERGENCES)
+def test_tokenize_divergences(sql, expected, expected_nltk):
+    assert tokenize(sql) == expected
+    if _nltk_available():
+        assert tokenize_nltk(sql) == expected_nltk
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT * FROM t WHERE a>=0.5", ['select', '*', 'from', 't', 'where', 'a', '>=', '0.5']),
+    ("x='A'", ['x', '=', '"A"']),
+    ("a IN (1,2,3)", ['a', 'in', '(', '1', ',', '2', ',', '3', ')']),
+    ("SELECT a-1 FROM t", ['select', 'a', '-', '1', 'from', 't']),
+    ("a<>b", ['a', '!=', 'b']),
+    ("a <> 'x'", ['a', '!=', '"x"']),
+    ("SELECT T1.* FROM t AS T1", ['select', 't1.*', 'from', 't', 'as', 't1']),
+    ("a > -1", ['a', '>', '-1']),
+    ("SELECT -1", ['select', '-1']),
+    ("a!=b AND c<=2", ['a', '!=', 'b', 'and', 'c', '<=', '2']),
+    ("SELECT `Order Id` FROM [Sales] -- comment", ['select', 'order id', 'from', 'sales']),
+    ("SELECT a /* comment */ FROM t", ['select', 'a', 'from', 't']),
+])
+def test_tokenize(sql, expected):
+    assert tokenize(sql) == expected
+
+def test_tokenize_unbalanced_quote():
+    # As in tokenize_nltk, ' and " both delimit string values, so a value cannot contain a quote
+    with pytest.raises(AssertionError):
+        tokenize("SELECT 'a FROM t")
+    with pytest.raises(AssertionError):
+        tokenize("name = \"O'Brien\"")
+
+def test_remove_alias_tokens():
+    assert remove_alias_tokens(tokenize("SELECT T1.a AS x FROM t AS T1")) == ['select', 't1.a', 'from', 't']
@@ -0,0 +1,38 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.chat_store import ChatStore
+from src.refinement import count_views_per_table, run_analytics_chat
+
+
+class _ChatResult:
+    def __init__(self, chat_history, summary):
+        self.chat_history = chat_history
+        self.summary = summary
+
+class _Analyst:
+    """
+    Stand-in for the analyst agent: each chat defines one view, and the code store must already hold the views of the previous chats.
+    """
+    def __init__(self, code_store):
+        self.code_store = code_store
+        self.n_chats = 0
+
+    def initiate_chat(self, recipient, message, **kwargs):
+        assert len(self.code_store) == self.n_chats
+        view = f"CREATE VIEW v{self.n_chats} AS SELECT * FROM orders;"
+        self.n_chats += 1
+        return _ChatResult([{"content": message}, {"content": f"```sql\n{view}\n```"}], f"summary {self.n_chats}")
+
+def test_code_history_is_appended_as_it_is_produced(tmp_path):
+    chat_store = ChatStore(str(tmp_path / "chat_history"))
+    code_store = ChatStore(str(tmp_path / "code_history"))
+    chat_history, code_history = run_analytics_chat(_Analyst(code_store), None, "SCHEMA", n_chats=3, chat_store=chat_store, code_store=code_store, sample_id=7)
+    assert chat_history == []
+    assert [record["code"] for record in code_store] == [f"CREATE VIEW v{i} AS SELECT * FROM orders;" for i in range(3)]
+    assert [(record["sample_id"], record["chat_iter"]) for record in code_store] == [(7, 0), (7, 1), (7, 2)]
+    assert len(chat_store) == 3
+    # The views of the call are still returned, e.g., for the coverage scheduler
+    assert count_views_per_table(code_history, ["orders", "customers"]) == {"orders": 3, "customers": 0}
+    chat_store.close()
+    code_store.close()
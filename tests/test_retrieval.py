@@ -0,0 +1,56 @@
+import os
+import numpy as np
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.retrieval import RetrievalIndex, normalize_rows, top_k
+
+
+def _clustered(n=4000, dim=32, n_clusters=40, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dim))
+    return centers[rng.integers(n_clusters, size=n)] + 0.3 * rng.normal(size=(n, dim))
+
+
+def test_top_k():
+    scores = np.array([[0.1, 0.9, 0.5, 0.7], [3.0, 1.0, 2.0, 0.0]])
+    indices, values = top_k(scores, 2)
+    np.testing.assert_array_equal(indices, [[1, 3], [0, 2]])
+    np.testing.assert_array_equal(values, [[0.9, 0.7], [3.0, 2.0]])
+    assert top_k(scores, 10)[0].shape == (2, 4)
+    assert top_k(scores, 0)[0].shape == (2, 0)
+
+
+def test_exact_search_matches_brute_force():
+    X = _clustered()
+    queries = np.random.default_rng(1).normal(size=(50, X.shape[1]))
+    index = RetrievalIndex(X)
+    indices, scores = index.search(queries, k=10, batch_size=16)
+    similarities = normalize_rows(queries) @ normalize_rows(X).T
+    expected = np.argsort(-similarities, axis=1)[:, :10]
+    np.testing.assert_array_equal(indices, expected)
+    np.testing.assert_allclose(scores, np.take_along_axis(similarities, expected, axis=1), rtol=1e-5)
+    # A single query returns one row
+    single_indices, single_scores = index.search(queries[0], k=10)
+    np.testing.assert_array_equal(single_indices, expected[0])
+    np.testing.assert_allclose(index.similarities(queries[0], single_indices), single_scores, rtol=1e-5)
+
+
+def test_ivf_recall():
+    X = _clustered()
+    queries = X[np.random.default_rng(2).choice(len(X), size=100, replace=False)] + 0.05
+    index = RetrievalIndex(X).build_ivf(seed=0)
+    exact, _ = index.search(queries, k=10)
+    approximate, _ = index.search(queries, k=10, n_probe=8)
+    recall = np.mean([len(set(a) & set(e)) / 10 for a, e in zip(approximate, exact)])
+    assert recall >= 0.9
+    # Probing every list is exact
+    full, _ = index.search(queries, k=10, n_probe=len(index._centroids))
+    np.testing.assert_array_equal(full, exact)
+
+
+def test_ivf_with_few_candidates():
+    X = np.eye(3, dtype=np.float32)
+    index = RetrievalIndex(X).build_ivf(n_lists=3, seed=0)
+    indices, scores = index.search(X[0], k=3, n_probe=1)
+    assert indices[0] == 0 and scores[0] == 1.0
+    assert (indices[1:] == -1).all() and np.isneginf(scores[1:]).all()
@@ -0,0 +1,45 @@
+import os
+import sqlite3
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.database import SQLiteDatabase
+from src.schema_linking import SchemaLinker, identifier_tokens
+
+
+def _make_database(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE Customers (CustomerId INTEGER PRIMARY KEY, CustomerName TEXT, City TEXT)")
+    conn.execute("CREATE TABLE SalesOrders (OrderId INTEGER PRIMARY KEY, CustomerId INTEGER REFERENCES Customers(CustomerId), Amount REAL)")
+    conn.execute("CREATE TABLE OrderItems (ItemId INTEGER PRIMARY KEY, OrderId INTEGER REFERENCES SalesOrders(OrderId), Product TEXT)")
+    conn.execute("CREATE TABLE Suppliers (SupplierId INTEGER PRIMARY KEY, SupplierName TEXT)")
+    conn.executemany("INSERT INTO Customers VALUES (?, ?, ?)", [(1, 'Ann', 'Boston'), (2, 'Bob', 'Denver')])
+    conn.executemany("INSERT INTO SalesOrders VALUES (?, ?, ?)", [(1, 1, 10.0), (2, 2, 20.0)])
+    conn.executemany("INSERT INTO OrderItems VALUES (?, ?, ?)", [(1, 1, 'Lamp'), (2, 2, 'Desk')])
+    conn.commit()
+    conn.close()
+
+def test_identifier_tokens():
+    assert identifier_tokens("OrderItems customer_names") == ['order', 'item', 'customer', 'name']
+
+def test_link_returns_original_case_table_names(tmp_path):
+    db_file = str(tmp_path / "db.sqlite")
+    _make_database(db_file)
+    db = SQLiteDatabase("db", db_file)
+    linked = SchemaLinker(db).link("Which products were ordered by customers from Boston?", top_k=2)
+    assert set(linked['tables']) >= {'Customers', 'OrderItems', 'SalesOrders'}
+    assert 'Suppliers' not in linked['tables']
+    assert set(linked['tables']) <= set(db.get_tables())
+    assert 'city' in linked['columns']['Customers']
+    # The linked tables select their part of the schema wording
+    wording = db.schema_wording(selected_tables=linked['tables'])
+    assert 'Customers' in wording and 'Suppliers' not in wording
+
+def test_save_load(tmp_path):
+    db_file = str(tmp_path / "db.sqlite")
+    _make_database(db_file)
+    db = SQLiteDatabase("db", db_file)
+    linker = SchemaLinker(db)
+    linker.save(str(tmp_path / "linker.pkl"))
+    loaded = SchemaLinker.load(str(tmp_path / "linker.pkl"), db)
+    question = "supplier names"
+    assert loaded.link(question) == linker.link(question)
@@ -0,0 +1,65 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src import schema_wording
+from src.schema_wording import abbreviate_type, budgeted_schema_wording, render_schema
+
+import pytest
+
+
+def _table(name, n_columns, fks=()):
+    columns = [(0, "id", "INTEGER", 1, None, 1)] + [(i, f"{name}_attribute_{i}", "VARCHAR(255)", 0, None, 0) for i in range(1, n_columns)]
+    columns += [(n_columns + i, fk_from, "INTEGER", 0, None, 0) for i, (fk_from, _, _) in enumerate(fks)]
+    sample_rows = [tuple(range(len(columns))) for _ in range(5)]
+    return {"name": name, "columns": columns, "fks": list(fks), "sample_rows": sample_rows}
+
+TABLES = [
+    _table("customers", 20),
+    _table("orders", 30, fks=[("customer_id", "customers", "id"), ("product_id", "products", "id")]),
+    _table("products", 10),
+    _table("logs", 40),
+]
+
+
+@pytest.fixture(autouse=True)
+def character_tokens(monkeypatch):
+    # Independent of the tokenizer available: about 4 characters per token
+    monkeypatch.setattr(schema_wording, "count_tokens", lambda text, model=None: (len(text) + 3) // 4)
+
+
+def test_abbreviate_type():
+    assert [abbreviate_type(t) for t in ["BIGINT", "varchar(255)", "DOUBLE PRECISION", "timestamp", "Boolean", "BLOB"]] == \
+        ["int", "text", "num", "date", "bool", "blob"]
+
+
+def test_full_text_when_it_fits():
+    text, report = budgeted_schema_wording(TABLES, token_budget=10 ** 6)
+    assert text == render_schema(TABLES, sample_size=5)
+    assert report["steps"] == [] and report["dropped_tables"] == []
+    assert report["tokens"] == report["full_tokens"]
+
+
+@pytest.mark.parametrize("token_budget", [1000, 500, 250, 80])
+def test_text_stays_within_budget(token_budget):
+    text, report = budgeted_schema_wording(TABLES, token_budget=token_budget)
+    assert report["tokens"] == schema_wording.count_tokens(text) <= token_budget < report["full_tokens"]
+    assert report["steps"]
+    # The least connected table is dropped first, the join keys survive the compression
+    if report["dropped_tables"]:
+        assert report["dropped_tables"][0] == "logs"
+    if "orders" not in report["dropped_tables"]:
+        assert "customer_id" in text
+
+
+def test_dropping_tables_counts_each_table_once(monkeypatch):
+    calls = []
+    def count_tokens(text, model=None):
+        calls.append(len(text))
+        return (len(text) + 3) // 4
+    monkeypatch.setattr(schema_wording, "count_tokens", count_tokens)
+    tables = [_table(f"table_{i}", 8, fks=[("parent_id", f"table_{i - 1}", "id")] if i else []) for i in range(300)]
+    text, report = budgeted_schema_wording(tables, token_budget=2000)
+    assert report["tokens"] == (len(text) + 3) // 4 <= 2000
+    assert 0 < len(report["dropped_tables"]) < 300
+    # The full text after each step, each table once, and the final text (plus a few recounts at most)
+    assert len(calls) <= 1 + len(report["steps"]) + len(tables) + 5
@@ -0,0 +1,47 @@
+import io
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.sql_splitter import iter_sql_statements, split_sql_statements
+
+SCRIPT = """-- Create the tables; with a comment
+CREATE TABLE IF NOT EXISTS "main"."orders" (id INTEGER, note TEXT DEFAULT 'a;b');
+INSERT INTO orders VALUES (1, 'it''s; fine'), (2, "x;y");
+/* block; comment */
+CREATE TRIGGER log_orders AFTER INSERT ON orders BEGIN
+    INSERT INTO audit VALUES (new.id);
+    UPDATE counters SET n = n + 1;
+END;
+CREATE OR REPLACE VIEW [big orders] AS SELECT * FROM orders WHERE note <> ';';
+DELETE FROM orders WHERE id = 1;
+BEGIN TRANSACTION;
+COMMIT
+"""
+
+
+def test_split_and_classify():
+    statements = list(iter_sql_statements(SCRIPT))
+    assert [(s.statement_type, s.object_name) for s in statements] == [
+        ('CREATE TABLE', 'main.orders'),
+        ('INSERT', 'orders'),
+        ('CREATE TRIGGER', 'log_orders'),
+        ('CREATE VIEW', 'big orders'),
+        ('DELETE', 'orders'),
+        ('BEGIN', None),
+        ('COMMIT', None),
+    ]
+    assert statements[1].text == "INSERT INTO orders VALUES (1, 'it''s; fine'), (2, \"x;y\")"
+    assert statements[2].text.endswith("END")
+
+def test_streaming_matches_whole_input():
+    # Chunk boundaries inside literals, comments and trigger bodies do not change the result
+    expected = split_sql_statements(SCRIPT)
+    for chunk_size in (1, 7, 64):
+        assert [s.text for s in iter_sql_statements(SCRIPT, chunk_size=chunk_size)] == expected
+    assert [s.text for s in iter_sql_statements(io.StringIO(SCRIPT), chunk_size=5)] == expected
+    assert [s.text for s in iter_sql_statements(SCRIPT.splitlines(keepends=True))] == expected
+
+def test_strip_terminator():
+    assert split_sql_statements("SELECT 1; SELECT 2;", strip_terminator=False) == ["SELECT 1;", "SELECT 2;"]
+    assert split_sql_statements("SELECT 1; SELECT 2;") == ["SELECT 1", "SELECT 2"]
+    assert split_sql_statements("  ;\n-- only a comment\n") == []
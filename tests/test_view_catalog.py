@@ -0,0 +1,58 @@
+import os
+import numpy as np
+import pandas as pd
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.view_catalog import ViewCatalog, load_view_catalog, write_view_catalog
+
+import pytest
+
+
+def _views(start, n):
+    records = [{"view_name": f"v{i}", "tables": ["orders"], "n": i} for i in range(start, start + n)]
+    embeddings = np.arange(start * 4, (start + n) * 4, dtype=np.float64).reshape(n, 4)
+    return records, embeddings
+
+
+def test_append_delete_compact(tmp_path):
+    catalog = ViewCatalog(str(tmp_path / "catalog"))
+    records, X = _views(0, 5)
+    assert catalog.append(records, X) == [0, 1, 2, 3, 4]
+    more, Y = _views(5, 3)
+    assert catalog.append(more, Y) == [5, 6, 7]
+    E = catalog.embeddings()
+    assert isinstance(E, np.memmap) and E.dtype == np.float32
+    np.testing.assert_array_equal(E, np.vstack([X, Y]))
+    with pytest.raises(ValueError):
+        catalog.append([{"view_name": "bad"}], np.zeros((1, 3)))
+
+    catalog.delete([1, 6])
+    assert len(catalog) == 6
+    expected = np.delete(np.vstack([X, Y]), [1, 6], axis=0)
+    np.testing.assert_array_equal(catalog.embeddings(), expected)
+    assert [r["n"] for r in catalog.records()] == [0, 2, 3, 4, 5, 7]
+    catalog.compact()
+    np.testing.assert_array_equal(catalog.embeddings(), expected)
+    assert [r["n"] for r in catalog.records()] == [0, 2, 3, 4, 5, 7]
+    # Appending after a compaction continues after the remaining rows
+    assert catalog.append(*_views(8, 1)) == [6]
+    catalog.close()
+
+    catalog = ViewCatalog(str(tmp_path / "catalog"))
+    assert len(catalog) == 7
+    assert os.path.getsize(catalog.embeddings_file) == 128 + 7 * 4 * 4
+    assert np.load(catalog.embeddings_file).shape == (7, 4)
+    catalog.close()
+
+
+def test_write_and_load(tmp_path):
+    path = str(tmp_path / "catalog")
+    records, X = _views(0, 4)
+    df = pd.DataFrame.from_records(records)
+    write_view_catalog(path, df, X)
+    # Writing again replaces the catalog
+    write_view_catalog(path, df, X)
+    loaded, E = load_view_catalog(path)
+    pd.testing.assert_frame_equal(loaded, df)
+    np.testing.assert_array_equal(E, X)
+    assert not E.flags.writeable
@@ -0,0 +1,61 @@
+import os
+import random
+import networkx as nx
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.view_graph import view_column_incidence, view_overlap_graph, view_overlap_matrix
+
+import pytest
+
+
+def _column_sets(n_views=200, n_columns=60, seed=0):
+    rng = random.Random(seed)
+    columns = [f"t{i % 7}.c{i}" for i in range(n_columns)]
+    return [rng.sample(columns, rng.randint(0, 6)) + ["orders.id"] * rng.randint(0, 1) for _ in range(n_views)]
+
+def _pairwise_graph(column_sets, min_overlap=1, max_views_per_column=None):
+    """
+    Reference construction: compare every pair of views.
+    """
+    counts = {}
+    for columns in column_sets:
+        for column in set(columns):
+            counts[column] = counts.get(column, 0) + 1
+    column_sets = [{c for c in columns if max_views_per_column is None or counts[c] <= max_views_per_column} for columns in column_sets]
+    G = nx.Graph()
+    G.add_nodes_from(range(len(column_sets)))
+    for u in range(len(column_sets)):
+        for v in range(u + 1, len(column_sets)):
+            overlap = len(column_sets[u] & column_sets[v])
+            if overlap >= min_overlap:
+                G.add_edge(u, v, edge_weight=overlap)
+    return G
+
+def _edges(G):
+    return {(min(u, v), max(u, v)): w for u, v, w in G.edges(data='edge_weight')}
+
+
+@pytest.mark.parametrize("min_overlap, max_views_per_column", [(1, None), (2, None), (1, 20)])
+def test_sparse_graph_equals_pairwise_graph(min_overlap, max_views_per_column):
+    column_sets = _column_sets()
+    G = view_overlap_graph(column_sets, min_overlap=min_overlap, max_views_per_column=max_views_per_column)
+    expected = _pairwise_graph(column_sets, min_overlap=min_overlap, max_views_per_column=max_views_per_column)
+    assert sorted(G.nodes) == sorted(expected.nodes)
+    assert _edges(G) == _edges(expected)
+    assert all(isinstance(w, int) for w in _edges(G).values())
+
+
+def test_max_views_per_column_drops_hub_columns():
+    column_sets = [["orders.id", "orders.amount"], ["orders.id", "customers.name"], ["orders.id"], ["customers.name"]]
+    X, columns = view_column_incidence(column_sets, max_views_per_column=2)
+    assert "orders.id" not in columns and X.shape == (4, len(columns))
+    overlap = view_overlap_matrix(column_sets, max_views_per_column=2)
+    assert {(int(u), int(v)) for u, v in zip(*overlap.nonzero())} == {(1, 3), (3, 1)}
+    assert overlap.diagonal().sum() == 0
+
+
+def test_node_ids_and_names():
+    column_sets = [["a.x", "a.y"], ["a.x"], ["b.z"]]
+    G = view_overlap_graph(column_sets, view_names=["v1", "v2", "v3"], nodes=[10, 20, 30])
+    assert dict(G.nodes(data='node_name')) == {10: "v1", 20: "v2", 30: "v3"}
+    assert _edges(G) == {(10, 20): 1}